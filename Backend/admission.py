@@ -0,0 +1,233 @@
+"""Per-user rate limits and concurrency caps, checked before any view runs.
+
+Every request is put in a class: ``auth`` (login and signup, which run
+bcrypt), ``export`` (full-database and table exports), and otherwise
+``read`` for GET/HEAD or ``write``. Each class has a token bucket per
+caller, the user id from the access token or the client address when
+there is none. ``RATE_LIMITS`` gives each class ``(requests, seconds)``:
+up to ``requests`` at once, refilled evenly over ``seconds``. An empty
+bucket gets 429 with ``Retry-After``.
+
+Classes in ``CONCURRENCY_LIMITS`` also have a cap on requests in flight
+across all callers. Past it the request is shed with 503 and
+``Retry-After: CONCURRENCY_RETRY_AFTER``; a streamed export holds its
+slot until the last byte is sent.
+
+``RATE_LIMIT_BACKEND`` is ``local`` (state per process) or ``redis``,
+which shares limits between processes through the cache's Redis client
+and so needs ``CACHE_BACKEND=redis``. Left unset, it is ``redis`` when
+the cache is on a Redis server and ``local`` otherwise, since per-process
+limits multiply with the number of workers.
+"""
+import math
+import threading
+import time
+import uuid
+from flask import current_app, g, jsonify, request
+
+
+DEFAULT_RATE_LIMITS = {
+    'read': (300, 60),
+    'write': (60, 60),
+    'auth': (10, 60),
+    'export': (5, 300),
+}
+DEFAULT_CONCURRENCY_LIMITS = {'export': 2}
+DEFAULT_ENDPOINT_CLASSES = {
+    'auth_bp.login': 'auth',
+    'auth_bp.signup': 'auth',
+    'analytics_bp.export_database': 'export',
+    'analytics_bp.export_table': 'export',
+}
+# A concurrency slot not released within this long (a crashed worker) is freed.
+CONCURRENCY_LEASE_SECONDS = 600
+_EXEMPT_METHODS = ('OPTIONS',)
+
+
+class LocalLimiter:
+    """Token buckets and in-flight counters for this process only.
+
+    Buckets are stored as GCRA "theoretical arrival times": one float per
+    key, no background refill.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._arrivals = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, period):
+        """Take a token from ``key``'s bucket; returns 0, or seconds until one is free."""
+        now = time.monotonic()
+        interval = period / limit
+        with self._lock:
+            arrival = max(self._arrivals.get(key, now), now) + interval
+            if arrival - now > period:
+                return arrival - now - period
+            self._arrivals[key] = arrival
+            if len(self._arrivals) > self.max_keys:
+                # A bucket whose arrival time has passed is full again.
+                self._arrivals = {k: v for k, v in self._arrivals.items() if v > now}
+        return 0
+
+    def acquire(self, key, limit):
+        with self._lock:
+            if self._in_flight.get(key, 0) >= limit:
+                return None
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        return key
+
+    def release(self, key, slot):
+        with self._lock:
+            self._in_flight[key] -= 1
+
+
+# GCRA on the Redis clock, so app servers with skewed clocks agree.
+_HIT_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local period = tonumber(ARGV[2])
+local arrival = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now) + period / tonumber(ARGV[1])
+if arrival - now > period then
+    return tostring(arrival - now - period)
+end
+redis.call('SET', KEYS[1], tostring(arrival), 'PX', math.ceil((arrival - now) * 1000))
+return '0'
+"""
+
+# In-flight requests are members of a sorted set scored by start time;
+# members older than the lease belong to dead workers and are dropped.
+_ACQUIRE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local lease = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - lease)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now, ARGV[2])
+redis.call('EXPIRE', KEYS[1], math.ceil(lease))
+return 1
+"""
+
+
+class RedisLimiter:
+    """The same limits shared by every process using one Redis."""
+
+    def __init__(self, client, lease=CONCURRENCY_LEASE_SECONDS):
+        self.client = client
+        self.lease = lease
+        self._hit = client.register_script(_HIT_SCRIPT)
+        self._acquire = client.register_script(_ACQUIRE_SCRIPT)
+
+    def hit(self, key, limit, period):
+        return float(self._hit(keys=[key], args=[limit, period]))
+
+    def acquire(self, key, limit):
+        slot = uuid.uuid4().hex
+        return slot if self._acquire(keys=[key], args=[limit, slot, self.lease]) else None
+
+    def release(self, key, slot):
+        self.client.zrem(key, slot)
+
+
+def _too_many(message, status_code, retry_after):
+    response = jsonify({'message': message})
+    response.status_code = status_code
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+class AdmissionControl:
+    """Configuration:
+
+    - ``RATE_LIMIT_ENABLED``: default True.
+    - ``RATE_LIMIT_BACKEND``: ``local`` or ``redis``; default ``redis`` when
+      the cache is on a Redis server, else ``local``.
+    - ``RATE_LIMITS``: ``{class: (requests, seconds)}``, see DEFAULT_RATE_LIMITS.
+    - ``CONCURRENCY_LIMITS``: ``{class: requests in flight}``.
+    - ``CONCURRENCY_RETRY_AFTER``: seconds, default 5.
+    - ``RATE_LIMIT_ENDPOINT_CLASSES``: endpoint name to class, for
+      endpoints not classed by method.
+    """
+
+    def __init__(self):
+        self.limiter = None
+        self.prefix = 'bdms'
+
+    def init_app(self, app, cache):
+        app.config.setdefault('RATE_LIMIT_ENABLED', True)
+        app.config.setdefault('RATE_LIMIT_BACKEND', None)
+        app.config.setdefault('RATE_LIMITS', dict(DEFAULT_RATE_LIMITS))
+        app.config.setdefault('CONCURRENCY_LIMITS', dict(DEFAULT_CONCURRENCY_LIMITS))
+        app.config.setdefault('CONCURRENCY_RETRY_AFTER', 5)
+        app.config.setdefault('RATE_LIMIT_ENDPOINT_CLASSES', dict(DEFAULT_ENDPOINT_CLASSES))
+        app.extensions['admission'] = self
+        if not app.config['RATE_LIMIT_ENABLED']:
+            return
+
+        client = getattr(cache.backend, 'client', None)
+        backend = app.config['RATE_LIMIT_BACKEND'] or ('redis' if hasattr(client, 'register_script') else 'local')
+        app.config['RATE_LIMIT_BACKEND'] = backend
+        if backend == 'local':
+            self.limiter = LocalLimiter()
+        elif backend == 'redis':
+            if not hasattr(client, 'register_script'):
+                raise RuntimeError('RATE_LIMIT_BACKEND=redis requires CACHE_BACKEND=redis with a Redis server')
+            self.limiter = RedisLimiter(client)
+        else:
+            raise RuntimeError(f'Unknown RATE_LIMIT_BACKEND: {backend}')
+        self.prefix = f"{cache.prefix}:admission"
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def request_class(self):
+        endpoint_class = current_app.config['RATE_LIMIT_ENDPOINT_CLASSES'].get(request.endpoint)
+        if endpoint_class:
+            return endpoint_class
+        return 'read' if request.method in ('GET', 'HEAD') else 'write'
+
+    def _caller(self):
+        from routes.utils import current_token_user_id
+
+        user_id = current_token_user_id()
+        return f'user:{user_id}' if user_id is not None else f'ip:{request.remote_addr}'
+
+    def _before_request(self):
+        if request.method in _EXEMPT_METHODS or request.endpoint is None:
+            return None
+        request_class = self.request_class()
+        config = current_app.config
+
+        rate = config['RATE_LIMITS'].get(request_class)
+        if rate:
+            limit, period = rate
+            retry_after = self.limiter.hit(f'{self.prefix}:rate:{request_class}:{self._caller()}', limit, period)
+            if retry_after:
+                return _too_many('Too many requests', 429, retry_after)
+
+        concurrency = config['CONCURRENCY_LIMITS'].get(request_class)
+        if concurrency:
+            key = f'{self.prefix}:concurrency:{request_class}'
+            slot = self.limiter.acquire(key, concurrency)
+            if slot is None:
+                return _too_many('Server busy, try again later', 503, config['CONCURRENCY_RETRY_AFTER'])
+            g.admission_slot = (key, slot)
+        return None
+
+    def _after_request(self, response):
+        # The request context is torn down as soon as the view returns, before
+        # a streamed body is sent, so the slot moves to the response and is
+        # released when the server closes it.
+        held = g.get('admission_slot')
+        if held is not None and response.is_streamed:
+            del g.admission_slot
+            response.call_on_close(lambda: self.limiter.release(*held))
+        return response
+
+    def _teardown_request(self, exc):
+        held = g.pop('admission_slot', None)
+        if held is not None:
+            self.limiter.release(*held)
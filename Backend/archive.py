@@ -0,0 +1,68 @@
+import datetime
+from sqlalchemy import and_, delete, insert, literal, or_, select
+from extensions import db
+from jobs import job_handler
+from models import ArchivedDefect, ArchivedDefectComment, Defect, DefectComment, DefectSignature
+
+
+ARCHIVE_AFTER_DAYS = 90
+ARCHIVE_BATCH_SIZE = 500
+
+
+def _move_rows(source, target, where, now):
+    columns = [column.name for column in target.columns if column.name != 'archived_at']
+    db.session.execute(
+        insert(target).from_select(
+            columns + ['archived_at'],
+            select(*[source.c[name] for name in columns], literal(now, target.c.archived_at.type))
+            .where(where),
+        )
+    )
+    db.session.execute(delete(source).where(where))
+
+
+def archive_batch(completed_before, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move one batch of cold defects and their comments to the archive tables.
+
+    A defect is cold once it has been Completed since before
+    ``completed_before``, or as soon as it is soft-deleted. Each batch is
+    its own transaction so the live tables are never locked for long.
+    """
+    ids = db.session.execute(
+        select(Defect.id)
+        .where(or_(
+            and_(Defect.status == 'Completed', Defect.completed_at < completed_before),
+            Defect.deleted_at.isnot(None),
+        ))
+        .order_by(Defect.id)
+        .limit(batch_size)
+    ).scalars().all()
+    if not ids:
+        return 0
+
+    now = datetime.datetime.utcnow()
+    comments = DefectComment.__table__
+    defects = Defect.__table__
+    _move_rows(comments, ArchivedDefectComment.__table__, comments.c.defect_id.in_(ids), now)
+    signatures = DefectSignature.__table__
+    db.session.execute(delete(signatures).where(signatures.c.defect_id.in_(ids)))
+    _move_rows(defects, ArchivedDefect.__table__, defects.c.id.in_(ids), now)
+    db.session.commit()
+    return len(ids)
+
+
+def archive_defects(days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+    completed_before = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    total = 0
+    while True:
+        moved = archive_batch(completed_before, batch_size)
+        total += moved
+        if moved < batch_size:
+            return total
+
+
+@job_handler('archive_defects', max_concurrency=1)
+def archive_defects_job(payload, job):
+    days = int(payload.get('days', ARCHIVE_AFTER_DAYS))
+    batch_size = int(payload.get('batch_size', ARCHIVE_BATCH_SIZE))
+    return {'archived': archive_defects(days, batch_size)}
@@ -0,0 +1,153 @@
+"""ASGI entrypoint serving the same Flask app.
+
+Run with::
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+The event loop reads each request body completely before the Flask app is
+called, and writes the response back asynchronously. Worker threads
+(``ASGI_THREADS``, default 16) are therefore only busy while a request is
+actually being handled, not while a slow client uploads or downloads.
+
+Each request's WSGI call and every step of its response iterator run in
+one ``contextvars`` context of their own. The steps may land on different
+pool threads, and streamed responses (``stream_with_context``) need the
+app and request contexts they pushed to still be there when they resume.
+"""
+import asyncio
+import contextvars
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from app import create_app
+
+
+SPOOL_MAX_MEMORY = 1024 * 1024
+
+
+class WSGIBridge:
+    def __init__(self, wsgi_app, threads=16):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='asgi-wsgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+        max_length = self.wsgi_app.config.get('MAX_CONTENT_LENGTH')
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if max_length and size > max_length:
+                body.close()
+                await self._send_simple(send, 413, b'{"message": "Request body too large"}')
+                return
+            body.write(chunk)
+            more_body = message.get('more_body', False)
+        body.seek(0)
+
+        loop = asyncio.get_running_loop()
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers
+            ]
+            return lambda data: None
+
+        environ = self._build_environ(scope, body, size)
+        context = contextvars.copy_context()
+
+        def run(fn, *args):
+            return loop.run_in_executor(self.executor, context.run, fn, *args)
+
+        iterable = None
+        try:
+            iterable = await run(lambda: iter(self.wsgi_app(environ, start_response)))
+            await send({
+                'type': 'http.response.start',
+                'status': response['status'],
+                'headers': response['headers'],
+            })
+            while True:
+                chunk = await run(next, iterable, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            close = getattr(iterable, 'close', None)
+            if close:
+                await run(close)
+            body.close()
+
+    def _build_environ(self, scope, body, size):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'CONTENT_LENGTH': str(size),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1')
+            value = value.decode('latin-1')
+            if name == 'content-type':
+                environ['CONTENT_TYPE'] = value
+                continue
+            if name == 'content-length':
+                continue
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+        return environ
+
+    async def _send_simple(self, send, status, body):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json')],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+flask_app = create_app()
+application = WSGIBridge(flask_app, threads=int(os.environ.get('ASGI_THREADS', '16')))
@@ -0,0 +1,218 @@
+"""Measure concurrent workflow writes against each database setup.
+
+Starts the API (``app.run(threaded=True)``) once per target, seeds
+``--technicians`` technicians with ``--defects`` assigned defects each,
+then lets every technician flip their defects between Ongoing and Done
+while ``--readers`` clients list defects. Reports write and read
+throughput, latency percentiles and failed requests (on SQLite, writers
+that give up waiting fail with "database is locked").
+
+Targets:
+
+- ``sqlite-default``: a SQLite file with ``SQLITE_TUNING=0``.
+- ``sqlite-tuned``: the same with WAL, pragmas and the writer queue.
+- ``postgres``: the database given by ``--postgres-url``. It should be
+  empty; the benchmark creates the tables it needs.
+
+    python benchmarks/concurrency.py --technicians 16 --duration 10
+    python benchmarks/concurrency.py --targets postgres --postgres-url postgresql://localhost/bench
+"""
+import argparse
+import base64
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET_KEY = 'benchmark-secret-key-0123456789abcdef'
+SERVER = [sys.executable, '-c', 'from app import create_app; create_app().run(port={port}, threaded=True)']
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _seed(env, technicians, defects):
+    script = (
+        'from app import create_app\n'
+        'from extensions import db\n'
+        'from models import Building, Defect, User\n'
+        'app = create_app()\n'
+        'with app.app_context():\n'
+        '    db.create_all()\n'
+        "    db.session.add(Building(name='B', address='x'))\n"
+        "    reader = User(name='reader', email='reader@example.com', role='building_executive')\n"
+        "    reader.set_password('bench')\n"
+        '    db.session.add(reader)\n'
+        f'    for index in range({technicians}):\n'
+        "        tech = User(name=f'tech{index}', email=f'tech{index}@example.com', role='technician')\n"
+        "        tech.set_password('bench')\n"
+        '        db.session.add(tech)\n'
+        '        db.session.flush()\n'
+        f'        for number in range({defects}):\n'
+        '            db.session.add(Defect(\n'
+        "                title=f'Defect {index}-{number}', description='Benchmark', priority='medium',\n"
+        "                status='Ongoing', building_id=1, reporter_id=reader.id, assigned_technician_id=tech.id,\n"
+        '            ))\n'
+        '    db.session.commit()\n'
+    )
+    subprocess.run([sys.executable, '-c', script], cwd=BACKEND_DIR, env=env, check=True)
+
+
+def _wait_for_port(port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Server did not start on port {port}')
+
+
+def _request(conn, method, path, token, body=None):
+    headers = {'Authorization': f'Bearer {token}'}
+    if body is not None:
+        body = json.dumps(body)
+        headers['Content-Type'] = 'application/json'
+    conn.request(method, path, body=body, headers=headers)
+    response = conn.getresponse()
+    return response.status, response.read()
+
+
+def _login(port, email):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    credentials = base64.b64encode(f'{email}:bench'.encode()).decode()
+    conn.request('POST', '/api/auth/login', headers={'Authorization': f'Basic {credentials}'})
+    token = json.loads(conn.getresponse().read())['token']
+    conn.close()
+    return token
+
+
+def _client(port, token, stop_at, work, latencies, errors):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    for method, path, body in work():
+        if time.time() >= stop_at:
+            break
+        started = time.perf_counter()
+        try:
+            status, _ = _request(conn, method, path, token, body)
+        except (OSError, http.client.HTTPException):
+            errors.append('connection')
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            continue
+        if status >= 400:
+            errors.append(status)
+        else:
+            latencies.append(time.perf_counter() - started)
+    conn.close()
+
+
+def _technician_work(port, token):
+    def work():
+        conn = http.client.HTTPConnection('127.0.0.1', port)
+        _, body = _request(conn, 'GET', '/api/defects', token)
+        conn.close()
+        defect_ids = [defect['id'] for defect in json.loads(body)]
+        while True:
+            for action in ('done', 'ongoing'):
+                for defect_id in defect_ids:
+                    yield 'PATCH', f'/api/defects/{defect_id}/{action}', {}
+    return work
+
+
+def _reader_work():
+    while True:
+        yield 'GET', '/api/defects', None
+
+
+def _summary(latencies, errors, elapsed):
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else float('nan')
+
+    return {
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed if elapsed else 0,
+        'p50_ms': percentile(0.50),
+        'p99_ms': percentile(0.99),
+        'errors': len(errors),
+    }
+
+
+def run_target(target, args):
+    # Measures the database, not the limits in front of it.
+    env = dict(os.environ, SECRET_KEY=SECRET_KEY, RATE_LIMIT_ENABLED='0')
+    if target == 'postgres':
+        if not args.postgres_url:
+            raise SystemExit('--postgres-url is required for the postgres target')
+        env['DATABASE_URL'] = args.postgres_url
+    else:
+        workdir = tempfile.mkdtemp(prefix=f'bench-{target}-')
+        env['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        env['SQLITE_TUNING'] = '1' if target == 'sqlite-tuned' else '0'
+    _seed(env, args.technicians, args.defects)
+
+    port = _free_port()
+    command = [part.format(port=port) for part in SERVER]
+    server = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_for_port(port)
+        reader_token = _login(port, 'reader@example.com')
+        tech_tokens = [_login(port, f'tech{index}@example.com') for index in range(args.technicians)]
+        stop_at = time.time() + args.duration
+
+        writes, write_errors, reads, read_errors = [], [], [], []
+        threads = [
+            threading.Thread(target=_client, args=(port, token, stop_at, _technician_work(port, token), writes, write_errors))
+            for token in tech_tokens
+        ] + [
+            threading.Thread(target=_client, args=(port, reader_token, stop_at, _reader_work, reads, read_errors))
+            for _ in range(args.readers)
+        ]
+        started = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+    return target, _summary(writes, write_errors, elapsed), _summary(reads, read_errors, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--targets', default='sqlite-default,sqlite-tuned', help='Comma-separated targets to run.')
+    parser.add_argument('--postgres-url', help='Empty PostgreSQL database for the postgres target.')
+    parser.add_argument('--technicians', type=int, default=16, help='Concurrent writing clients.')
+    parser.add_argument('--defects', type=int, default=5, help='Defects assigned to each technician.')
+    parser.add_argument('--readers', type=int, default=4, help='Concurrent reading clients.')
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    results = [run_target(target.strip(), args) for target in args.targets.split(',')]
+    print(f"{'target':<16}{'kind':<7}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for target, *rows in results:
+        for kind, row in zip(('write', 'read'), rows):
+            print(
+                f"{target:<16}{kind:<7}{row['requests']:>10}{row['rps']:>10.1f}{row['p50_ms']:>10.1f}"
+                f"{row['p99_ms']:>10.1f}{row['errors']:>8}"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Compare ORM-object serialization with the shared row serializers.
+
+Seeds ``--rows`` defects into a throwaway SQLite database, then times
+serializing all of them to JSON both ways:
+
+- ``orm``: ``Defect.query.all()`` and a per-attribute dict builder, the way
+  the list endpoints used to work.
+- ``rows``: ``DEFECT.all(DEFECT.select())`` from serializers.py.
+
+    python benchmarks/serializers.py --rows 100000
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def _legacy_serialize_defect(defect):
+    return {
+        'id': defect.id,
+        'title': defect.title,
+        'description': defect.description,
+        'status': defect.status,
+        'priority': defect.priority,
+        'image_url': defect.image_url,
+        'initial_report_image': defect.initial_report_image,
+        'technician_report_image': defect.technician_report_image,
+        'building_id': defect.building_id,
+        'reporter_id': defect.reporter_id,
+        'reviewed_by': defect.reviewed_by_id,
+        'assigned_technician_id': defect.assigned_technician_id,
+        'external_contractor': defect.external_contractor,
+        'contractor_name': defect.contractor_name,
+        'done_at': defect.done_at.isoformat() if defect.done_at else None,
+        'completed_at': defect.completed_at.isoformat() if defect.completed_at else None,
+        'version': defect.version,
+        'created_at': defect.created_at.isoformat() if defect.created_at else None,
+        'updated_at': defect.updated_at.isoformat() if defect.updated_at else None,
+    }
+
+
+def _seed(db, rows):
+    from sqlalchemy import insert
+    from models import Building, Defect, User
+
+    user = User(name='bench', email='bench@example.com', role='csr', password_hash='x')
+    db.session.add_all([user, Building(name='B', address='x')])
+    db.session.commit()
+    now = datetime.datetime.utcnow()
+    batch = []
+    for index in range(rows):
+        batch.append({
+            'title': f'Defect {index}', 'description': 'Water leaking from the ceiling',
+            'status': 'Done' if index % 3 else 'Open', 'priority': ('low', 'medium', 'high')[index % 3],
+            'image_url': None, 'building_id': 1, 'reporter_id': user.id, 'external_contractor': False,
+            'done_at': now if index % 3 else None, 'version': 1, 'created_at': now, 'updated_at': now,
+        })
+        if len(batch) == 10000:
+            db.session.execute(insert(Defect.__table__), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Defect.__table__), batch)
+    db.session.commit()
+
+
+def _time(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-serializers-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('SECRET_KEY', 'benchmark-secret-key-0123456789abcdef')
+
+    from app import create_app
+    from extensions import db
+    from models import Defect
+    from serializers import DEFECT
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        _seed(db, args.rows)
+
+        def orm():
+            body = json.dumps([_legacy_serialize_defect(d) for d in Defect.query.all()])
+            db.session.expunge_all()
+            return body
+
+        def rows():
+            return json.dumps(DEFECT.all(DEFECT.select()))
+
+        assert json.loads(orm()) == json.loads(rows())
+        results = {'orm': _time(orm, args.repeat), 'rows': _time(rows, args.repeat)}
+
+    print(f"{'path':<8}{'seconds':>10}{'rows/s':>12}")
+    for name, seconds in results.items():
+        print(f'{name:<8}{seconds:>10.3f}{args.rows / seconds:>12.0f}')
+    print(f"speedup: {results['orm'] / results['rows']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+"""Compare serving modes while many slow clients are uploading.
+
+Starts the API in each mode against a throwaway SQLite database, opens
+``--slow-clients`` connections that trickle a base64 photo upload to
+``POST /api/defects``, and meanwhile measures ``GET /api/buildings``
+latency from a few fast clients. Reports fast-request throughput,
+latency percentiles, seconds until the server answered its first
+request, and the peak threads and memory (PSS, Linux only) of the server
+and its workers.
+
+Modes: ``wsgi`` (``app.run``), ``asgi`` (uvicorn), and gunicorn with
+``gunicorn.conf.py`` as ``gthread``, ``gevent`` and ``gthread-nopreload``
+(``GUNICORN_PRELOAD=0``), each with ``--workers`` processes.
+
+    python benchmarks/serving.py --slow-clients 200 --duration 10
+    python benchmarks/serving.py --modes gthread,gevent,gthread-nopreload --slow-clients 0
+"""
+import argparse
+import asyncio
+import base64
+import glob
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET_KEY = 'benchmark-secret-key-0123456789abcdef'
+
+_GUNICORN = [
+    sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', '127.0.0.1:{port}',
+    '--log-level', 'warning', 'wsgi:application',
+]
+MODES = {
+    'wsgi': [sys.executable, '-c', 'from app import create_app; create_app().run(port={port}, threaded=True)'],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'asgi:application', '--port', '{port}', '--log-level', 'warning'],
+    'gthread': _GUNICORN,
+    'gevent': _GUNICORN,
+    'gthread-nopreload': _GUNICORN,
+}
+MODE_ENV = {
+    'gthread': {'GUNICORN_PROFILE': 'gthread'},
+    'gevent': {'GUNICORN_PROFILE': 'gevent'},
+    'gthread-nopreload': {'GUNICORN_PROFILE': 'gthread', 'GUNICORN_PRELOAD': '0'},
+}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _seed(database_url):
+    env = dict(os.environ, DATABASE_URL=database_url, SECRET_KEY=SECRET_KEY, RATE_LIMIT_ENABLED='0')
+    script = (
+        'from app import create_app\n'
+        'from extensions import db\n'
+        'from models import User, Building\n'
+        'app = create_app()\n'
+        'with app.app_context():\n'
+        '    db.create_all()\n'
+        "    user = User(name='bench', email='bench@example.com', role='csr')\n"
+        "    user.set_password('bench')\n"
+        '    db.session.add(user)\n'
+        "    db.session.add_all([Building(name=f'B{i}', address='x') for i in range(20)])\n"
+        '    db.session.commit()\n'
+    )
+    subprocess.run([sys.executable, '-c', script], cwd=BACKEND_DIR, env=env, check=True)
+
+
+def _wait_for_port(port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Server did not start on port {port}')
+
+
+def _login(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    credentials = base64.b64encode(b'bench@example.com:bench').decode()
+    conn.request('POST', '/api/auth/login', headers={'Authorization': f'Basic {credentials}'})
+    token = json.loads(conn.getresponse().read())['token']
+    conn.close()
+    return token
+
+
+async def _slow_upload(port, token, body, chunk_size, interval, stop_at):
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        return
+    writer.write((
+        'POST /api/defects HTTP/1.1\r\n'
+        'Host: 127.0.0.1\r\n'
+        f'Authorization: Bearer {token}\r\n'
+        'Content-Type: application/json\r\n'
+        f'Content-Length: {len(body)}\r\n\r\n'
+    ).encode())
+    offset = 0
+    try:
+        while offset < len(body) and time.time() < stop_at:
+            writer.write(body[offset:offset + chunk_size])
+            await writer.drain()
+            offset += chunk_size
+            await asyncio.sleep(interval)
+    except OSError:
+        pass
+    writer.close()
+
+
+def _run_slow_clients(port, token, count, stop_at):
+    image = 'data:image/jpeg;base64,' + base64.b64encode(os.urandom(300 * 1024)).decode()
+    body = json.dumps({
+        'title': 'Leak', 'description': 'Slow upload', 'priority': 'low',
+        'building_id': 1, 'initial_report_image': image,
+    }).encode()
+
+    async def main():
+        await asyncio.gather(*[
+            _slow_upload(port, token, body, 1024, 0.2, stop_at) for _ in range(count)
+        ])
+
+    asyncio.run(main())
+
+
+def _fast_client(port, token, stop_at, latencies, errors):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    while time.time() < stop_at:
+        started = time.perf_counter()
+        try:
+            conn.request('GET', '/api/buildings', headers={'Authorization': f'Bearer {token}'})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+            latencies.append(time.perf_counter() - started)
+        except (OSError, http.client.HTTPException):
+            errors.append('connection')
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    conn.close()
+
+
+def _process_tree(pid):
+    pids = [pid]
+    for children in glob.glob(f'/proc/{pid}/task/*/children'):
+        try:
+            with open(children) as listing:
+                for child in listing.read().split():
+                    pids.extend(_process_tree(int(child)))
+        except OSError:
+            pass
+    return pids
+
+
+def _proc_total(pid, filename, field):
+    """Sum ``field`` from /proc/<pid>/<filename> over the server and its workers."""
+    total = None
+    for member in _process_tree(pid):
+        try:
+            with open(f'/proc/{member}/{filename}') as status:
+                for line in status:
+                    if line.startswith(field):
+                        total = (total or 0) + int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return total
+
+
+def _wait_until_serving(port, timeout=30):
+    """Seconds until the server answered a request, not just accepted a connection."""
+    started = time.time()
+    _wait_for_port(port, timeout)
+    while time.time() < started + timeout:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+            conn.request('GET', '/')
+            conn.getresponse().read()
+            conn.close()
+            return time.time() - started
+        except (OSError, http.client.HTTPException):
+            time.sleep(0.05)
+    raise RuntimeError(f'Server on port {port} did not answer')
+
+
+def run_mode(mode, args):
+    workdir = tempfile.mkdtemp(prefix=f'bench-{mode}-')
+    database_url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    _seed(database_url)
+    port = _free_port()
+    env = dict(
+        os.environ, DATABASE_URL=database_url, SECRET_KEY=SECRET_KEY, RATE_LIMIT_ENABLED='0', ASGI_THREADS=str(args.threads),
+        WEB_CONCURRENCY=str(args.workers), GUNICORN_THREADS=str(args.threads), GUNICORN_ALLOW_LOCAL_CACHE='1',
+        **MODE_ENV.get(mode, {}),
+    )
+    command = [part.format(port=port) for part in MODES[mode]]
+    server = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        startup = _wait_until_serving(port)
+        token = _login(port)
+        stop_at = time.time() + args.duration
+
+        slow = threading.Thread(target=_run_slow_clients, args=(port, token, args.slow_clients, stop_at))
+        slow.start()
+        time.sleep(1)
+
+        latencies, errors = [], []
+        fast = [
+            threading.Thread(target=_fast_client, args=(port, token, stop_at, latencies, errors))
+            for _ in range(args.fast_clients)
+        ]
+        measured_from = time.time()
+        for thread in fast:
+            thread.start()
+
+        peak_threads = peak_pss = 0
+        while any(thread.is_alive() for thread in fast):
+            peak_threads = max(peak_threads, _proc_total(server.pid, 'status', 'Threads:') or 0)
+            peak_pss = max(peak_pss, _proc_total(server.pid, 'smaps_rollup', 'Pss:') or 0)
+            time.sleep(0.25)
+        elapsed = time.time() - measured_from
+        slow.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else float('nan')
+
+    return {
+        'mode': mode,
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed if elapsed else 0,
+        'p50_ms': percentile(0.50),
+        'p99_ms': percentile(0.99),
+        'mean_ms': statistics.mean(latencies) * 1000 if latencies else float('nan'),
+        'errors': len(errors),
+        'peak_threads': peak_threads or None,
+        'peak_pss_mb': peak_pss / 1024 if peak_pss else None,
+        'startup_s': startup,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='wsgi,asgi,gthread,gevent', help=f"Comma-separated modes to run ({', '.join(MODES)}).")
+    parser.add_argument('--slow-clients', type=int, default=200)
+    parser.add_argument('--fast-clients', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--threads', type=int, default=16, help='Worker threads for the ASGI bridge, and per gthread worker.')
+    parser.add_argument('--workers', type=int, default=2, help='Gunicorn worker processes.')
+    args = parser.parse_args()
+
+    results = [run_mode(mode.strip(), args) for mode in args.modes.split(',')]
+    print(
+        f"{'mode':<19}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}{'threads':>9}"
+        f"{'PSS MB':>9}{'start s':>9}"
+    )
+    for row in results:
+        pss = f"{row['peak_pss_mb']:.0f}" if row['peak_pss_mb'] else 'None'
+        print(
+            f"{row['mode']:<19}{row['requests']:>10}{row['rps']:>10.1f}{row['p50_ms']:>10.1f}"
+            f"{row['p99_ms']:>10.1f}{row['errors']:>8}{str(row['peak_threads']):>9}{pss:>9}{row['startup_s']:>9.2f}"
+        )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+import collections
+import threading
+import time
+
+
+class LocalCache:
+    """In-process LRU cache with per-entry expiry."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = collections.OrderedDict()
+        # Counters are kept out of the LRU so they are never evicted.
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._counters.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            value = self._counters.get(key, 0) + 1
+            self._counters[key] = value
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._counters.clear()
+
+
+class MemoryRedisClient:
+    """Local stand-in for a Redis connection, implementing the subset of the
+    redis-py client API used by RedisCache. Selected with ``memory://``."""
+
+    def __init__(self):
+        self._cache = LocalCache(max_entries=100000)
+
+    def get(self, key):
+        value = self._cache.get(key)
+        if value is None:
+            return None
+        return value if isinstance(value, bytes) else str(value).encode('utf-8')
+
+    def set(self, key, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        self._cache.set(key, value, ttl=ex)
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self._cache.delete(key)
+        return len(keys)
+
+    def incr(self, key):
+        return self._cache.incr(key)
+
+
+class RedisCache:
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key):
+        value = self.client.get(key)
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, ex=ttl)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+
+def _create_redis_client(url):
+    if url.startswith('memory://'):
+        return MemoryRedisClient()
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError('CACHE_BACKEND=redis requires the redis package (pip install redis)')
+    return redis.Redis.from_url(url)
+
+
+class Cache:
+    """Namespaced cache with generation-based invalidation.
+
+    Keys are stored as ``<prefix>:<namespace>:<generation>:<key>``.
+    ``invalidate(namespace)`` bumps the generation, so every entry in that
+    namespace becomes unreachable at once and ages out of the backend.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self.prefix = 'bdms'
+        self.default_ttl = 300
+        self._stats = collections.defaultdict(lambda: {'hits': 0, 'misses': 0})
+        self._stats_lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_BACKEND', 'local')
+        app.config.setdefault('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+        app.config.setdefault('CACHE_DEFAULT_TTL', 300)
+        app.config.setdefault('CACHE_MAX_ENTRIES', 1024)
+        app.config.setdefault('CACHE_KEY_PREFIX', 'bdms')
+
+        backend = app.config['CACHE_BACKEND']
+        if backend == 'local':
+            self.backend = LocalCache(max_entries=app.config['CACHE_MAX_ENTRIES'])
+        elif backend == 'redis':
+            self.backend = RedisCache(_create_redis_client(app.config['CACHE_REDIS_URL']))
+        else:
+            raise RuntimeError(f'Unknown CACHE_BACKEND: {backend}')
+        self.default_ttl = app.config['CACHE_DEFAULT_TTL']
+        self.prefix = app.config['CACHE_KEY_PREFIX']
+        app.extensions['cache'] = self
+
+    def _generation(self, namespace):
+        return self.backend.get(f'{self.prefix}:{namespace}:generation') or 0
+
+    def _key(self, namespace, key):
+        return f'{self.prefix}:{namespace}:{self._generation(namespace)}:{key}'
+
+    def _count(self, namespace, outcome):
+        with self._stats_lock:
+            self._stats[namespace][outcome] += 1
+
+    def get(self, namespace, key):
+        value = self.backend.get(self._key(namespace, key))
+        self._count(namespace, 'misses' if value is None else 'hits')
+        return value
+
+    def set(self, namespace, key, value, ttl=None):
+        self.backend.set(self._key(namespace, key), value, ttl=ttl or self.default_ttl)
+
+    def get_or_set(self, namespace, key, build, ttl=None):
+        # Resolve the generation once: if the namespace is invalidated while
+        # ``build`` runs, the result is stored under the old generation and
+        # is never served.
+        full_key = self._key(namespace, key)
+        value = self.backend.get(full_key)
+        self._count(namespace, 'misses' if value is None else 'hits')
+        if value is None:
+            value = build()
+            if value is not None:
+                self.backend.set(full_key, value, ttl=ttl or self.default_ttl)
+        return value
+
+    def delete(self, namespace, key):
+        self.backend.delete(self._key(namespace, key))
+
+    def invalidate(self, namespace):
+        self.backend.incr(f'{self.prefix}:{namespace}:generation')
+
+    def stats(self):
+        with self._stats_lock:
+            return {namespace: dict(counts) for namespace, counts in self._stats.items()}
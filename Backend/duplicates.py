@@ -0,0 +1,171 @@
+"""Near-duplicate defect detection with MinHash locality-sensitive hashing.
+
+Each defect's title and description are reduced to character trigrams and
+a MinHash signature of ``NUM_HASHES`` values, split into ``BANDS`` bands.
+One row per band goes into ``defect_signatures``, indexed by
+``(building_id, band_hash)``. Two texts with Jaccard similarity ``s`` share
+at least one band with probability ``1 - (1 - s**ROWS)**BANDS``, so a
+lookup is a handful of index probes regardless of table size; only the
+few candidates found are compared exactly.
+
+The table is kept current by a session hook. ``rebuild_signatures``
+recomputes it, e.g. after a bulk import.
+"""
+import re
+import struct
+import zlib
+from sqlalchemy import delete, event, func, insert, inspect, select
+from extensions import db
+from models import Defect, DefectSignature
+
+
+NUM_HASHES = 64
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+DUPLICATE_THRESHOLD = 0.5
+MAX_DUPLICATES = 5
+MAX_CANDIDATES = 50
+REBUILD_BATCH_SIZE = 1000
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Fixed coefficients so signatures agree across processes and restarts.
+_PERMUTATIONS = [
+    ((index * 0x9E3779B1 + 0x7F4A7C15) % _MERSENNE_PRIME | 1, (index * 0x85EBCA6B + 0xC2B2AE35) % _MERSENNE_PRIME)
+    for index in range(1, NUM_HASHES + 1)
+]
+_WORD_SEPARATORS = re.compile(r'[^a-z0-9]+')
+_TRACKED_ATTRIBUTES = ('title', 'description', 'building_id')
+
+
+def shingles(title, description):
+    text = _WORD_SEPARATORS.sub(' ', f'{title or ""} {description or ""}'.lower()).strip()
+    if len(text) < 3:
+        return {text} if text else set()
+    return {text[index:index + 3] for index in range(len(text) - 2)}
+
+
+def jaccard(left, right):
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+
+def minhash(shingle_set):
+    hashes = [zlib.crc32(shingle.encode('utf-8')) for shingle in shingle_set]
+    return [
+        min(((a * value + b) % _MERSENNE_PRIME) & _MAX_HASH for value in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def band_hashes(shingle_set):
+    """One signed 64-bit key per band: band index in the high bits, hash of its rows in the low."""
+    if not shingle_set:
+        return []
+    signature = minhash(shingle_set)
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        key = (band << 32) | zlib.crc32(struct.pack(f'<{ROWS}I', *rows))
+        keys.append(key)
+    return keys
+
+
+def _signature_rows(defect_id, building_id, title, description):
+    return [
+        {'defect_id': defect_id, 'building_id': building_id, 'band_hash': key}
+        for key in band_hashes(shingles(title, description))
+    ]
+
+
+def find_duplicates(building_id, title, description, exclude_id=None, filters=(), limit=MAX_DUPLICATES):
+    """Unfinished defects in ``building_id`` whose text is similar, most similar first.
+
+    ``filters`` are extra predicates on Defect, such as a visibility filter.
+    """
+    query_shingles = shingles(title, description)
+    keys = band_hashes(query_shingles)
+    if not keys:
+        return []
+
+    # Defects that can no longer be duplicates (completed, deleted, hidden
+    # by ``filters``) are dropped before the LIMIT, or enough stale
+    # signatures could push every live candidate out.
+    signatures = DefectSignature.__table__
+    candidate_query = (
+        select(Defect.id, Defect.title, Defect.description, Defect.status)
+        .select_from(signatures)
+        .join(Defect, Defect.id == signatures.c.defect_id)
+        .where(
+            signatures.c.building_id == building_id,
+            signatures.c.band_hash.in_(keys),
+            Defect.building_id == building_id,
+            Defect.deleted_at.is_(None),
+            Defect.status != 'Completed',
+            *filters,
+        )
+        .group_by(Defect.id, Defect.title, Defect.description, Defect.status)
+        .order_by(func.count().desc(), Defect.id)
+        .limit(MAX_CANDIDATES)
+    )
+    if exclude_id is not None:
+        candidate_query = candidate_query.where(Defect.id != exclude_id)
+    rows = db.session.execute(candidate_query).all()
+
+    matches = []
+    for defect_id, other_title, other_description, status in rows:
+        similarity = jaccard(query_shingles, shingles(other_title, other_description))
+        if similarity >= DUPLICATE_THRESHOLD:
+            matches.append({'id': defect_id, 'title': other_title, 'status': status, 'similarity': round(similarity, 3)})
+    matches.sort(key=lambda match: (-match['similarity'], match['id']))
+    return matches[:limit]
+
+
+@event.listens_for(db.session, 'after_flush')
+def _maintain_signatures(session, flush_context):
+    signatures = DefectSignature.__table__
+    stale_ids = []
+    rows = []
+    for obj in session.new:
+        if isinstance(obj, Defect):
+            rows.extend(_signature_rows(obj.id, obj.building_id, obj.title, obj.description))
+    for obj in session.dirty:
+        if not isinstance(obj, Defect):
+            continue
+        state = inspect(obj)
+        if any(state.attrs[key].history.has_changes() for key in _TRACKED_ATTRIBUTES):
+            stale_ids.append(obj.id)
+            rows.extend(_signature_rows(obj.id, obj.building_id, obj.title, obj.description))
+    for obj in session.deleted:
+        if isinstance(obj, Defect):
+            stale_ids.append(obj.id)
+
+    if stale_ids:
+        session.connection().execute(delete(signatures).where(signatures.c.defect_id.in_(stale_ids)))
+    if rows:
+        session.connection().execute(insert(signatures), rows)
+
+
+def rebuild_signatures(batch_size=REBUILD_BATCH_SIZE):
+    """Recompute defect_signatures for every live defect."""
+    signatures = DefectSignature.__table__
+    db.session.execute(delete(signatures))
+    count = 0
+    last_id = 0
+    while True:
+        batch = db.session.execute(
+            select(Defect.id, Defect.building_id, Defect.title, Defect.description)
+            .where(Defect.id > last_id)
+            .order_by(Defect.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            break
+        rows = [row for defect in batch for row in _signature_rows(*defect)]
+        if rows:
+            db.session.execute(insert(signatures), rows)
+        count += len(batch)
+        last_id = batch[-1].id
+    db.session.commit()
+    return count
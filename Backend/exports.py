@@ -0,0 +1,185 @@
+"""Per-table CSV and Parquet exports for warehouse ingestion, and the
+full-database snapshot that ``flask restore`` loads back.
+
+Rows are read in primary-key order in batches of ``EXPORT_BATCH_SIZE``
+with keyset pagination, so memory stays flat however big the table is.
+Inline base64 images are never exported to CSV or Parquet: each image
+column is replaced by ``has_<column>`` and ``<column>_ref``, which holds
+the image URL when the photo was uploaded (or linked) rather than
+embedded. The snapshot keeps them, since it has to restore every row.
+"""
+import csv
+import datetime
+import io
+import json
+from sqlalchemy import Boolean, DateTime, Float, Integer, Numeric, case, func, select
+from extensions import db
+from models import ArchivedDefect, ArchivedDefectComment, Building, Defect, DefectComment, User
+from serializers import (
+    ARCHIVED_DEFECT_COMMENT_EXPORT, ARCHIVED_DEFECT_EXPORT, BUILDING, DEFECT_COMMENT, DEFECT_EXPORT, USER,
+)
+
+
+EXPORT_FORMATS = ('csv', 'parquet')
+EXPORT_BATCH_SIZE = 5000
+
+_IMAGE_COLUMNS = ('initial_report_image', 'technician_report_image')
+_EXCLUDED_COLUMNS = {'users': ('password_hash',)}
+_TABLES = {
+    'users': User,
+    'buildings': Building,
+    'defects': Defect,
+    'defect_comments': DefectComment,
+    'defects_archive': ArchivedDefect,
+    'defect_comments_archive': ArchivedDefectComment,
+}
+EXPORT_TABLES = tuple(_TABLES)
+
+# Tables in the full snapshot (GET /api/analytics/export), in load order.
+# The archive tables are included so a restored copy keeps the history
+# that ``flask archive-defects`` moved out of the live tables.
+SNAPSHOT_SERIALIZERS = {
+    'users': USER,
+    'buildings': BUILDING,
+    'defects': DEFECT_EXPORT,
+    'defect_comments': DEFECT_COMMENT,
+    'defects_archive': ARCHIVED_DEFECT_EXPORT,
+    'defect_comments_archive': ARCHIVED_DEFECT_COMMENT_EXPORT,
+}
+
+
+def _image_ref(column):
+    return case((func.substr(column, 1, 5) == 'data:', None), else_=column)
+
+
+def export_columns(table_name):
+    """Labelled SQL expressions selected for ``table_name``, in output order."""
+    table = _TABLES[table_name].__table__
+    excluded = _EXCLUDED_COLUMNS.get(table_name, ())
+    columns = []
+    for column in table.columns:
+        if column.name in excluded:
+            continue
+        if column.name in _IMAGE_COLUMNS:
+            columns.append(column.isnot(None).label(f'has_{column.name}'))
+            columns.append(_image_ref(column).label(f'{column.name}_ref'))
+        else:
+            columns.append(column.label(column.name))
+    return columns
+
+
+def iter_batches(table_name, batch_size=EXPORT_BATCH_SIZE):
+    """Yield lists of row tuples from ``table_name`` in primary-key order."""
+    table = _TABLES[table_name].__table__
+    columns = export_columns(table_name)
+    id_index = [column.name for column in columns].index('id')
+    last_id = None
+    while True:
+        query = select(*columns).order_by(table.c.id).limit(batch_size)
+        if last_id is not None:
+            query = query.where(table.c.id > last_id)
+        rows = db.session.execute(query).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1][id_index]
+
+
+def _csv_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if value is None:
+        return ''
+    return value
+
+
+def iter_csv(table_name, batch_size=EXPORT_BATCH_SIZE):
+    """Yield the CSV export of ``table_name`` in chunks, header first."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.name for column in export_columns(table_name)])
+    for rows in iter_batches(table_name, batch_size):
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError('Parquet export requires the pyarrow package (pip install pyarrow)')
+    return pyarrow
+
+
+def _arrow_schema(pa, columns):
+    fields = []
+    for column in columns:
+        if isinstance(column.type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, Float):
+            arrow_type = pa.float64()
+        elif isinstance(column.type, Numeric):
+            # Rows hold Decimals, which Arrow only accepts as decimals.
+            arrow_type = pa.decimal128(column.type.precision or 38, column.type.scale or 0)
+        elif isinstance(column.type, DateTime):
+            arrow_type = pa.timestamp('us')
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+def write_parquet(table_name, target, batch_size=EXPORT_BATCH_SIZE, compression='zstd'):
+    """Write ``table_name`` to ``target`` (a path or binary file), one row group per batch."""
+    pa = _import_pyarrow()
+    columns = export_columns(table_name)
+    schema = _arrow_schema(pa, columns)
+    with pa.parquet.ParquetWriter(target, schema, compression=compression) as writer:
+        for rows in iter_batches(table_name, batch_size):
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)],
+                schema=schema,
+            ))
+    return target
+
+
+def write_csv(table_name, target, batch_size=EXPORT_BATCH_SIZE):
+    with open(target, 'w', newline='', encoding='utf-8') as output:
+        for chunk in iter_csv(table_name, batch_size):
+            output.write(chunk)
+    return target
+
+
+def build_snapshot():
+    """The full snapshot as one dict of ``{table: [row, ...]}``."""
+    return {name: serializer.all(serializer.select()) for name, serializer in SNAPSHOT_SERIALIZERS.items()}
+
+
+def iter_snapshot_ndjson(batch_size=EXPORT_BATCH_SIZE):
+    """Yield the full snapshot as NDJSON, one ``{"table": ..., "row": ...}`` per line.
+
+    Each table is written in one contiguous run, parents before children.
+    """
+    for table_name, serializer in SNAPSHOT_SERIALIZERS.items():
+        id_column = serializer.model.__table__.c.id
+        last_id = None
+        while True:
+            statement = serializer.select().order_by(id_column).limit(batch_size)
+            if last_id is not None:
+                statement = statement.where(id_column > last_id)
+            rows = serializer.all(statement)
+            if not rows:
+                break
+            yield ''.join(json.dumps({'table': table_name, 'row': row}) + '\n' for row in rows)
+            if len(rows) < batch_size:
+                break
+            last_id = rows[-1]['id']
@@ -1,5 +1,15 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from admission import AdmissionControl
+from cache import Cache
+from profiling import RequestProfiler
+from replicas import ReplicaRouter, RoutingSession
+from sqlite_tuning import SQLiteTuning
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
+cache = Cache()
+replicas = ReplicaRouter()
+sqlite_tuning = SQLiteTuning()
+profiler = RequestProfiler()
+admission = AdmissionControl()
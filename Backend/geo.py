@@ -0,0 +1,74 @@
+import math
+from sqlalchemy import or_, select
+from extensions import db
+from models import Building
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def parse_coordinates(latitude, longitude):
+    """Validate a latitude/longitude pair, returning floats or raising ValueError."""
+    latitude = float(latitude)
+    longitude = float(longitude)
+    if not (math.isfinite(latitude) and -90 <= latitude <= 90):
+        raise ValueError('latitude must be between -90 and 90')
+    if not (math.isfinite(longitude) and -180 <= longitude <= 180):
+        raise ValueError('longitude must be between -180 and 180')
+    return latitude, longitude
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """Latitude range and longitude ranges enclosing a circle.
+
+    Returns ``(min_lat, max_lat, [(min_lon, max_lon), ...])``; a circle
+    crossing the antimeridian needs two longitude ranges.
+    """
+    angular = radius_km / EARTH_RADIUS_KM
+    min_lat = latitude - math.degrees(angular)
+    max_lat = latitude + math.degrees(angular)
+    if min_lat <= -90 or max_lat >= 90:
+        # The circle contains a pole: every longitude is in range.
+        return max(min_lat, -90.0), min(max_lat, 90.0), [(-180.0, 180.0)]
+
+    delta_lon = math.degrees(math.asin(math.sin(angular) / math.cos(math.radians(latitude))))
+    min_lon = longitude - delta_lon
+    max_lon = longitude + delta_lon
+    if min_lon < -180:
+        return min_lat, max_lat, [(min_lon + 360, 180.0), (-180.0, max_lon)]
+    if max_lon > 180:
+        return min_lat, max_lat, [(min_lon, 180.0), (-180.0, max_lon - 360)]
+    return min_lat, max_lat, [(min_lon, max_lon)]
+
+
+def buildings_within(latitude, longitude, radius_km):
+    """``{building_id: distance_km}`` for buildings inside the radius.
+
+    Candidates come from a bounding-box range scan on
+    ix_buildings_latitude_longitude, which works the same on PostgreSQL and
+    SQLite; the exact great-circle distance is then checked in Python.
+    """
+    min_lat, max_lat, lon_ranges = bounding_box(latitude, longitude, radius_km)
+    rows = db.session.execute(
+        select(Building.id, Building.latitude, Building.longitude)
+        .where(
+            Building.latitude.between(min_lat, max_lat),
+            or_(*[Building.longitude.between(low, high) for low, high in lon_ranges]),
+        )
+    ).all()
+
+    distances = {}
+    for building_id, building_lat, building_lon in rows:
+        distance = haversine_km(latitude, longitude, building_lat, building_lon)
+        if distance <= radius_km:
+            distances[building_id] = distance
+    return distances
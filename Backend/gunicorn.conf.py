@@ -0,0 +1,108 @@
+"""Gunicorn settings for ``gunicorn -c gunicorn.conf.py wsgi:application``.
+
+``GUNICORN_PROFILE`` picks the worker model:
+
+- ``gthread`` (default): ``WEB_CONCURRENCY`` processes (default: one per
+  CPU) with ``GUNICORN_THREADS`` threads each (default 8). Predictable,
+  and right for the CPU-bound parts (serialization, bcrypt, exports).
+- ``gevent``: the same number of processes, each serving up to
+  ``GUNICORN_WORKER_CONNECTIONS`` connections (default 1000) on greenlets.
+  Better when most requests wait on slow clients or the database.
+  Needs ``pip install gevent``, plus ``psycogreen`` so psycopg2 queries
+  yield instead of blocking the worker.
+
+The app is preloaded in the master (``GUNICORN_PRELOAD=0`` turns this
+off) and garbage collection is frozen before forking so workers share
+its memory. Workers are restarted after ``GUNICORN_MAX_REQUESTS``
+requests (default 1000, plus up to 10% jitter so they do not all restart
+at once) and get ``GUNICORN_GRACEFUL_TIMEOUT`` seconds (default 30) to
+finish in-flight requests when recycled or on shutdown.
+
+With more than one worker the cache must be shared (``CACHE_BACKEND=redis``
+with a Redis server): cache invalidation, read-your-writes stickiness
+after a write and token revocation are kept in the cache, and a local one
+would only apply them in the worker that handled the request. Rate limits
+and the export concurrency cap must be shared for the same reason, or
+each worker allows the full amount. Startup is refused otherwise, unless
+``GUNICORN_ALLOW_LOCAL_CACHE=1``.
+"""
+import gc
+import multiprocessing
+import os
+from dotenv import load_dotenv
+
+
+PROFILES = ('gthread', 'gevent')
+
+# Same settings the app will read.
+load_dotenv()
+
+profile = os.environ.get('GUNICORN_PROFILE', 'gthread')
+if profile not in PROFILES:
+    raise RuntimeError(f"GUNICORN_PROFILE must be one of {', '.join(PROFILES)}")
+
+if profile == 'gevent':
+    # Patch before the preloaded app imports socket, ssl and threading.
+    from gevent import monkey
+    monkey.patch_all()
+    try:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    except ImportError:
+        pass
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = profile
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+cache_is_local = (
+    os.environ.get('CACHE_BACKEND', 'local') == 'local'
+    or os.environ.get('CACHE_REDIS_URL', '').startswith('memory://')
+)
+if workers > 1 and cache_is_local and os.environ.get('GUNICORN_ALLOW_LOCAL_CACHE') != '1':
+    raise RuntimeError(
+        f'{workers} workers need a shared cache: set CACHE_BACKEND=redis and CACHE_REDIS_URL, '
+        'or WEB_CONCURRENCY=1. Without it an edit, a write\'s replica stickiness or a token '
+        'revocation in one worker is not seen by the others until their cache entries expire. '
+        'GUNICORN_ALLOW_LOCAL_CACHE=1 starts anyway.'
+    )
+
+limits_are_local = os.environ.get('RATE_LIMIT_ENABLED', '1') != '0' and (
+    os.environ.get('RATE_LIMIT_BACKEND') == 'local'
+    or (not os.environ.get('RATE_LIMIT_BACKEND') and cache_is_local)
+)
+if workers > 1 and limits_are_local and os.environ.get('GUNICORN_ALLOW_LOCAL_CACHE') != '1':
+    raise RuntimeError(
+        f'{workers} workers need shared rate limits: unset RATE_LIMIT_BACKEND or set it to redis, '
+        'or WEB_CONCURRENCY=1. With local limits every worker allows the full rate and export '
+        'concurrency on its own. GUNICORN_ALLOW_LOCAL_CACHE=1 starts anyway.'
+    )
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')
+errorlog = '-'
+
+
+def pre_fork(server, worker):
+    # Objects the master has built are never collected by the workers, so
+    # keep the collector from touching (and un-sharing) their pages.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    # Connections opened by the master must not be shared between processes.
+    from extensions import db
+
+    with server.app.wsgi().app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
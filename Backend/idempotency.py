@@ -0,0 +1,196 @@
+"""``Idempotency-Key`` support for write endpoints.
+
+A client that may retry a request (a technician's phone on a bad
+connection) sends a unique ``Idempotency-Key`` header with it. The first
+request with a given key claims the key, runs, and its response is stored;
+any retry with the same key and the same request gets the stored response
+back, marked ``Idempotent-Replayed: true``, without running the handler or
+re-reading the payload's images.
+
+- A retry that arrives while the first request is still running gets 409.
+- Reusing a key for a different request (method, path or body) gets 422.
+- 5xx responses and errors raised by the view release the key, so the
+  retry runs again, unless the view had already committed.
+
+The stored response is written after the view returns, in its own
+transaction, since views commit before building their response. So the
+view's first commit also marks the key ``committed_at``, atomically with
+its changes. If the process dies before the response is stored, the key
+is never released: retries get 409 saying the request was applied, and
+the client has to re-read the resource instead of getting a duplicate
+write.
+
+Keys are per user and kept for ``IDEMPOTENCY_KEY_TTL_HOURS``; after that
+the key may be reused and ``flask purge-idempotency-keys`` (or the
+``purge_idempotency_keys`` job) deletes them.
+"""
+import datetime
+import functools
+import hashlib
+from flask import current_app, g, has_app_context, jsonify, make_response, request
+from sqlalchemy import delete, event, update
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from jobs import job_handler
+from models import IdempotencyKey
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+# A claim older than this without a stored response belongs to a request
+# that died; the key is released for the next retry.
+IDEMPOTENCY_PENDING_TIMEOUT_SECONDS = 60
+_REPLAYED_HEADERS = ('Content-Type', 'ETag', 'Location')
+
+
+def _retention():
+    return datetime.timedelta(hours=current_app.config['IDEMPOTENCY_KEY_TTL_HOURS'])
+
+
+def _request_hash():
+    digest = hashlib.sha256()
+    digest.update(f'{request.method} {request.full_path}\n'.encode('utf-8'))
+    digest.update(request.get_data(cache=True))
+    return digest.hexdigest()
+
+
+def _is_stale(record, now):
+    if record.status_code is None and record.committed_at is None:
+        return record.created_at < now - datetime.timedelta(seconds=IDEMPOTENCY_PENDING_TIMEOUT_SECONDS)
+    return record.created_at < now - _retention()
+
+
+def _claim(user_id, key, request_hash):
+    """Insert the pending row for ``key``. Returns ``(claimed, existing)``."""
+    for _ in range(2):
+        now = datetime.datetime.utcnow()
+        record = IdempotencyKey(user_id=user_id, key=key, request_hash=request_hash, created_at=now)
+        db.session.add(record)
+        try:
+            db.session.commit()
+            return record, None
+        except IntegrityError:
+            db.session.rollback()
+
+        existing = IdempotencyKey.query.filter_by(user_id=user_id, key=key).one_or_none()
+        if existing is not None and not _is_stale(existing, now):
+            return None, existing
+        if existing is not None:
+            db.session.execute(
+                delete(IdempotencyKey)
+                .where(IdempotencyKey.id == existing.id, IdempotencyKey.created_at == existing.created_at)
+            )
+            db.session.commit()
+    return None, None
+
+
+def _release(record_id):
+    g.pop('idempotency_record_id', None)
+    db.session.rollback()
+    # A view that committed before failing keeps its key: running it again
+    # would repeat the write.
+    db.session.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.id == record_id, IdempotencyKey.committed_at.is_(None))
+    )
+    db.session.commit()
+
+
+@event.listens_for(db.session, 'before_commit')
+def _mark_committed(session):
+    record_id = g.get('idempotency_record_id') if has_app_context() else None
+    if record_id is not None:
+        session.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.id == record_id)
+            .values(committed_at=datetime.datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+
+
+@event.listens_for(db.session, 'after_commit')
+def _committed(session):
+    # Only the first successful commit needs marking; a failed one rolls
+    # the mark back with it and the next commit tries again.
+    if has_app_context():
+        g.pop('idempotency_record_id', None)
+
+
+def _replay(record):
+    response = current_app.response_class(record.response_body, status=record.status_code)
+    for name, value in (record.response_headers or {}).items():
+        response.headers[name] = value
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(fn):
+    """Honour ``Idempotency-Key`` on a view that takes the user first.
+
+    Goes below ``require_auth`` (and ``require_permission``) so keys are
+    scoped to the authenticated user.
+    """
+    @functools.wraps(fn)
+    def wrapper(user, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return fn(user, *args, **kwargs)
+        key = key.strip()
+        if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            return jsonify({'message': f'{IDEMPOTENCY_HEADER} must be 1 to {IDEMPOTENCY_KEY_MAX_LENGTH} characters'}), 400
+
+        request_hash = _request_hash()
+        record, existing = _claim(user.id, key, request_hash)
+        if record is None:
+            if existing is not None and existing.request_hash != request_hash:
+                return jsonify({'message': f'{IDEMPOTENCY_HEADER} was already used for a different request'}), 422
+            if existing is not None and existing.status_code is None and existing.committed_at is not None:
+                return jsonify({
+                    'message': f'The request with this {IDEMPOTENCY_HEADER} was applied, but its response was lost; '
+                               'fetch the current state instead',
+                }), 409
+            if existing is None or existing.status_code is None:
+                response = jsonify({'message': 'A request with this Idempotency-Key is still being processed'})
+                response.status_code = 409
+                response.headers['Retry-After'] = '1'
+                return response
+            return _replay(existing)
+
+        record_id = record.id
+        g.idempotency_record_id = record_id
+        try:
+            response = make_response(fn(user, *args, **kwargs))
+        except Exception:
+            _release(record_id)
+            raise
+        if response.status_code >= 500 or response.is_streamed:
+            _release(record_id)
+            return response
+
+        # The view has committed or failed; start clean either way.
+        g.pop('idempotency_record_id', None)
+        db.session.rollback()
+        db.session.execute(
+            IdempotencyKey.__table__.update()
+            .where(IdempotencyKey.id == record_id)
+            .values(
+                status_code=response.status_code,
+                response_body=response.get_data(as_text=True),
+                response_headers={name: response.headers[name] for name in _REPLAYED_HEADERS if name in response.headers},
+            )
+        )
+        db.session.commit()
+        return response
+    return wrapper
+
+
+def purge_expired_keys(older_than=None):
+    """Delete keys past the retention window. Returns the number deleted."""
+    cutoff = datetime.datetime.utcnow() - (older_than or _retention())
+    deleted = db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff)).rowcount
+    db.session.commit()
+    return deleted
+
+
+@job_handler('purge_idempotency_keys', max_concurrency=1)
+def purge_idempotency_keys_job(payload, job):
+    return {'deleted': purge_expired_keys()}
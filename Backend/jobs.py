@@ -0,0 +1,198 @@
+import datetime
+import os
+import socket
+import threading
+import time
+import traceback
+from sqlalchemy import func, select, update
+from extensions import db
+from models import Job
+from routes.permissions import Role
+
+
+JOB_RETRY_BASE_SECONDS = 10
+JOB_LOCK_TIMEOUT_MINUTES = 30
+# First key of the PostgreSQL advisory locks that serialize capped claims;
+# the second is a hash of the job type.
+JOB_CLAIM_LOCK_NAMESPACE = 7301
+
+# job_type -> {'fn': callable, 'roles': tuple, 'max_concurrency': int | None}
+JOB_HANDLERS = {}
+
+
+def job_handler(job_type, roles=(Role.ADMIN,), max_concurrency=None):
+    """Register ``fn(payload, job)`` as the handler for ``job_type``.
+
+    ``roles`` limits who may enqueue the job through the API and
+    ``max_concurrency`` caps how many jobs of this type run at once
+    across all workers.
+    """
+    def decorator(fn):
+        JOB_HANDLERS[job_type] = {
+            'fn': fn,
+            'roles': tuple(roles),
+            'max_concurrency': max_concurrency,
+        }
+        return fn
+    return decorator
+
+
+def enqueue(job_type, payload=None, user_id=None, max_attempts=3, run_after=None):
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f'Unknown job type: {job_type}')
+
+    job = Job(
+        job_type=job_type,
+        status='queued',
+        payload=payload or {},
+        attempts=0,
+        max_attempts=max_attempts,
+        run_after=run_after or datetime.datetime.utcnow(),
+        created_by_id=user_id,
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def _requeue_stale_jobs(now):
+    cutoff = now - datetime.timedelta(minutes=JOB_LOCK_TIMEOUT_MINUTES)
+    db.session.execute(
+        update(Job)
+        .where(Job.status == 'running', Job.locked_at < cutoff)
+        .values(status='queued', locked_by=None, locked_at=None, run_after=now)
+    )
+    db.session.commit()
+
+
+def _lock_job_type(job_type):
+    """Hold the claim lock for ``job_type`` until the transaction ends.
+
+    Under READ COMMITTED two workers counting running jobs at the same
+    time would both see the old count and both pass the cap. On
+    PostgreSQL a transaction-scoped advisory lock makes the second claim
+    wait for the first to commit; SQLite already runs one writer at a time.
+    """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(
+            select(func.pg_advisory_xact_lock(JOB_CLAIM_LOCK_NAMESPACE, func.hashtext(job_type)))
+        )
+
+
+def claim_next_job(worker_id):
+    """Atomically move the oldest runnable job to ``running``.
+
+    The claim is a conditional UPDATE, so two workers racing for the
+    same row cannot both win it. Job types at their concurrency limit
+    are skipped; claims of a capped type are serialized (see
+    ``_lock_job_type``) so the running count they check is never stale.
+    """
+    now = datetime.datetime.utcnow()
+    candidates = db.session.execute(
+        select(Job.id, Job.job_type)
+        .where(Job.status == 'queued', Job.run_after <= now)
+        .order_by(Job.run_after, Job.id)
+        .limit(20)
+    ).all()
+
+    for job_id, job_type in candidates:
+        handler = JOB_HANDLERS.get(job_type)
+        conditions = [Job.id == job_id, Job.status == 'queued']
+        if handler and handler['max_concurrency']:
+            _lock_job_type(job_type)
+            running = (
+                select(func.count(Job.id))
+                .where(Job.job_type == job_type, Job.status == 'running')
+                .scalar_subquery()
+            )
+            conditions.append(running < handler['max_concurrency'])
+
+        claimed = db.session.execute(
+            update(Job)
+            .where(*conditions)
+            .values(
+                status='running',
+                locked_by=worker_id,
+                locked_at=now,
+                started_at=now,
+                attempts=Job.attempts + 1,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if claimed.rowcount == 1:
+            return db.session.get(Job, job_id)
+    return None
+
+
+def run_job(job):
+    handler = JOB_HANDLERS.get(job.job_type)
+    now = datetime.datetime.utcnow()
+    try:
+        if not handler:
+            raise ValueError(f'Unknown job type: {job.job_type}')
+        result = handler['fn'](job.payload or {}, job)
+    except Exception:
+        db.session.rollback()
+        job = db.session.get(Job, job.id)
+        job.error = traceback.format_exc()
+        job.locked_by = None
+        job.locked_at = None
+        if job.attempts < job.max_attempts:
+            job.status = 'queued'
+            delay = JOB_RETRY_BASE_SECONDS * (2 ** (job.attempts - 1))
+            job.run_after = now + datetime.timedelta(seconds=delay)
+        else:
+            job.status = 'failed'
+            job.finished_at = datetime.datetime.utcnow()
+        db.session.commit()
+        return job
+
+    job.status = 'succeeded'
+    job.result = result
+    job.error = None
+    job.locked_by = None
+    job.locked_at = None
+    job.finished_at = datetime.datetime.utcnow()
+    db.session.commit()
+    return job
+
+
+def work(worker_id, poll_interval=1.0, burst=False, stop_event=None):
+    """Claim and run jobs until stopped, or until the queue is empty in burst mode."""
+    while not (stop_event and stop_event.is_set()):
+        job = claim_next_job(worker_id)
+        if job:
+            run_job(job)
+            continue
+        db.session.remove()
+        if burst:
+            return
+        time.sleep(poll_interval)
+
+
+def run_worker(app, concurrency=1, poll_interval=1.0, burst=False):
+    base_id = f'{socket.gethostname()}:{os.getpid()}'
+    stop_event = threading.Event()
+
+    with app.app_context():
+        _requeue_stale_jobs(datetime.datetime.utcnow())
+
+    def _thread_main(index):
+        with app.app_context():
+            work(f'{base_id}:{index}', poll_interval, burst, stop_event)
+
+    threads = [
+        threading.Thread(target=_thread_main, args=(i,), daemon=True)
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.5)
+    except KeyboardInterrupt:
+        stop_event.set()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,85 @@
+"""Add optimistic locking versions and one comment record per defect
+
+Revision ID: a7b8c9d0e1f2
+Revises: f6a7b8c9d0e1
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7b8c9d0e1f2'
+down_revision = 'f6a7b8c9d0e1'
+branch_labels = None
+depends_on = None
+
+COMMENT_FIELDS = [
+    'initial_report',
+    'executive_decision',
+    'technician_report',
+    'verification_report',
+    'final_completion',
+]
+
+
+def _merge_duplicate_comments():
+    # Concurrent requests could create several comment rows for one defect.
+    # Keep the most recently updated row and fill its empty fields from the
+    # others before the unique index is added.
+    bind = op.get_bind()
+    comments = sa.table(
+        'defect_comments',
+        sa.column('id', sa.Integer),
+        sa.column('defect_id', sa.Integer),
+        sa.column('updated_at', sa.DateTime),
+        sa.column('created_at', sa.DateTime),
+        *[sa.column(field, sa.Text) for field in COMMENT_FIELDS],
+    )
+    duplicated = (
+        sa.select(comments.c.defect_id)
+        .group_by(comments.c.defect_id)
+        .having(sa.func.count(comments.c.id) > 1)
+    )
+    rows = bind.execute(
+        sa.select(comments)
+        .where(comments.c.defect_id.in_(duplicated))
+        .order_by(
+            comments.c.defect_id,
+            comments.c.updated_at.desc(),
+            comments.c.created_at.desc(),
+            comments.c.id.desc(),
+        )
+    ).mappings().all()
+
+    groups = {}
+    for row in rows:
+        groups.setdefault(row['defect_id'], []).append(row)
+
+    for group in groups.values():
+        keeper, others = group[0], group[1:]
+        merged = {}
+        for field in COMMENT_FIELDS:
+            if keeper[field]:
+                continue
+            for other in others:
+                if other[field]:
+                    merged[field] = other[field]
+                    break
+        if merged:
+            bind.execute(comments.update().where(comments.c.id == keeper['id']).values(**merged))
+        bind.execute(comments.delete().where(comments.c.id.in_([other['id'] for other in others])))
+
+
+def upgrade():
+    op.add_column('defects', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('defect_comments', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    _merge_duplicate_comments()
+    op.create_index('uq_defect_comments_defect_id', 'defect_comments', ['defect_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_defect_comments_defect_id', table_name='defect_comments')
+    op.drop_column('defect_comments', 'version')
+    op.drop_column('defects', 'version')
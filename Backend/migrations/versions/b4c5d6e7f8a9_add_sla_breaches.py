@@ -0,0 +1,66 @@
+"""Add SLA breaches
+
+Revision ID: b4c5d6e7f8a9
+Revises: a3b4c5d6e7f8
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4c5d6e7f8a9'
+down_revision = 'a3b4c5d6e7f8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_defects_status_priority_created_at', 'defects', ['status', 'priority', 'created_at'], unique=False,
+    )
+    op.create_table(
+        'sla_breaches',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('defect_id', sa.Integer(), nullable=False),
+        sa.Column('rule', sa.String(length=32), nullable=False),
+        sa.Column('building_id', sa.Integer(), nullable=False),
+        sa.Column(
+            'priority',
+            postgresql.ENUM('low', 'medium', 'high', name='defect_priorities', create_type=False),
+            nullable=False,
+        ),
+        sa.Column(
+            'status',
+            postgresql.ENUM('Open', 'Reviewed', 'Ongoing', 'Done', 'Completed', name='defect_statuses', create_type=False),
+            nullable=False,
+        ),
+        sa.Column('sla_hours', sa.Integer(), nullable=False),
+        sa.Column('defect_created_at', sa.DateTime(), nullable=False),
+        sa.Column('detected_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('uq_sla_breaches_defect_rule', 'sla_breaches', ['defect_id', 'rule'], unique=True)
+    op.create_index('ix_sla_breaches_detected_at', 'sla_breaches', ['detected_at'], unique=False)
+    # Empty on purpose: the first scan checks every existing defect.
+    op.create_table(
+        'sla_watermarks',
+        sa.Column('rule', sa.String(length=32), nullable=False),
+        sa.Column(
+            'priority',
+            postgresql.ENUM('low', 'medium', 'high', name='defect_priorities', create_type=False),
+            nullable=False,
+        ),
+        sa.Column('scanned_until', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('rule', 'priority'),
+    )
+
+
+def downgrade():
+    op.drop_table('sla_watermarks')
+    op.drop_index('ix_sla_breaches_detected_at', table_name='sla_breaches')
+    op.drop_index('uq_sla_breaches_defect_rule', table_name='sla_breaches')
+    op.drop_table('sla_breaches')
+    op.drop_index('ix_defects_status_priority_created_at', table_name='defects')
@@ -0,0 +1,80 @@
+"""Add defect archive tables
+
+Revision ID: b8c9d0e1f2a3
+Revises: a7b8c9d0e1f2
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8c9d0e1f2a3'
+down_revision = 'a7b8c9d0e1f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_defects_status_completed_at', 'defects', ['status', 'completed_at'], unique=False)
+    op.create_table(
+        'defects_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('title', sa.String(), nullable=False),
+        sa.Column('description', sa.Text(), nullable=False),
+        sa.Column(
+            'status',
+            postgresql.ENUM('Open', 'Reviewed', 'Ongoing', 'Done', 'Completed', name='defect_statuses', create_type=False),
+            nullable=False,
+        ),
+        sa.Column(
+            'priority',
+            postgresql.ENUM('low', 'medium', 'high', name='defect_priorities', create_type=False),
+            nullable=False,
+        ),
+        sa.Column('image_url', sa.String(), nullable=True),
+        sa.Column('initial_report_image', sa.Text(), nullable=True),
+        sa.Column('technician_report_image', sa.Text(), nullable=True),
+        sa.Column('building_id', sa.Integer(), nullable=False),
+        sa.Column('reporter_id', sa.Integer(), nullable=False),
+        sa.Column('reviewed_by_id', sa.Integer(), nullable=True),
+        sa.Column('assigned_technician_id', sa.Integer(), nullable=True),
+        sa.Column('external_contractor', sa.Boolean(), nullable=True),
+        sa.Column('contractor_name', sa.String(), nullable=True),
+        sa.Column('done_at', sa.DateTime(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+        sa.Column('deleted_by_id', sa.Integer(), nullable=True),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_defects_archive_building_id', 'defects_archive', ['building_id'], unique=False)
+    op.create_table(
+        'defect_comments_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('defect_id', sa.Integer(), nullable=False),
+        sa.Column('initial_report', sa.Text(), nullable=True),
+        sa.Column('executive_decision', sa.Text(), nullable=True),
+        sa.Column('technician_report', sa.Text(), nullable=True),
+        sa.Column('verification_report', sa.Text(), nullable=True),
+        sa.Column('final_completion', sa.Text(), nullable=True),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_defect_comments_archive_defect_id', 'defect_comments_archive', ['defect_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_defect_comments_archive_defect_id', table_name='defect_comments_archive')
+    op.drop_table('defect_comments_archive')
+    op.drop_index('ix_defects_archive_building_id', table_name='defects_archive')
+    op.drop_table('defects_archive')
+    op.drop_index('ix_defects_status_completed_at', table_name='defects')
@@ -0,0 +1,24 @@
+"""Add idempotency key commit time
+
+Revision ID: c5d6e7f8a9b0
+Revises: b4c5d6e7f8a9
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d6e7f8a9b0'
+down_revision = 'b4c5d6e7f8a9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('idempotency_keys', sa.Column('committed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('idempotency_keys', 'committed_at')
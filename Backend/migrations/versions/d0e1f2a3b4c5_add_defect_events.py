@@ -0,0 +1,55 @@
+"""Add defect events
+
+Revision ID: d0e1f2a3b4c5
+Revises: c9d0e1f2a3b4
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'd0e1f2a3b4c5'
+down_revision = 'c9d0e1f2a3b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'defect_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('defect_id', sa.Integer(), nullable=False),
+        sa.Column('building_id', sa.Integer(), nullable=False),
+        sa.Column(
+            'priority',
+            postgresql.ENUM('low', 'medium', 'high', name='defect_priorities', create_type=False),
+            nullable=False,
+        ),
+        sa.Column(
+            'event',
+            sa.Enum('created', 'done', 'completed', 'reopened', name='defect_event_types'),
+            nullable=False,
+        ),
+        sa.Column('occurred_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_defect_events_occurred_at', 'defect_events', ['occurred_at'], unique=False)
+
+    # Backfill what the existing rows still tell us. Reopen history was
+    # never recorded, so reopened counts start from this migration.
+    for table in ('defects', 'defects_archive'):
+        for event, column in (('created', 'created_at'), ('done', 'done_at'), ('completed', 'completed_at')):
+            op.execute(
+                f"INSERT INTO defect_events (defect_id, building_id, priority, event, occurred_at) "
+                f"SELECT id, building_id, priority, '{event}', {column} FROM {table} "
+                f"WHERE {column} IS NOT NULL"
+            )
+
+
+def downgrade():
+    op.drop_index('ix_defect_events_occurred_at', table_name='defect_events')
+    op.drop_table('defect_events')
+    sa.Enum(name='defect_event_types').drop(op.get_bind(), checkfirst=True)
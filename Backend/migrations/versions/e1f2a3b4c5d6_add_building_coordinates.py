@@ -0,0 +1,28 @@
+"""Add building coordinates
+
+Revision ID: e1f2a3b4c5d6
+Revises: d0e1f2a3b4c5
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1f2a3b4c5d6'
+down_revision = 'd0e1f2a3b4c5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('buildings', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('buildings', sa.Column('longitude', sa.Float(), nullable=True))
+    op.create_index('ix_buildings_latitude_longitude', 'buildings', ['latitude', 'longitude'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_buildings_latitude_longitude', table_name='buildings')
+    op.drop_column('buildings', 'longitude')
+    op.drop_column('buildings', 'latitude')
@@ -0,0 +1,64 @@
+"""Add technician workload aggregate
+
+Revision ID: e5f6a7b8c9d0
+Revises: d4e5f6a7b8c9
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5f6a7b8c9d0'
+down_revision = 'd4e5f6a7b8c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_defects_technician_priority_status',
+        'defects',
+        ['assigned_technician_id', 'priority', 'status'],
+        unique=False,
+    )
+    op.create_table(
+        'technician_workloads',
+        sa.Column('technician_id', sa.Integer(), nullable=False),
+        sa.Column(
+            'priority',
+            postgresql.ENUM('low', 'medium', 'high', name='defect_priorities', create_type=False),
+            nullable=False,
+        ),
+        sa.Column('open_count', sa.Integer(), nullable=False),
+        sa.Column('ongoing_count', sa.Integer(), nullable=False),
+        sa.Column('done_count', sa.Integer(), nullable=False),
+        sa.Column('oldest_open_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['technician_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('technician_id', 'priority'),
+    )
+    op.execute(
+        """
+        INSERT INTO technician_workloads
+            (technician_id, priority, open_count, ongoing_count, done_count, oldest_open_at, updated_at)
+        SELECT
+            assigned_technician_id,
+            priority,
+            SUM(CASE WHEN status IN ('Open', 'Reviewed') THEN 1 ELSE 0 END),
+            SUM(CASE WHEN status = 'Ongoing' THEN 1 ELSE 0 END),
+            SUM(CASE WHEN status = 'Done' THEN 1 ELSE 0 END),
+            MIN(CASE WHEN status IN ('Open', 'Reviewed', 'Ongoing') THEN created_at END),
+            CURRENT_TIMESTAMP
+        FROM defects
+        WHERE assigned_technician_id IS NOT NULL AND deleted_at IS NULL
+        GROUP BY assigned_technician_id, priority
+        """
+    )
+
+
+def downgrade():
+    op.drop_table('technician_workloads')
+    op.drop_index('ix_defects_technician_priority_status', table_name='defects')
@@ -0,0 +1,36 @@
+"""Add defect signatures
+
+Revision ID: f2a3b4c5d6e7
+Revises: e1f2a3b4c5d6
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a3b4c5d6e7'
+down_revision = 'e1f2a3b4c5d6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Populate with `flask rebuild-duplicate-index` after upgrading.
+    op.create_table(
+        'defect_signatures',
+        sa.Column('defect_id', sa.Integer(), nullable=False),
+        sa.Column('band_hash', sa.BigInteger(), nullable=False),
+        sa.Column('building_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['defect_id'], ['defects.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('defect_id', 'band_hash'),
+    )
+    op.create_index(
+        'ix_defect_signatures_building_band', 'defect_signatures', ['building_id', 'band_hash'], unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index('ix_defect_signatures_building_band', table_name='defect_signatures')
+    op.drop_table('defect_signatures')
@@ -9,6 +9,8 @@ class User(db.Model):
     email = db.Column(db.String, unique=True, nullable=False)
     password_hash = db.Column(db.String, nullable=False)
     role = db.Column(db.Enum('admin', 'csr', 'building_executive', 'technician', name='user_roles'), nullable=False)
+    # Bumped to invalidate every access token issued to this user.
+    token_version = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
@@ -36,9 +38,16 @@ class Building(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
     address = db.Column(db.String, nullable=False)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
+    __table_args__ = (
+        # Bounding-box lookups for geo queries, see geo.py.
+        db.Index('ix_buildings_latitude_longitude', 'latitude', 'longitude'),
+    )
+
 class Defect(db.Model):
     __tablename__ = 'defects'
     id = db.Column(db.Integer, primary_key=True)
@@ -59,6 +68,7 @@ class Defect(db.Model):
     completed_at = db.Column(db.DateTime, nullable=True)
     deleted_at = db.Column(db.DateTime, nullable=True)
     deleted_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    version = db.Column(db.Integer, default=1, server_default='1', nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
@@ -68,6 +78,16 @@ class Defect(db.Model):
     deleted_by = db.relationship('User', foreign_keys=[deleted_by_id])
     building = db.relationship('Building', backref=db.backref('defects', lazy=True))
 
+    __table_args__ = (
+        db.Index('ix_defects_technician_priority_status', 'assigned_technician_id', 'priority', 'status'),
+        db.Index('ix_defects_status_completed_at', 'status', 'completed_at'),
+        # Range scans of the SLA breach detector, see sla.py.
+        db.Index('ix_defects_status_priority_created_at', 'status', 'priority', 'created_at'),
+    )
+    # Every UPDATE is guarded by the version it read; a concurrent writer
+    # raises StaleDataError instead of silently overwriting.
+    __mapper_args__ = {'version_id_col': version}
+
 
 class DefectComment(db.Model):
     __tablename__ = 'defect_comments'
@@ -81,6 +101,7 @@ class DefectComment(db.Model):
     technician_report = db.Column(db.Text, nullable=True)
     verification_report = db.Column(db.Text, nullable=True)
     final_completion = db.Column(db.Text, nullable=True)
+    version = db.Column(db.Integer, default=1, server_default='1', nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
@@ -88,3 +109,188 @@ class DefectComment(db.Model):
         'Defect',
         backref=db.backref('comments', lazy=True, cascade='all, delete-orphan')
     )
+
+    __table_args__ = (
+        db.Index('uq_defect_comments_defect_id', 'defect_id', unique=True),
+    )
+    __mapper_args__ = {'version_id_col': version}
+
+
+class Upload(db.Model):
+    __tablename__ = 'uploads'
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String(64), unique=True, nullable=False)
+    filename = db.Column(db.String, nullable=True)
+    content_type = db.Column(db.String, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    path = db.Column(db.String, nullable=False)
+    uploaded_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+    uploaded_by = db.relationship('User', foreign_keys=[uploaded_by_id])
+
+
+class ArchivedDefect(db.Model):
+    """Cold copy of a completed or soft-deleted defect, see archive.py."""
+    __tablename__ = 'defects_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    title = db.Column(db.String, nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    status = db.Column(db.Enum('Open', 'Reviewed', 'Ongoing', 'Done', 'Completed', name='defect_statuses'), nullable=False)
+    priority = db.Column(db.Enum('low', 'medium', 'high', name='defect_priorities'), nullable=False)
+    image_url = db.Column(db.String, nullable=True)
+    initial_report_image = db.Column(db.Text, nullable=True)
+    technician_report_image = db.Column(db.Text, nullable=True)
+    building_id = db.Column(db.Integer, nullable=False, index=True)
+    reporter_id = db.Column(db.Integer, nullable=False)
+    reviewed_by_id = db.Column(db.Integer, nullable=True)
+    assigned_technician_id = db.Column(db.Integer, nullable=True)
+    external_contractor = db.Column(db.Boolean, default=False)
+    contractor_name = db.Column(db.String, nullable=True)
+    done_at = db.Column(db.DateTime, nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    deleted_at = db.Column(db.DateTime, nullable=True)
+    deleted_by_id = db.Column(db.Integer, nullable=True)
+    version = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+
+class ArchivedDefectComment(db.Model):
+    __tablename__ = 'defect_comments_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    defect_id = db.Column(db.Integer, nullable=False, index=True)
+    initial_report = db.Column(db.Text, nullable=True)
+    executive_decision = db.Column(db.Text, nullable=True)
+    technician_report = db.Column(db.Text, nullable=True)
+    verification_report = db.Column(db.Text, nullable=True)
+    final_completion = db.Column(db.Text, nullable=True)
+    version = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+
+class TechnicianWorkload(db.Model):
+    __tablename__ = 'technician_workloads'
+    technician_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    priority = db.Column(db.Enum('low', 'medium', 'high', name='defect_priorities'), primary_key=True)
+    open_count = db.Column(db.Integer, default=0, nullable=False)
+    ongoing_count = db.Column(db.Integer, default=0, nullable=False)
+    done_count = db.Column(db.Integer, default=0, nullable=False)
+    # Oldest created_at among the technician's defects not yet done.
+    oldest_open_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+
+class DefectEvent(db.Model):
+    """Append-only log of defect lifecycle transitions, used for trends.
+
+    ``defect_id`` is deliberately not a foreign key so events outlive
+    archived and deleted defects.
+    """
+    __tablename__ = 'defect_events'
+    id = db.Column(db.Integer, primary_key=True)
+    defect_id = db.Column(db.Integer, nullable=False)
+    building_id = db.Column(db.Integer, nullable=False)
+    priority = db.Column(db.Enum('low', 'medium', 'high', name='defect_priorities'), nullable=False)
+    event = db.Column(db.Enum('created', 'done', 'completed', 'reopened', name='defect_event_types'), nullable=False)
+    occurred_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_defect_events_occurred_at', 'occurred_at'),
+    )
+
+
+class DefectSignature(db.Model):
+    """MinHash LSH band keys of a defect's text, see duplicates.py."""
+    __tablename__ = 'defect_signatures'
+    defect_id = db.Column(db.Integer, db.ForeignKey('defects.id', ondelete='CASCADE'), primary_key=True)
+    band_hash = db.Column(db.BigInteger, primary_key=True)
+    building_id = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_defect_signatures_building_band', 'building_id', 'band_hash'),
+    )
+
+
+class SlaBreach(db.Model):
+    """A defect that sat in a status longer than its SLA allows, see sla.py.
+
+    Like ``DefectEvent``, ``defect_id`` is not a foreign key so breaches
+    outlive archived defects.
+    """
+    __tablename__ = 'sla_breaches'
+    id = db.Column(db.Integer, primary_key=True)
+    defect_id = db.Column(db.Integer, nullable=False)
+    rule = db.Column(db.String(32), nullable=False)
+    building_id = db.Column(db.Integer, nullable=False)
+    priority = db.Column(db.Enum('low', 'medium', 'high', name='defect_priorities'), nullable=False)
+    status = db.Column(db.Enum('Open', 'Reviewed', 'Ongoing', 'Done', 'Completed', name='defect_statuses'), nullable=False)
+    sla_hours = db.Column(db.Integer, nullable=False)
+    defect_created_at = db.Column(db.DateTime, nullable=False)
+    detected_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('uq_sla_breaches_defect_rule', 'defect_id', 'rule', unique=True),
+        db.Index('ix_sla_breaches_detected_at', 'detected_at'),
+    )
+
+
+class SlaWatermark(db.Model):
+    """How far the SLA scan has got: defects created up to ``scanned_until`` are checked."""
+    __tablename__ = 'sla_watermarks'
+    rule = db.Column(db.String(32), primary_key=True)
+    priority = db.Column(db.Enum('low', 'medium', 'high', name='defect_priorities'), primary_key=True)
+    scanned_until = db.Column(db.DateTime, nullable=False)
+
+
+class IdempotencyKey(db.Model):
+    """Response stored for a client's ``Idempotency-Key``, see idempotency.py.
+
+    ``status_code`` stays NULL while the first request is still running.
+    ``committed_at`` is set in the same transaction as that request's
+    first commit, so a key whose write landed is never run again.
+    """
+    __tablename__ = 'idempotency_keys'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    response_headers = db.Column(db.JSON, nullable=True)
+    committed_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('uq_idempotency_keys_user_key', 'user_id', 'key', unique=True),
+        db.Index('ix_idempotency_keys_created_at', 'created_at'),
+    )
+
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String, nullable=False)
+    status = db.Column(db.Enum('queued', 'running', 'succeeded', 'failed', name='job_statuses'), default='queued', nullable=False)
+    payload = db.Column(db.JSON, nullable=True)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=3, nullable=False)
+    run_after = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+    locked_by = db.Column(db.String, nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    created_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_after', 'status', 'run_after'),
+    )
+
+    created_by = db.relationship('User', foreign_keys=[created_by_id])
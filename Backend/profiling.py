@@ -0,0 +1,231 @@
+"""Request profiling for admins, on demand or continuously.
+
+On demand: an admin adds ``X-Profile: folded`` (or ``?_profile=folded``)
+to any request. It runs under the sampling profiler and the response is
+replaced by the collapsed stacks, one ``frame;frame;frame count`` line per
+stack, ready for flamegraph.pl or speedscope. ``pstats`` instead runs it
+under cProfile and returns a file for ``python -m pstats``. Adding
+``X-Profile-Store: 1`` (or ``?_profile_store=1``) keeps the normal
+response and saves the artifact under ``PROFILE_FOLDER``; its name comes
+back in ``X-Profile-Artifact``.
+
+Continuously: with ``PROFILE_SAMPLE_RATE`` set to N, one request in N is
+sampled and its stacks are added to a per-endpoint aggregate, readable
+through ``/api/profiling/stacks``.
+
+The sampler is a single daemon thread that reads the stacks of the
+threads currently being profiled every ``PROFILE_INTERVAL_MS``, so an
+unprofiled request pays one counter increment.
+
+The sampler needs real threads: under gevent's monkey patching requests
+run on greenlets, which ``sys._current_frames()`` cannot see. There it is
+disabled, so ``folded`` answers 501 and ``PROFILE_SAMPLE_RATE`` is
+ignored. ``pstats`` still works, but its numbers include whatever other
+greenlets ran on the thread while the request waited.
+"""
+import collections
+import cProfile
+import datetime
+import itertools
+import marshal
+import os
+import sys
+import threading
+import time
+import uuid
+from flask import current_app, g, jsonify, request
+
+
+PROFILE_FORMATS = ('folded', 'pstats')
+_MIMETYPES = {'folded': 'text/plain', 'pstats': 'application/octet-stream'}
+
+
+def _frame_name(code):
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f'{module}:{code.co_name}'
+
+
+def _fold(frame):
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def threads_are_greenlets():
+    """True when gevent has patched ``threading``. Never imports gevent itself."""
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('threading')
+
+
+def format_folded(stacks):
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+
+
+class _Sampler:
+    """Samples the stacks of registered threads from one background thread."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._stacks = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, ident):
+        with self._lock:
+            self._stacks[ident] = collections.Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, ident):
+        with self._lock:
+            return self._stacks.pop(ident, collections.Counter())
+
+    def _run(self):
+        while True:
+            with self._lock:
+                idents = list(self._stacks)
+            if not idents:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for ident in idents:
+                    frame = frames.get(ident)
+                    stacks = self._stacks.get(ident)
+                    if frame is not None and stacks is not None:
+                        stacks[_fold(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+class RequestProfiler:
+    """Configuration:
+
+    - ``PROFILE_SAMPLE_RATE``: profile one request in this many, 0 (default) to disable.
+    - ``PROFILE_INTERVAL_MS``: sampling interval, default 5.
+    - ``PROFILE_FOLDER``: where stored artifacts go.
+    - ``PROFILE_MAX_STACKS``: distinct stacks kept per endpoint before the
+      rarest are dropped, default 2000.
+    """
+
+    def __init__(self):
+        self._sampler = None
+        self._counter = itertools.count(1)
+        self._aggregates = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('PROFILE_SAMPLE_RATE', 0)
+        app.config.setdefault('PROFILE_INTERVAL_MS', 5)
+        app.config.setdefault('PROFILE_FOLDER', os.path.join(app.instance_path, 'profiles'))
+        app.config.setdefault('PROFILE_MAX_STACKS', 2000)
+        if threads_are_greenlets():
+            self._sampler = None
+            if app.config['PROFILE_SAMPLE_RATE']:
+                app.logger.warning('PROFILE_SAMPLE_RATE is ignored: the sampling profiler does not work under gevent')
+        else:
+            self._sampler = _Sampler(app.config['PROFILE_INTERVAL_MS'] / 1000)
+        app.extensions['profiler'] = self
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def _requested_format(self):
+        requested = request.headers.get('X-Profile') or request.args.get('_profile')
+        if requested not in PROFILE_FORMATS:
+            return None
+        from routes.permissions import PERMISSIONS, normalize_role
+        from routes.utils import get_current_user
+
+        user = get_current_user()
+        if not user or 'system.profile' not in PERMISSIONS.get(normalize_role(user.role), ()):
+            return None
+        return requested
+
+    def _before_request(self):
+        profile_format = self._requested_format()
+        if profile_format == 'folded' and self._sampler is None:
+            return jsonify({'message': 'Sampling is unavailable under gevent; use X-Profile: pstats'}), 501
+        sample_rate = current_app.config['PROFILE_SAMPLE_RATE'] if self._sampler else 0
+        sampled = bool(sample_rate) and next(self._counter) % sample_rate == 0
+        if profile_format == 'pstats':
+            g.profile = {'format': 'pstats', 'sampled': False, 'profile': cProfile.Profile()}
+            g.profile['profile'].enable()
+        elif profile_format or sampled:
+            g.profile = {'format': profile_format, 'sampled': sampled, 'ident': threading.get_ident()}
+            self._sampler.start(g.profile['ident'])
+
+    def _finish(self):
+        state = g.pop('profile', None)
+        if state is None:
+            return None, None
+        if state['format'] == 'pstats':
+            state['profile'].disable()
+            return state, state['profile']
+        stacks = self._sampler.stop(state['ident'])
+        if state['sampled']:
+            self._aggregate(request.endpoint or 'unknown', stacks)
+        return state, stacks
+
+    def _after_request(self, response):
+        state, result = self._finish()
+        if state is None or state['format'] is None:
+            return response
+
+        if state['format'] == 'pstats':
+            # The same bytes Profile.dump_stats would write.
+            result.create_stats()
+            artifact = marshal.dumps(result.stats)
+        else:
+            artifact = format_folded(result).encode('utf-8')
+
+        if request.headers.get('X-Profile-Store') == '1' or request.args.get('_profile_store') == '1':
+            response.headers['X-Profile-Artifact'] = self.store(state['format'], artifact)
+            return response
+        profiled = current_app.response_class(artifact, mimetype=_MIMETYPES[state['format']])
+        profiled.headers['X-Profiled-Status'] = str(response.status_code)
+        return profiled
+
+    def _teardown_request(self, exc):
+        # after_request is skipped when the view raised.
+        self._finish()
+
+    def store(self, profile_format, artifact):
+        folder = current_app.config['PROFILE_FOLDER']
+        os.makedirs(folder, exist_ok=True)
+        stamp = datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%S')
+        name = f"{stamp}-{request.endpoint or 'unknown'}-{uuid.uuid4().hex[:8]}.{profile_format}"
+        with open(os.path.join(folder, name), 'wb') as output:
+            output.write(artifact)
+        return name
+
+    def _aggregate(self, endpoint, stacks):
+        max_stacks = current_app.config['PROFILE_MAX_STACKS']
+        with self._lock:
+            aggregate = self._aggregates.setdefault(endpoint, {'requests': 0, 'stacks': collections.Counter()})
+            aggregate['requests'] += 1
+            aggregate['stacks'].update(stacks)
+            if len(aggregate['stacks']) > max_stacks:
+                aggregate['stacks'] = collections.Counter(dict(aggregate['stacks'].most_common(max_stacks)))
+
+    def summary(self):
+        with self._lock:
+            return {
+                endpoint: {'requests': aggregate['requests'], 'samples': sum(aggregate['stacks'].values())}
+                for endpoint, aggregate in self._aggregates.items()
+            }
+
+    def stacks(self, endpoint):
+        with self._lock:
+            aggregate = self._aggregates.get(endpoint)
+            return collections.Counter(aggregate['stacks']) if aggregate else None
+
+    def reset(self):
+        with self._lock:
+            self._aggregates.clear()
@@ -0,0 +1,241 @@
+"""Per-endpoint SQL budgets, checked against a seeded database.
+
+``flask query-budget`` builds a throwaway SQLite database, seeds it with
+``SEED_DEFECTS`` defects spread over buildings and technicians, then runs
+every entry in ``CHECKS`` through the test client with the cache cleared
+first. Each request's statements are recorded with a
+``before_cursor_execute`` hook and the rows it fetched are counted by a
+cursor subclass. An endpoint that issues more statements or fetches more
+rows than its budget fails the run; an N+1 shows up as a statement count
+that grows with the seed size instead of staying flat.
+
+Budgets are exact for the seed below. When a change legitimately needs
+another query, raise the number here in the same commit.
+"""
+import base64
+import collections
+import os
+import sqlite3
+import tempfile
+from sqlalchemy import event
+
+
+SEED_BUILDINGS = 10
+SEED_TECHNICIANS = 5
+SEED_DEFECTS = 200
+SEED_PASSWORD = 'budget'
+
+# Statement and fetched-row limits for one request. ``body`` values of
+# ``'{technician_id}'`` are replaced by the seeded technician's id.
+Check = collections.namedtuple('Check', ['endpoint', 'role', 'method', 'path', 'body', 'statements', 'rows'])
+
+_USERS = (('admin', 'admin'), ('csr', 'csr'), ('executive', 'building_executive'), ('other', 'csr'))
+_STATUSES = ('Open', 'Reviewed', 'Ongoing', 'Done', 'Completed')
+
+CHECKS = [
+    Check('auth_bp.login', None, 'POST', '/api/auth/login', None, 3, 2),
+    Check('buildings_bp.list_buildings', 'csr', 'GET', '/api/buildings', None, 2, 11),
+    Check('buildings_bp.get_building', 'csr', 'GET', '/api/buildings/1', None, 2, 2),
+    Check('buildings_bp.create_building', 'admin', 'POST', '/api/buildings', {'name': 'New', 'address': 'x'}, 3, 2),
+    Check('buildings_bp.update_building', 'admin', 'PUT', '/api/buildings/11', {'name': 'Renamed'}, 4, 3),
+    Check('defects_bp.list_defects', 'executive', 'GET', '/api/defects', None, 2, 201),
+    Check('defects_bp.list_defects', 'technician', 'GET', '/api/defects', None, 2, 31),
+    Check('defects_bp.get_defect', 'executive', 'GET', '/api/defects/1', None, 2, 2),
+    Check('defects_bp.get_comments', 'executive', 'GET', '/api/defects/1/comments', None, 3, 3),
+    Check('defects_bp.get_duplicates', 'executive', 'GET', '/api/defects/1/duplicates', None, 3, 14),
+    Check('defects_bp.nearby_defects', 'executive', 'GET', '/api/defects/nearby?lat=1.3&lon=103.8&radius_km=50', None, 4, 32),
+    Check('defects_bp.create_defect', 'csr', 'POST', '/api/defects', {
+        'title': 'Water leak in lobby', 'description': 'Ceiling drips near the lift',
+        'priority': 'high', 'building_id': 1, 'initial_report': 'Reported by tenant',
+    }, 10, 5),
+    Check('defects_bp.update_defect', 'executive', 'PUT', '/api/defects/2', {'contractor_name': 'Acme'}, 4, 3),
+    Check('defects_bp.upsert_comments', 'executive', 'PATCH', '/api/defects/2/comments', {'executive_decision': 'Fix'}, 7, 4),
+    Check('defects_bp.review_defect', 'executive', 'PATCH', '/api/defects/1/review', {}, 3, 3),
+    Check('defects_bp.assign_technician', 'executive', 'PATCH', '/api/defects/1/assign', {'assigned_technician_id': '{technician_id}'}, 5, 4),
+    Check('defects_bp.mark_ongoing', 'technician', 'PATCH', '/api/defects/1/ongoing', {}, 3, 3),
+    Check('defects_bp.mark_done', 'technician', 'PATCH', '/api/defects/1/done', {'technician_report': 'Fixed'}, 8, 4),
+    Check('defects_bp.mark_complete', 'executive', 'PATCH', '/api/defects/1/complete', {}, 5, 3),
+    Check('defects_bp.reopen_defect', 'executive', 'PATCH', '/api/defects/1/reopen', {}, 5, 3),
+    Check('defects_bp.delete_defect', 'admin', 'DELETE', '/api/defects/3', None, 3, 2),
+    Check('dashboard_bp.get_dashboard', 'executive', 'GET', '/api/dashboard', None, 5, 43),
+    Check('analytics_bp.defects_per_building', 'executive', 'GET', '/api/analytics/defects-per-building', None, 2, 12),
+    Check('analytics_bp.defects_status', 'executive', 'GET', '/api/analytics/defects-status', None, 2, 6),
+    Check('analytics_bp.defect_trends_view', 'executive', 'GET', '/api/analytics/trends?interval=week', None, 2, 46),
+    Check('analytics_bp.export_database', 'admin', 'GET', '/api/analytics/export', None, 7, 423),
+    Check('analytics_bp.export_table', 'admin', 'GET', '/api/analytics/export/defects', None, 2, 202),
+    Check('sla_bp.list_breaches', 'executive', 'GET', '/api/sla/breaches', None, 3, 2),
+    Check('users_bp.list_users', 'admin', 'GET', '/api/users', None, 2, 10),
+    Check('users_bp.get_user', 'admin', 'GET', '/api/users/1', None, 2, 2),
+    Check('users_bp.list_technicians', 'executive', 'GET', '/api/users/technicians', None, 2, 6),
+    Check('users_bp.technician_workload', 'executive', 'GET', '/api/users/technicians/workload', None, 2, 16),
+]
+
+
+class _Recording:
+    def __init__(self):
+        self.statements = []
+        self.rows = 0
+
+
+_recording = None
+
+
+class _CountingCursor(sqlite3.Cursor):
+    def _count(self, rows):
+        if _recording is not None:
+            _recording.rows += rows
+
+    def fetchone(self):
+        row = super().fetchone()
+        self._count(row is not None)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = super().fetchmany(*args, **kwargs)
+        self._count(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._count(len(rows))
+        return rows
+
+
+class _CountingConnection(sqlite3.Connection):
+    def cursor(self, factory=_CountingCursor):
+        return super().cursor(factory)
+
+
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    if _recording is not None:
+        _recording.statements.append(' '.join(statement.split()))
+
+
+def create_budget_app(database_path):
+    from app import create_app
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database_path}',
+        'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'factory': _CountingConnection}},
+        'SQLALCHEMY_REPLICA_URIS': [],
+        'CACHE_BACKEND': 'local',
+        'PROFILE_SAMPLE_RATE': 0,
+        'RATE_LIMIT_ENABLED': False,
+        'TESTING': True,
+    })
+    return app
+
+
+def seed():
+    """Fill the current app's (empty) database. Returns ``{role: email}`` for logging in."""
+    from extensions import db
+    from models import Building, Defect, DefectComment, User
+
+    db.create_all()
+    emails = {}
+    for name, role in _USERS:
+        user = User(name=name, email=f'{name}@example.com', role=role)
+        user.set_password(SEED_PASSWORD)
+        db.session.add(user)
+        emails.setdefault(name, user.email)
+    technicians = []
+    for index in range(SEED_TECHNICIANS):
+        technician = User(name=f'tech{index}', email=f'tech{index}@example.com', role='technician')
+        technician.set_password(SEED_PASSWORD)
+        db.session.add(technician)
+        technicians.append(technician)
+    emails['technician'] = technicians[0].email
+    buildings = [
+        Building(name=f'Block {index}', address=f'{index} Main St', latitude=1.3 + index * 0.01, longitude=103.8)
+        for index in range(SEED_BUILDINGS)
+    ]
+    db.session.add_all(buildings)
+    db.session.flush()
+
+    reporter = User.query.filter_by(email=emails['csr']).one()
+    for index in range(SEED_DEFECTS):
+        status = 'Open' if index < 3 else _STATUSES[index % len(_STATUSES)]
+        defect = Defect(
+            title=f'Defect {index} {("leak", "crack", "mould", "wiring")[index % 4]}',
+            description=f'Seeded defect number {index}',
+            status=status,
+            priority=('low', 'medium', 'high')[index % 3],
+            building_id=buildings[index % SEED_BUILDINGS].id,
+            reporter_id=reporter.id,
+            assigned_technician_id=technicians[index // len(_STATUSES) % SEED_TECHNICIANS].id if status != 'Open' else None,
+        )
+        db.session.add(defect)
+        db.session.flush()
+        db.session.add(DefectComment(defect_id=defect.id, initial_report=f'Report {index}'))
+    db.session.commit()
+    return emails, technicians[0].id
+
+
+def _login(client, email):
+    credentials = base64.b64encode(f'{email}:{SEED_PASSWORD}'.encode()).decode()
+    response = client.post('/api/auth/login', headers={'Authorization': f'Basic {credentials}'})
+    return response.json['token']
+
+
+def _fill(value, technician_id):
+    if isinstance(value, str):
+        return int(value.format(technician_id=technician_id)) if value == '{technician_id}' else value
+    if isinstance(value, dict):
+        return {key: _fill(item, technician_id) for key, item in value.items()}
+    return value
+
+
+def run_checks(checks=CHECKS):
+    """Seed a temporary database and measure every check.
+
+    Returns one dict per check with the measured ``statements`` and
+    ``rows``, the response ``status`` and the SQL issued.
+    """
+    global _recording
+    from extensions import cache, db
+
+    with tempfile.TemporaryDirectory(prefix='query-budget-') as workdir:
+        app = create_budget_app(os.path.join(workdir, 'budget.db'))
+        results = []
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', _record_statement)
+            # create_budget_app forces CACHE_BACKEND=local, so this LocalCache
+            # belongs to this run alone and emptying it touches nothing shared.
+            local_cache = cache.backend
+            emails, technician_id = seed()
+            client = app.test_client()
+            tokens = {role: _login(client, email) for role, email in emails.items()}
+
+            for check in checks:
+                if check.role is None:
+                    credentials = base64.b64encode(f"{emails['admin']}:{SEED_PASSWORD}".encode()).decode()
+                    headers = {'Authorization': f'Basic {credentials}'}
+                else:
+                    headers = {'Authorization': f'Bearer {tokens[check.role]}'}
+                local_cache.clear()
+                _recording = _Recording()
+                try:
+                    response = client.open(
+                        _fill(check.path, technician_id), method=check.method, headers=headers,
+                        json=_fill(check.body, technician_id),
+                    )
+                    response.get_data()
+                finally:
+                    recording, _recording = _recording, None
+                results.append({
+                    'check': check,
+                    'status': response.status_code,
+                    'statements': len(recording.statements),
+                    'rows': recording.rows,
+                    'sql': recording.statements,
+                    'ok': response.status_code < 400
+                    and len(recording.statements) <= check.statements
+                    and recording.rows <= check.rows,
+                })
+            covered = {check.endpoint for check in checks}
+            uncovered = sorted(
+                rule.endpoint for rule in app.url_map.iter_rules()
+                if '_bp.' in rule.endpoint and rule.endpoint not in covered
+            )
+            db.engine.dispose()
+    return results, uncovered
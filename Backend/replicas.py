@@ -0,0 +1,138 @@
+import itertools
+import threading
+import time
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_POSTGRES_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class RoutingSession(Session):
+    """Sends plain reads to a replica while the current request allows it.
+
+    Flushes, DML and anything issued after this session has written stay on
+    the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if getattr(clause, 'is_dml', False):
+            # Core INSERT/UPDATE/DELETE bypass the flush hook below.
+            self.info['wrote'] = True
+        if bind is None and not self._flushing and not self.info.get('wrote'):
+            if clause is None or getattr(clause, 'is_select', False):
+                engine = _request_replica()
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_session_wrote(session, flush_context):
+    session.info['wrote'] = True
+
+
+def _request_replica():
+    if not has_request_context():
+        return None
+    router = current_app.extensions.get('replicas')
+    if not router or not router.bind_keys:
+        return None
+    if 'db_replica' not in g:
+        g.db_replica = router.choose() if g.get('db_read_only') else None
+    return g.db_replica
+
+
+class ReplicaRouter:
+    """Routes read-only requests to healthy, caught-up read replicas.
+
+    Configuration:
+
+    - ``SQLALCHEMY_REPLICA_URIS``: list of replica database URIs.
+    - ``REPLICA_MAX_LAG_SECONDS``: replicas lagging more than this are skipped.
+    - ``REPLICA_LAG_CHECK_SECONDS``: how long a lag measurement is reused.
+    - ``REPLICA_STICKY_SECONDS``: after a user writes, their reads go to the
+      primary for this long so they always see their own changes.
+    """
+
+    def __init__(self):
+        self.bind_keys = []
+        self._cycle = None
+        self._lag = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db, cache):
+        app.config.setdefault('SQLALCHEMY_REPLICA_URIS', [])
+        app.config.setdefault('REPLICA_MAX_LAG_SECONDS', 5)
+        app.config.setdefault('REPLICA_LAG_CHECK_SECONDS', 5)
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 10)
+
+        binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+        self.bind_keys = []
+        for index, uri in enumerate(app.config['SQLALCHEMY_REPLICA_URIS']):
+            key = f'replica_{index}'
+            binds[key] = uri
+            self.bind_keys.append(key)
+        self._cycle = itertools.cycle(self.bind_keys)
+        self.db = db
+        self.cache = cache
+        app.extensions['replicas'] = self
+
+        if self.bind_keys:
+            app.before_request(self._before_request)
+            app.after_request(self._after_request)
+
+    def _before_request(self):
+        from routes.utils import current_token_user_id
+
+        user_id = current_token_user_id()
+        g.db_user_id = user_id
+        sticky = user_id is not None and self.cache.get('replica_sticky', user_id) is not None
+        g.db_read_only = request.method in READ_METHODS and not sticky
+
+    def _after_request(self, response):
+        user_id = g.get('db_user_id')
+        if request.method not in READ_METHODS and response.status_code < 400 and user_id is not None:
+            self.cache.set(
+                'replica_sticky', user_id, 1,
+                ttl=current_app.config['REPLICA_STICKY_SECONDS'],
+            )
+        return response
+
+    def _measure_lag(self, engine):
+        if engine.dialect.name != 'postgresql':
+            return 0.0
+        with engine.connect() as connection:
+            return float(connection.execute(_POSTGRES_LAG_SQL).scalar() or 0)
+
+    def replica_lag(self, key):
+        """Seconds the replica is behind, or None if it is unreachable."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._lag.get(key)
+            if cached and cached[1] > now:
+                return cached[0]
+        try:
+            lag = self._measure_lag(self.db.engines[key])
+        except Exception:
+            current_app.logger.warning('Replica %s is unreachable', key, exc_info=True)
+            lag = None
+        with self._lock:
+            self._lag[key] = (lag, now + current_app.config['REPLICA_LAG_CHECK_SECONDS'])
+        return lag
+
+    def choose(self):
+        max_lag = current_app.config['REPLICA_MAX_LAG_SECONDS']
+        for _ in range(len(self.bind_keys)):
+            with self._lock:
+                key = next(self._cycle)
+            lag = self.replica_lag(key)
+            if lag is not None and lag <= max_lag:
+                return self.db.engines[key]
+        return None
@@ -0,0 +1,312 @@
+"""Load a snapshot from GET /api/analytics/export into an empty database.
+
+Accepts the JSON document the endpoint returns by default, or the NDJSON
+stream from ``?format=ndjson`` (one ``{"table": ..., "row": ...}`` per
+line), optionally gzip-compressed. Input is parsed incrementally, so a
+multi-GB snapshot never has to fit in memory.
+
+Tables are loaded parents first. A table whose parents are already loaded
+streams straight into the database; one that arrives before them is
+spooled to a temporary file and loaded once they are in. PostgreSQL
+(psycopg2) loads use ``COPY``; other databases use batched INSERTs. The
+whole load is one transaction, so a failed restore leaves the database
+empty.
+
+Bulk loads bypass the session hooks, so the derived tables (technician
+workloads, trend events, duplicate signatures) are rebuilt afterwards and
+PostgreSQL sequences are moved past the restored ids. Cached responses
+built from the previous contents, including closed trend buckets kept
+for a year, are invalidated.
+"""
+import datetime
+import gzip
+import io
+import itertools
+import json
+import re
+import secrets
+import sys
+import tempfile
+import bcrypt
+from sqlalchemy import DateTime, exists, insert, select, text
+from extensions import db, cache
+from exports import SNAPSHOT_SERIALIZERS
+import duplicates
+import trends
+import workload
+
+
+RESTORE_FORMATS = ('json', 'ndjson')
+RESTORE_BATCH_SIZE = 5000
+# Cache namespaces built from restored tables.
+CACHED_NAMESPACES = ('trends', 'buildings', 'users', 'dashboard')
+# Tables whose id sequences are synced after a restore (PostgreSQL only).
+SEQUENCE_TABLES = ('users', 'refresh_tokens', 'buildings', 'defects', 'defect_comments', 'jobs', 'uploads')
+# Archived rows keep the ids they were given from the live table's
+# sequence, so it must also move past them or new rows would reuse them.
+_SHARED_SEQUENCES = {
+    'defects': ('defects_archive',),
+    'defect_comments': ('defect_comments_archive',),
+}
+
+_READ_SIZE = 1 << 20
+_WHITESPACE = re.compile(r'\s*')
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+class RestoreError(Exception):
+    pass
+
+
+def sync_sequences(tables=SEQUENCE_TABLES):
+    """Point each PostgreSQL id sequence past the highest id in its table,
+    or in the archive tables that took their ids from the same sequence.
+
+    Returns ``[(table, error), ...]`` with ``error`` None on success; other
+    databases have no sequences and get an empty list.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return []
+    results = []
+    for table in tables:
+        highest = ', '.join(f'(SELECT max(id) FROM {name})' for name in (table,) + _SHARED_SEQUENCES.get(table, ()))
+        try:
+            sql = text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), coalesce(greatest({highest})+1, 1), false);")
+            db.session.execute(sql)
+            db.session.commit()
+            results.append((table, None))
+        except Exception as e:
+            db.session.rollback()
+            results.append((table, e))
+    return results
+
+
+def restore_order():
+    """Snapshot tables sorted so every table comes after the ones it references."""
+    return [table.name for table in db.metadata.sorted_tables if table.name in SNAPSHOT_SERIALIZERS]
+
+
+def _parents(table_name):
+    table = db.metadata.tables[table_name]
+    return {fk.column.table.name for fk in table.foreign_keys} & set(SNAPSHOT_SERIALIZERS) - {table_name}
+
+
+class _JSONStream:
+    """Just enough of an incremental JSON reader to walk ``{"table": [{...}, ...], ...}``."""
+
+    def __init__(self, source):
+        self.source = source
+        self.buffer = ''
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def _read(self):
+        chunk = self.source.read(_READ_SIZE)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read():
+                raise RestoreError('Unexpected end of input')
+
+    def expect(self, chars):
+        char = self.peek()
+        if char not in chars:
+            raise RestoreError(f"Expected one of {' '.join(chars)} but found {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, self.pos = self.decoder.raw_decode(self.buffer, self.pos)
+                return value
+            except json.JSONDecodeError:
+                # Most likely the value runs past the end of the buffer.
+                if not self._read():
+                    raise RestoreError('Invalid JSON in snapshot')
+
+
+def _json_array(stream):
+    stream.expect('[')
+    if stream.peek() == ']':
+        stream.pos += 1
+        return
+    while True:
+        yield stream.value()
+        if stream.expect(',]') == ']':
+            return
+
+
+def _iter_json(source):
+    stream = _JSONStream(source)
+    stream.expect('{')
+    if stream.peek() == '}':
+        return
+    while True:
+        table_name = stream.value()
+        stream.expect(':')
+        rows = _json_array(stream)
+        yield table_name, rows
+        for _ in rows:
+            pass
+        if stream.expect(',}') == '}':
+            return
+
+
+def _iter_ndjson(source):
+    records = (json.loads(line) for line in source if line.strip())
+    for table_name, group in itertools.groupby(records, key=lambda record: record['table']):
+        yield table_name, (record['row'] for record in group)
+
+
+def _parse_datetime(value):
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.fromisoformat(value)
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return str(value).translate(_COPY_ESCAPES)
+
+
+class _Loader:
+    def __init__(self, connection, batch_size, password_hash):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.defaults = {'users': {'password_hash': password_hash}}
+        self.use_copy = connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg2'
+
+    def _columns(self, table_name):
+        serializer = SNAPSHOT_SERIALIZERS[table_name]
+        columns = [(key, column.name) for key, column in zip(serializer.keys, serializer.columns)]
+        columns.extend((name, name) for name in self.defaults.get(table_name, {}))
+        return columns
+
+    def load(self, table_name, rows):
+        table = db.metadata.tables[table_name]
+        columns = self._columns(table_name)
+        defaults = self.defaults.get(table_name, {})
+        dates = {name for _, name in columns if isinstance(table.c[name].type, DateTime)}
+        write = self._copy if self.use_copy else self._insert
+        count = 0
+        batch = []
+        for row in rows:
+            values = {}
+            for key, name in columns:
+                value = row.get(key, defaults.get(name))
+                values[name] = _parse_datetime(value) if name in dates else value
+            batch.append(values)
+            if len(batch) >= self.batch_size:
+                write(table, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            write(table, batch)
+            count += len(batch)
+        return count
+
+    def _insert(self, table, batch):
+        self.connection.execute(insert(table), batch)
+
+    def _copy(self, table, batch):
+        names = list(batch[0])
+        buffer = io.StringIO()
+        for values in batch:
+            buffer.write('\t'.join(_copy_value(values[name]) for name in names))
+            buffer.write('\n')
+        buffer.seek(0)
+        quote = self.connection.dialect.identifier_preparer.quote
+        cursor = self.connection.connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {quote(table.name)} ({', '.join(quote(name) for name in names)}) FROM STDIN", buffer)
+        finally:
+            cursor.close()
+
+
+def _open_source(path):
+    if path == '-':
+        return sys.stdin
+    opener = gzip.open if path.endswith('.gz') else open
+    return opener(path, 'rt', encoding='utf-8')
+
+
+def guess_format(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    return 'ndjson' if name.endswith(('.ndjson', '.jsonl')) else 'json'
+
+
+def restore_snapshot(path, input_format=None, batch_size=RESTORE_BATCH_SIZE, password=None):
+    """Load the snapshot at ``path`` (``-`` for stdin) and return rows loaded per table.
+
+    Restored users get ``password`` if given; otherwise a random one nobody
+    knows, so passwords have to be reset before anyone can log in.
+    """
+    input_format = input_format or guess_format(path)
+    if input_format not in RESTORE_FORMATS:
+        raise RestoreError(f"format must be one of {', '.join(RESTORE_FORMATS)}")
+    # Hashed once: bcrypt per user would dominate the load time.
+    password_hash = bcrypt.hashpw((password or secrets.token_urlsafe(32)).encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+    order = restore_order()
+    counts = dict.fromkeys(order, 0)
+    loaded = set()
+    spooled = {}
+    with db.engine.begin() as connection:
+        for table_name in order:
+            if connection.execute(select(exists().select_from(db.metadata.tables[table_name]))).scalar():
+                raise RestoreError(f'Table {table_name} is not empty; restore needs an empty database')
+
+        loader = _Loader(connection, batch_size, password_hash)
+        source = _open_source(path)
+        try:
+            reader = _iter_ndjson if input_format == 'ndjson' else _iter_json
+            for table_name, rows in reader(source):
+                if table_name not in counts:
+                    raise RestoreError(f'Unknown table {table_name!r} in snapshot')
+                if table_name in loaded or table_name in spooled:
+                    raise RestoreError(f'Rows for {table_name} are not contiguous in the snapshot')
+                if _parents(table_name) <= loaded:
+                    counts[table_name] = loader.load(table_name, rows)
+                    loaded.add(table_name)
+                    continue
+                spool = spooled[table_name] = tempfile.TemporaryFile('w+', encoding='utf-8')
+                for row in rows:
+                    spool.write(json.dumps(row))
+                    spool.write('\n')
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+        for table_name in order:
+            spool = spooled.pop(table_name, None)
+            if spool is None:
+                continue
+            with spool:
+                spool.seek(0)
+                counts[table_name] = loader.load(table_name, (json.loads(line) for line in spool))
+
+        workload.rebuild_workloads(connection)
+        trends.backfill_events(connection)
+
+    duplicates.rebuild_signatures()
+    sync_sequences()
+    for namespace in CACHED_NAMESPACES:
+        cache.invalidate(namespace)
+    return counts
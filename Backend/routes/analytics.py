@@ -1,8 +1,15 @@
-from flask import Blueprint, jsonify
+import datetime
+import tempfile
+from flask import Blueprint, Response, jsonify, request, send_file, stream_with_context
 from sqlalchemy import func
-from extensions import db
-from models import Defect, Building, DefectComment, User
-from routes.utils import require_auth, require_roles
+from extensions import db, cache
+from exports import EXPORT_FORMATS, EXPORT_TABLES, build_snapshot, iter_csv, iter_snapshot_ndjson, write_parquet
+from jobs import enqueue, job_handler
+from models import Defect, Building
+from routes.jobs import enqueue_response
+from routes.permissions import Role, require_permission
+from routes.utils import require_auth
+from trends import DEFAULT_BUCKETS, INTERVALS, MAX_BUCKETS, bucket_start, bucket_starts, defect_trends, next_bucket
 
 
 analytics_bp = Blueprint('analytics_bp', __name__)
@@ -10,7 +17,7 @@ analytics_bp = Blueprint('analytics_bp', __name__)
 
 @analytics_bp.route('/defects-per-building', methods=['GET'])
 @require_auth
-@require_roles('admin', 'csr', 'building_executive')
+@require_permission('analytics.view')
 def defects_per_building(user):
     results = (
         db.session.query(Building.id, Building.name, func.count(Defect.id))
@@ -25,9 +32,63 @@ def defects_per_building(user):
     ])
 
 
+def _parse_date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@analytics_bp.route('/trends', methods=['GET'])
+@require_auth
+@require_permission('analytics.view')
+def defect_trends_view(user):
+    interval = request.args.get('interval', 'week')
+    if interval not in INTERVALS:
+        return jsonify({'message': f"interval must be one of {', '.join(INTERVALS)}"}), 400
+
+    today = datetime.datetime.utcnow().date()
+    end = next_bucket(bucket_start(today, interval), interval)
+    if request.args.get('end'):
+        end_date = _parse_date(request.args['end'])
+        if not end_date:
+            return jsonify({'message': 'end must be a date (YYYY-MM-DD)'}), 400
+        end = next_bucket(bucket_start(end_date, interval), interval)
+    if request.args.get('start'):
+        start_date = _parse_date(request.args['start'])
+        if not start_date:
+            return jsonify({'message': 'start must be a date (YYYY-MM-DD)'}), 400
+        start = bucket_start(start_date, interval)
+    else:
+        start = end
+        for _ in range(DEFAULT_BUCKETS):
+            start = bucket_start(start - datetime.timedelta(days=1), interval)
+    if start >= end:
+        return jsonify({'message': 'start must be before end'}), 400
+
+    if len(bucket_starts(interval, start, end)) > MAX_BUCKETS:
+        return jsonify({'message': f'At most {MAX_BUCKETS} buckets per request'}), 400
+
+    buckets = defect_trends(interval, start, end)
+
+    building_id = request.args.get('building_id', type=int)
+    if building_id is not None:
+        for bucket in buckets:
+            bucket['rows'] = [row for row in bucket['rows'] if row['building_id'] == building_id]
+
+    return jsonify({'interval': interval, 'buckets': buckets})
+
+
+@analytics_bp.route('/cache', methods=['GET'])
+@require_auth
+@require_permission('system.monitor')
+def cache_stats(user):
+    return jsonify(cache.stats())
+
+
 @analytics_bp.route('/defects-status', methods=['GET'])
 @require_auth
-@require_roles('admin', 'csr', 'building_executive')
+@require_permission('analytics.view')
 def defects_status(user):
     results = (
         db.session.query(Defect.status, func.count(Defect.id))
@@ -41,78 +102,54 @@ def defects_status(user):
     ])
 
 
-def _serialize_user(user):
-    return {
-        'id': user.id,
-        'name': user.name,
-        'email': user.email,
-        'role': user.role,
-        'created_at': user.created_at.isoformat() if user.created_at else None,
-        'updated_at': user.updated_at.isoformat() if user.updated_at else None,
-    }
-
-
-def _serialize_building(building):
-    return {
-        'id': building.id,
-        'name': building.name,
-        'address': building.address,
-        'created_at': building.created_at.isoformat() if building.created_at else None,
-        'updated_at': building.updated_at.isoformat() if building.updated_at else None,
-    }
-
-
-def _serialize_defect(defect):
-    return {
-        'id': defect.id,
-        'title': defect.title,
-        'description': defect.description,
-        'status': defect.status,
-        'priority': defect.priority,
-        'image_url': defect.image_url,
-        'initial_report_image': defect.initial_report_image,
-        'technician_report_image': defect.technician_report_image,
-        'building_id': defect.building_id,
-        'reporter_id': defect.reporter_id,
-        'reviewed_by': defect.reviewed_by_id,
-        'assigned_technician_id': defect.assigned_technician_id,
-        'external_contractor': defect.external_contractor,
-        'contractor_name': defect.contractor_name,
-        'done_at': defect.done_at.isoformat() if defect.done_at else None,
-        'completed_at': defect.completed_at.isoformat() if defect.completed_at else None,
-        'deleted_at': defect.deleted_at.isoformat() if defect.deleted_at else None,
-        'deleted_by_id': defect.deleted_by_id,
-        'created_at': defect.created_at.isoformat() if defect.created_at else None,
-        'updated_at': defect.updated_at.isoformat() if defect.updated_at else None,
-    }
-
-
-def _serialize_defect_comment(comment):
-    return {
-        'id': comment.id,
-        'defect_id': comment.defect_id,
-        'initial_report': comment.initial_report,
-        'executive_decision': comment.executive_decision,
-        'technician_report': comment.technician_report,
-        'verification_report': comment.verification_report,
-        'final_completion': comment.final_completion,
-        'created_at': comment.created_at.isoformat() if comment.created_at else None,
-        'updated_at': comment.updated_at.isoformat() if comment.updated_at else None,
-    }
+@job_handler('export_database', roles=(Role.ADMIN,), max_concurrency=1)
+def export_database_job(payload, job):
+    return build_snapshot()
 
 
 @analytics_bp.route('/export', methods=['GET'])
 @require_auth
-@require_roles('admin')
+@require_permission('analytics.export')
 def export_database(user):
-    users = User.query.all()
-    buildings = Building.query.all()
-    defects = Defect.query.all()
-    comments = DefectComment.query.all()
-
-    return jsonify({
-        'users': [_serialize_user(u) for u in users],
-        'buildings': [_serialize_building(b) for b in buildings],
-        'defects': [_serialize_defect(d) for d in defects],
-        'defect_comments': [_serialize_defect_comment(c) for c in comments],
-    })
+    if request.args.get('async') in ('1', 'true'):
+        return enqueue_response(enqueue('export_database', user_id=user.id))
+    if request.args.get('format') == 'ndjson':
+        return Response(
+            stream_with_context(iter_snapshot_ndjson()),
+            mimetype='application/x-ndjson',
+            headers={'Content-Disposition': 'attachment; filename=export.ndjson'},
+        )
+    return jsonify(build_snapshot())
+
+
+@analytics_bp.route('/export/<table_name>', methods=['GET'])
+@require_auth
+@require_permission('analytics.export')
+def export_table(user, table_name):
+    if table_name not in EXPORT_TABLES:
+        return jsonify({'message': 'Unknown table'}), 404
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'message': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+
+    if export_format == 'csv':
+        return Response(
+            stream_with_context(iter_csv(table_name)),
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename={table_name}.csv'},
+        )
+
+    # Parquet writes its footer last, so build the file before sending it.
+    output = tempfile.TemporaryFile()
+    try:
+        write_parquet(table_name, output)
+    except RuntimeError as error:
+        output.close()
+        return jsonify({'message': str(error)}), 501
+    output.seek(0)
+    return send_file(
+        output,
+        mimetype='application/vnd.apache.parquet',
+        as_attachment=True,
+        download_name=f'{table_name}.parquet',
+    )
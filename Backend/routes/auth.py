@@ -1,7 +1,8 @@
-from flask import Blueprint, request, jsonify, current_app, make_response
+from flask import Blueprint, request, jsonify, make_response
 from models import User, RefreshToken
-from extensions import db
-import jwt
+from extensions import db, cache
+from routes.permissions import ROLES
+from routes.utils import encode_token
 import datetime
 import hashlib
 import secrets
@@ -13,16 +14,11 @@ REFRESH_TOKEN_DAYS = 7
 REFRESH_COOKIE_NAME = 'refresh_token'
 
 
-def _encode_token(payload):
-    token = jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
-    if isinstance(token, bytes):
-        token = token.decode('utf-8')
-    return token
-
-
-def _create_access_token(user_id):
-    return _encode_token({
-        'user_id': user_id,
+def _create_access_token(user):
+    return encode_token({
+        'user_id': user.id,
+        'role': user.role,
+        'ver': user.token_version or 0,
         'exp': datetime.datetime.utcnow() + datetime.timedelta(minutes=ACCESS_TOKEN_MINUTES)
     })
 
@@ -69,7 +65,7 @@ def signup():
         return jsonify({'message': 'User already exists'}), 409
 
     role = data.get('role', 'csr')
-    if role not in ['admin', 'csr', 'building_executive', 'technician']:
+    if role not in ROLES:
         return jsonify({'message': 'Invalid role'}), 400
 
     new_user = User(
@@ -80,8 +76,9 @@ def signup():
     new_user.set_password(data['password'])
     db.session.add(new_user)
     db.session.commit()
+    cache.invalidate('users')
 
-    access_token = _create_access_token(new_user.id)
+    access_token = _create_access_token(new_user)
     refresh_token, _ = _issue_refresh_token(new_user.id)
 
     response = make_response(jsonify({
@@ -109,7 +106,7 @@ def login():
         return jsonify({'message': 'Could not verify'}), 401, {'WWW-Authenticate': 'Basic realm="Login required!"'}
 
     if user.check_password(auth.password):
-        access_token = _create_access_token(user.id)
+        access_token = _create_access_token(user)
         refresh_token, _ = _issue_refresh_token(user.id)
 
         response = make_response(jsonify({
@@ -154,7 +151,12 @@ def refresh():
     refresh_record = RefreshToken.query.filter_by(token_hash=token_hash).first()
     now = datetime.datetime.utcnow()
 
-    if not refresh_record or refresh_record.revoked_at or refresh_record.expires_at <= now:
+    if (
+        not refresh_record
+        or refresh_record.revoked_at
+        or refresh_record.expires_at <= now
+        or not refresh_record.user
+    ):
         if refresh_record and not refresh_record.revoked_at:
             refresh_record.revoked_at = now
             db.session.commit()
@@ -174,7 +176,7 @@ def refresh():
     refresh_record.replaced_by_token = new_token_hash
     db.session.commit()
 
-    access_token = _create_access_token(refresh_record.user_id)
+    access_token = _create_access_token(refresh_record.user)
     response = make_response(jsonify({'token': access_token}))
     _set_refresh_cookie(response, new_raw_token)
     return response
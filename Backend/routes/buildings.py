@@ -1,66 +1,70 @@
 from flask import Blueprint, jsonify, request
-from extensions import db
+from extensions import db, cache
+from geo import parse_coordinates
 from models import Building
-from routes.utils import require_auth, require_roles, user_has_building_access
+from routes.permissions import require_permission
+from routes.utils import cached_json, require_auth
+from serializers import BUILDING
 
 
 buildings_bp = Blueprint('buildings_bp', __name__)
 
 
-def _serialize_building(building):
-    return {
-        'id': building.id,
-        'name': building.name,
-        'address': building.address,
-        'created_at': building.created_at.isoformat() if building.created_at else None,
-        'updated_at': building.updated_at.isoformat() if building.updated_at else None,
-    }
+def _set_coordinates(building, data):
+    """Apply latitude/longitude from ``data``; they must be sent together."""
+    if 'latitude' not in data and 'longitude' not in data:
+        return True
+    if data.get('latitude') is None and data.get('longitude') is None:
+        building.latitude = building.longitude = None
+        return True
+    try:
+        building.latitude, building.longitude = parse_coordinates(data.get('latitude'), data.get('longitude'))
+    except (TypeError, ValueError):
+        return False
+    return True
 
 
 @buildings_bp.route('', methods=['GET'])
 @require_auth
+@require_permission('buildings.view')
 def list_buildings(user):
-    if user.role in ['admin', 'csr', 'building_executive', 'technician']:
-        buildings = Building.query.all()
-    else:
-        buildings = []
-
-    return jsonify([_serialize_building(b) for b in buildings])
+    return cached_json(
+        'buildings',
+        f'list:{user.role}',
+        lambda: BUILDING.all(BUILDING.select()),
+    )
 
 
 @buildings_bp.route('/<int:building_id>', methods=['GET'])
 @require_auth
+@require_permission('buildings.view')
 def get_building(user, building_id):
     building = Building.query.get(building_id)
     if not building:
         return jsonify({'message': 'Building not found'}), 404
-
-    if user.role in ['admin', 'csr', 'building_executive']:
-        return jsonify(_serialize_building(building))
-
-    if not user_has_building_access(user, building_id):
-        return jsonify({'message': 'Forbidden'}), 403
-
-    return jsonify(_serialize_building(building))
+    return jsonify(BUILDING.one(building))
 
 
 @buildings_bp.route('', methods=['POST'])
 @require_auth
-@require_roles('admin')
+@require_permission('buildings.manage')
 def create_building(user):
     data = request.get_json()
     if not data or 'name' not in data or 'address' not in data:
         return jsonify({'message': 'Missing required fields'}), 400
 
     building = Building(name=data['name'], address=data['address'])
+    if not _set_coordinates(building, data):
+        return jsonify({'message': 'latitude and longitude must be valid coordinates'}), 400
     db.session.add(building)
     db.session.commit()
-    return jsonify(_serialize_building(building)), 201
+    cache.invalidate('buildings')
+    return jsonify(BUILDING.one(building)), 201
 
 
 @buildings_bp.route('/<int:building_id>', methods=['PUT'])
 @require_auth
-@require_roles('admin')
+@require_permission('buildings.manage')
 def update_building(user, building_id):
     building = Building.query.get(building_id)
     if not building:
@@ -71,14 +75,17 @@ def update_building(user, building_id):
         building.name = data['name']
     if 'address' in data:
         building.address = data['address']
+    if not _set_coordinates(building, data):
+        return jsonify({'message': 'latitude and longitude must be valid coordinates'}), 400
 
     db.session.commit()
-    return jsonify(_serialize_building(building))
+    cache.invalidate('buildings')
+    return jsonify(BUILDING.one(building))
 
 
 @buildings_bp.route('/<int:building_id>', methods=['DELETE'])
 @require_auth
-@require_roles('admin')
+@require_permission('buildings.manage')
 def delete_building(user, building_id):
     building = Building.query.get(building_id)
     if not building:
@@ -86,6 +93,7 @@ def delete_building(user, building_id):
 
     db.session.delete(building)
     db.session.commit()
+    cache.invalidate('buildings')
     return jsonify({'message': 'Building deleted'})
 
 
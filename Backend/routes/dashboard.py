@@ -0,0 +1,76 @@
+import datetime
+from flask import Blueprint, current_app, request
+from sqlalchemy import and_, case, func, select
+from extensions import db
+from models import Building, Defect
+from routes.permissions import DEFECT_STATUSES, DEFECT_VISIBLE_TO_ALL, defect_visibility_filter, normalize_role
+from routes.utils import cached_json, require_auth
+from serializers import BUILDING, DEFECT
+
+
+dashboard_bp = Blueprint('dashboard_bp', __name__)
+
+DEFAULT_RECENT = 5
+MAX_RECENT = 50
+
+
+def _build_dashboard(user, recent):
+    visible = and_(Defect.deleted_at.is_(None), defect_visibility_filter(user))
+
+    month_start = datetime.datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    by_status = dict.fromkeys(DEFECT_STATUSES, 0)
+    by_priority = dict.fromkeys(Defect.__table__.c.priority.type.enums, 0)
+    this_month = 0
+    for status, priority, count, created in db.session.execute(
+        select(
+            Defect.status,
+            Defect.priority,
+            func.count(Defect.id),
+            func.sum(case((Defect.created_at >= month_start, 1), else_=0)),
+        )
+        .where(visible)
+        .group_by(Defect.status, Defect.priority)
+    ):
+        by_status[status] += count
+        by_priority[priority] += count
+        this_month += created or 0
+
+    per_building = db.session.execute(
+        select(Building.id, Building.name, func.count(Defect.id))
+        .outerjoin(Defect, and_(Defect.building_id == Building.id, visible))
+        .group_by(Building.id, Building.name)
+        .order_by(Building.id)
+    ).all()
+
+    return {
+        'counts': {
+            'total': sum(by_status.values()),
+            'by_status': by_status,
+            'by_priority': by_priority,
+            'created_this_month': this_month,
+        },
+        'defects_per_building': [
+            {'building_id': building_id, 'building_name': name, 'defect_count': count}
+            for building_id, name, count in per_building
+        ],
+        'recent_defects': DEFECT.all(
+            DEFECT.select().where(visible).order_by(Defect.updated_at.desc(), Defect.id.desc()).limit(recent)
+        ),
+        'buildings': BUILDING.all(BUILDING.select().order_by(Building.id)),
+    }
+
+
+@dashboard_bp.route('', methods=['GET'])
+@require_auth
+def get_dashboard(user):
+    recent = min(max(request.args.get('recent', DEFAULT_RECENT, type=int), 0), MAX_RECENT)
+    role = normalize_role(user.role)
+    # Roles that see every defect share one cached copy; everyone else sees
+    # only their own defects, so their dashboard is cached per user.
+    scope = role if role in DEFECT_VISIBLE_TO_ALL else f'user:{user.id}'
+    return cached_json(
+        'dashboard',
+        f'{scope}:{recent}',
+        lambda: _build_dashboard(user, recent),
+        ttl=current_app.config['DASHBOARD_CACHE_TTL'],
+    )
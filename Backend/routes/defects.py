@@ -1,102 +1,196 @@
 import datetime
 from flask import Blueprint, request, jsonify
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm.exc import StaleDataError
+from duplicates import find_duplicates
 from extensions import db
-from models import Defect, DefectComment, Building, User
-from routes.utils import require_auth, require_roles
+from geo import buildings_within, parse_coordinates
+from idempotency import idempotent
+from models import Defect, DefectComment, ArchivedDefect, ArchivedDefectComment, Building, User
+from routes.permissions import (
+    COMMENT_FIELDS,
+    DEFECT_STATUSES,
+    DEFECT_UPDATE_FIELDS,
+    can_access_defect,
+    defect_visibility_filter,
+    normalize_role,
+    require_permission,
+)
+from routes.uploads import IMAGE_FIELDS, InvalidUploadRef, resolve_image_ref
+from routes.utils import require_auth
+from serializers import ARCHIVED_DEFECT, ARCHIVED_DEFECT_COMMENT, DEFECT, DEFECT_COMMENT
+from transitions import TransitionError, apply_transition
+from workload import PENDING_STATUSES
 
 
 defects_bp = Blueprint('defects_bp', __name__)
 
+NEARBY_DEFAULT_RADIUS_KM = 5
+NEARBY_MAX_RADIUS_KM = 100
+NEARBY_MAX_PER_PAGE = 100
+_PRIORITY_ORDER = {'high': 0, 'medium': 1, 'low': 2}
 
-def _serialize_defect(defect):
-    return {
-        'id': defect.id,
-        'title': defect.title,
-        'description': defect.description,
-        'status': defect.status,
-        'priority': defect.priority,
-        'image_url': defect.image_url,
-        'initial_report_image': defect.initial_report_image,
-        'technician_report_image': defect.technician_report_image,
-        'building_id': defect.building_id,
-        'reporter_id': defect.reporter_id,
-        'reviewed_by': defect.reviewed_by_id,
-        'assigned_technician_id': defect.assigned_technician_id,
-        'external_contractor': defect.external_contractor,
-        'contractor_name': defect.contractor_name,
-        'done_at': defect.done_at.isoformat() if defect.done_at else None,
-        'completed_at': defect.completed_at.isoformat() if defect.completed_at else None,
-        'created_at': defect.created_at.isoformat() if defect.created_at else None,
-        'updated_at': defect.updated_at.isoformat() if defect.updated_at else None,
-    }
-
-
-def _serialize_comment(comment):
-    return {
-        'id': comment.id,
-        'defect_id': comment.defect_id,
-        'initial_report': comment.initial_report,
-        'executive_decision': comment.executive_decision,
-        'technician_report': comment.technician_report,
-        'verification_report': comment.verification_report,
-        'final_completion': comment.final_completion,
-        'created_at': comment.created_at.isoformat() if comment.created_at else None,
-        'updated_at': comment.updated_at.isoformat() if comment.updated_at else None,
-    }
-
-
-def _normalize_role(role):
-    normalized = (role or '').strip().lower()
-    normalized = normalized.replace('-', '_').replace(' ', '_')
-    while '__' in normalized:
-        normalized = normalized.replace('__', '_')
-    return normalized
-
-
-def _can_access_defect(user, defect):
-    role = _normalize_role(user.role)
-    if role == 'admin':
-        return True
-
-    if defect.reporter_id == user.id:
-        return True
-
-    if role in ['csr', 'building_executive']:
-        return True
-
-    if role == 'technician':
-        return defect.assigned_technician_id == user.id
-
-    return False
+_UPSERT_INSERTS = {
+    'postgresql': postgresql_insert,
+    'sqlite': sqlite_insert,
+}
+
+
+class VersionConflict(Exception):
+    def __init__(self, current_version):
+        super().__init__(current_version)
+        self.current_version = current_version
+
+
+class InvalidVersion(Exception):
+    pass
+
+
+@defects_bp.errorhandler(VersionConflict)
+def _handle_version_conflict(error):
+    return jsonify({
+        'message': 'Record was modified by another request',
+        'version': error.current_version,
+    }), 409
+
+
+@defects_bp.errorhandler(InvalidVersion)
+def _handle_invalid_version(error):
+    return jsonify({'message': 'version must be an integer'}), 400
+
+
+@defects_bp.errorhandler(InvalidUploadRef)
+def _handle_invalid_upload_ref(error):
+    return jsonify({'message': 'Unknown upload reference'}), 400
+
+
+@defects_bp.errorhandler(TransitionError)
+def _handle_transition_error(error):
+    db.session.rollback()
+    body = {'message': error.message}
+    if error.current_version is not None:
+        body['version'] = error.current_version
+    return jsonify(body), error.status_code
+
+
+@defects_bp.errorhandler(StaleDataError)
+def _handle_stale_data(error):
+    # Another request committed between our read and our UPDATE.
+    db.session.rollback()
+    return jsonify({'message': 'Record was modified by another request'}), 409
+
+
+def _request_data():
+    """JSON body with ``upload:<token>`` image references resolved to URLs."""
+    data = request.get_json() or {}
+    for field in IMAGE_FIELDS:
+        if field in data:
+            data[field] = resolve_image_ref(data[field])
+    return data
+
+
+def _defect_body_response(body, status_code=200):
+    response = jsonify(body)
+    response.status_code = status_code
+    response.headers['ETag'] = f'"{body["version"]}"'
+    return response
+
+
+def _defect_response(defect, status_code=200, extra=None):
+    body = DEFECT.one(defect)
+    body.update(extra or {})
+    return _defect_body_response(body, status_code)
+
+
+def _body_version(data):
+    """``version`` from the JSON body as an int; JSON numbers and numeric strings are accepted."""
+    value = data.get('version')
+    if value is None or (isinstance(value, int) and not isinstance(value, bool)):
+        return value
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    raise InvalidVersion()
+
+
+def _expected_version(data):
+    if_match = (request.headers.get('If-Match') or '').strip()
+    if if_match == '*':
+        return None
+    if if_match:
+        if if_match.startswith('W/'):
+            if_match = if_match[2:]
+        try:
+            return int(if_match.strip('"'))
+        except ValueError:
+            return -1
+    return _body_version(data)
+
+
+def _check_version(record, expected):
+    if expected is not None and expected != record.version:
+        raise VersionConflict(record.version)
 
 
 def _get_or_create_comments(defect_id):
-    comments = (
-        DefectComment.query.filter_by(defect_id=defect_id)
-        .order_by(DefectComment.updated_at.desc(), DefectComment.created_at.desc())
-        .first()
+    insert = _UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+    if insert is None:
+        comments = DefectComment.query.filter_by(defect_id=defect_id).first()
+        if not comments:
+            comments = DefectComment(defect_id=defect_id)
+            db.session.add(comments)
+        return comments
+
+    # Single-statement upsert against the unique defect_id index, so two
+    # concurrent requests can never create two comment records.
+    now = datetime.datetime.utcnow()
+    db.session.execute(
+        insert(DefectComment.__table__)
+        .values(defect_id=defect_id, version=1, created_at=now, updated_at=now)
+        .on_conflict_do_nothing(index_elements=['defect_id'])
     )
-    if not comments:
-        comments = DefectComment(defect_id=defect_id)
-        db.session.add(comments)
-    return comments
+    return DefectComment.query.filter_by(defect_id=defect_id).one()
+
+
+def _update_comments(defect_id, **fields):
+    """Set the given comment fields, skipping empty ones."""
+    fields = {field: value for field, value in fields.items() if value}
+    if not fields:
+        return
+    comments = _get_or_create_comments(defect_id)
+    for field, value in fields.items():
+        setattr(comments, field, value)
 
 
 def _is_deleted(defect):
     return defect.deleted_at is not None
 
 
+def _include_archived():
+    return request.args.get('include_archived') in ('1', 'true')
+
+
+def _get_archived_defect(user, defect_id):
+    archived = ArchivedDefect.query.get(defect_id)
+    if not archived or _is_deleted(archived) or not can_access_defect(user, archived):
+        return None
+    return archived
+
+
 @defects_bp.route('', methods=['POST'])
 @require_auth
+@require_permission('defects.create')
+@idempotent
 def create_defect(user):
-    data = request.get_json() or {}
+    data = _request_data()
     required_fields = ['title', 'description', 'priority', 'building_id']
     if any(field not in data for field in required_fields):
         return jsonify({'message': 'Missing required fields'}), 400
 
-    if user.role not in ['csr', 'building_executive', 'admin']:
-        return jsonify({'message': 'Forbidden'}), 403
-
     building = Building.query.get(data['building_id'])
     if not building:
         return jsonify({'message': 'Building not found'}), 404
@@ -121,116 +215,145 @@ def create_defect(user):
         comments.initial_report = initial_report
     db.session.commit()
 
-    return jsonify(_serialize_defect(defect)), 201
+    duplicates = find_duplicates(
+        defect.building_id, defect.title, defect.description,
+        exclude_id=defect.id, filters=(defect_visibility_filter(user),),
+    )
+    return _defect_response(defect, 201, {'possible_duplicates': duplicates})
 
 
 @defects_bp.route('', methods=['GET'])
 @require_auth
 def list_defects(user):
-    role = _normalize_role(user.role)
-    query = Defect.query.filter(Defect.deleted_at.is_(None))
-    if role in ['admin', 'csr', 'building_executive']:
-        defects = query.all()
-    elif role == 'technician':
-        defects = query.filter_by(assigned_technician_id=user.id).all()
-    else:
-        defects = []
+    results = DEFECT.all(
+        DEFECT.select().where(Defect.deleted_at.is_(None), defect_visibility_filter(user))
+    )
 
-    return jsonify([_serialize_defect(d) for d in defects])
+    if _include_archived():
+        results.extend(ARCHIVED_DEFECT.all(
+            ARCHIVED_DEFECT.select()
+            .where(ArchivedDefect.deleted_at.is_(None), defect_visibility_filter(user, ArchivedDefect))
+        ))
+
+    return jsonify(results)
+
+
+@defects_bp.route('/nearby', methods=['GET'])
+@require_auth
+def nearby_defects(user):
+    try:
+        latitude, longitude = parse_coordinates(request.args.get('lat'), request.args.get('lon'))
+    except (TypeError, ValueError):
+        return jsonify({'message': 'lat and lon are required and must be valid coordinates'}), 400
+    radius_km = request.args.get('radius_km', NEARBY_DEFAULT_RADIUS_KM, type=float)
+    if not 0 < radius_km <= NEARBY_MAX_RADIUS_KM:
+        return jsonify({'message': f'radius_km must be between 0 and {NEARBY_MAX_RADIUS_KM}'}), 400
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), NEARBY_MAX_PER_PAGE)
+
+    distances = buildings_within(latitude, longitude, radius_km)
+    result = {'items': [], 'page': page, 'per_page': per_page, 'total': 0}
+    if not distances:
+        return jsonify(result)
+
+    conditions = (
+        Defect.building_id.in_(distances),
+        Defect.status.in_(PENDING_STATUSES),
+        Defect.deleted_at.is_(None),
+        defect_visibility_filter(user),
+    )
+    result['total'] = db.session.execute(select(func.count(Defect.id)).where(*conditions)).scalar()
+    items = DEFECT.all(
+        DEFECT.select()
+        .where(*conditions)
+        .order_by(
+            case(distances, value=Defect.building_id),
+            case(_PRIORITY_ORDER, value=Defect.priority),
+            Defect.created_at,
+            Defect.id,
+        )
+        .limit(per_page)
+        .offset((page - 1) * per_page)
+    )
+    for item in items:
+        item['distance_km'] = round(distances[item['building_id']], 3)
+    result['items'] = items
+    return jsonify(result)
 
 
 @defects_bp.route('/<int:defect_id>', methods=['GET'])
 @require_auth
 def get_defect(user, defect_id):
     defect = Defect.query.get(defect_id)
+    if not defect and _include_archived():
+        archived = _get_archived_defect(user, defect_id)
+        if archived:
+            return jsonify(ARCHIVED_DEFECT.one(archived))
     if not defect or _is_deleted(defect):
         return jsonify({'message': 'Defect not found'}), 404
-    if not _can_access_defect(user, defect):
+    if not can_access_defect(user, defect):
         return jsonify({'message': 'Forbidden'}), 403
-    return jsonify(_serialize_defect(defect))
+    return _defect_response(defect)
 
 
-@defects_bp.route('/<int:defect_id>', methods=['PUT'])
+@defects_bp.route('/<int:defect_id>/duplicates', methods=['GET'])
 @require_auth
-def update_defect(user, defect_id):
+def get_duplicates(user, defect_id):
     defect = Defect.query.get(defect_id)
     if not defect or _is_deleted(defect):
         return jsonify({'message': 'Defect not found'}), 404
-
-    role = _normalize_role(user.role)
-    if role not in ['csr', 'building_executive', 'admin']:
+    if not can_access_defect(user, defect):
         return jsonify({'message': 'Forbidden'}), 403
+    return jsonify(find_duplicates(
+        defect.building_id, defect.title, defect.description,
+        exclude_id=defect.id, filters=(defect_visibility_filter(user),),
+    ))
 
-    data = request.get_json() or {}
 
-    if role == 'csr':
-        if 'priority' in data:
-            defect.priority = data['priority']
-        for field in ['initial_report_image', 'image_url']:
-            if field in data:
-                setattr(defect, field, data[field])
-    elif role == 'building_executive':
-        if 'status' in data and data['status'] in ['Open', 'Reviewed', 'Ongoing', 'Done', 'Completed']:
-            defect.status = data['status']
-        for field in ['external_contractor', 'contractor_name', 'initial_report_image', 'image_url', 'technician_report_image']:
-            if field in data:
-                setattr(defect, field, data[field])
-    elif role == 'technician':
-        if defect.assigned_technician_id != user.id:
-            return jsonify({'message': 'Forbidden'}), 403
-        if 'technician_report_image' in data:
-            defect.technician_report_image = data['technician_report_image']
-    else:
-        # Admin
-        if 'status' in data and data['status'] in ['Open', 'Reviewed', 'Ongoing', 'Done', 'Completed']:
-            defect.status = data['status']
-
-        for field in ['title', 'description', 'priority', 'image_url', 'initial_report_image', 'technician_report_image', 'external_contractor', 'contractor_name']:
-            if field in data:
-                setattr(defect, field, data[field])
+@defects_bp.route('/<int:defect_id>', methods=['PUT'])
+@require_auth
+@require_permission('defects.update')
+@idempotent
+def update_defect(user, defect_id):
+    defect = Defect.query.get(defect_id)
+    if not defect or _is_deleted(defect):
+        return jsonify({'message': 'Defect not found'}), 404
+
+    data = _request_data()
+    _check_version(defect, _expected_version(data))
+    for field in DEFECT_UPDATE_FIELDS[normalize_role(user.role)]:
+        if field not in data:
+            continue
+        if field == 'status' and data['status'] not in DEFECT_STATUSES:
+            continue
+        setattr(defect, field, data[field])
 
     db.session.commit()
-    return jsonify(_serialize_defect(defect))
+    return _defect_response(defect)
 
 
 @defects_bp.route('/<int:defect_id>/review', methods=['PATCH'])
 @require_auth
+@require_permission('defects.review')
+@idempotent
 def review_defect(user, defect_id):
-    defect = Defect.query.get(defect_id)
-    if not defect or _is_deleted(defect):
-        return jsonify({'message': 'Defect not found'}), 404
-
-    role = _normalize_role(user.role)
-    if role not in ['building_executive', 'admin']:
-        return jsonify({'message': 'Forbidden'}), 403
-
     data = request.get_json() or {}
-    defect.status = 'Reviewed'
-    defect.reviewed_by_id = user.id
-    if 'external_contractor' in data:
-        defect.external_contractor = data['external_contractor']
-    if 'contractor_name' in data:
-        defect.contractor_name = data['contractor_name']
-
-    comments = _get_or_create_comments(defect.id)
-    if data.get('executive_decision'):
-        comments.executive_decision = data.get('executive_decision')
+    values = {'reviewed_by_id': user.id}
+    for field in ('external_contractor', 'contractor_name'):
+        if field in data:
+            values[field] = data[field]
 
+    defect = apply_transition(user, defect_id, 'review', values, _expected_version(data))
+    _update_comments(defect_id, executive_decision=data.get('executive_decision'))
     db.session.commit()
-    return jsonify(_serialize_defect(defect))
+    return _defect_body_response(defect)
 
 
 @defects_bp.route('/<int:defect_id>/assign', methods=['PATCH'])
 @require_auth
+@require_permission('defects.assign')
+@idempotent
 def assign_technician(user, defect_id):
-    defect = Defect.query.get(defect_id)
-    if not defect or _is_deleted(defect):
-        return jsonify({'message': 'Defect not found'}), 404
-
-    role = _normalize_role(user.role)
-    if role not in ['building_executive', 'admin']:
-        return jsonify({'message': 'Forbidden'}), 403
-
     data = request.get_json() or {}
     tech_id = data.get('assigned_technician_id')
     if not tech_id:
@@ -240,122 +363,87 @@ def assign_technician(user, defect_id):
     if not technician or technician.role != 'technician':
         return jsonify({'message': 'Invalid technician'}), 400
 
-    defect.assigned_technician_id = tech_id
-    defect.status = 'Ongoing'
-    if data.get('external_contractor') is not None:
-        defect.external_contractor = data.get('external_contractor')
-    if data.get('contractor_name') is not None:
-        defect.contractor_name = data.get('contractor_name')
+    values = {'assigned_technician_id': tech_id}
+    for field in ('external_contractor', 'contractor_name'):
+        if data.get(field) is not None:
+            values[field] = data[field]
 
+    defect = apply_transition(user, defect_id, 'assign', values, _expected_version(data))
     db.session.commit()
-    return jsonify(_serialize_defect(defect))
+    return _defect_body_response(defect)
 
 
 @defects_bp.route('/<int:defect_id>/ongoing', methods=['PATCH'])
 @require_auth
+@require_permission('defects.ongoing')
+@idempotent
 def mark_ongoing(user, defect_id):
-    defect = Defect.query.get(defect_id)
-    if not defect or _is_deleted(defect):
-        return jsonify({'message': 'Defect not found'}), 404
-
-    role = _normalize_role(user.role)
-    if role not in ['technician', 'admin']:
-        return jsonify({'message': 'Forbidden'}), 403
-    if role == 'technician' and defect.assigned_technician_id != user.id:
-        return jsonify({'message': 'Forbidden'}), 403
-
     data = request.get_json() or {}
-    defect.status = 'Ongoing'
-
-    comments = _get_or_create_comments(defect.id)
-    if data.get('technician_report'):
-        comments.technician_report = data.get('technician_report')
-
+    defect = apply_transition(user, defect_id, 'ongoing', expected_version=_expected_version(data))
+    _update_comments(defect_id, technician_report=data.get('technician_report'))
     db.session.commit()
-    return jsonify(_serialize_defect(defect))
+    return _defect_body_response(defect)
 
 
 @defects_bp.route('/<int:defect_id>/done', methods=['PATCH'])
 @require_auth
+@require_permission('defects.done')
+@idempotent
 def mark_done(user, defect_id):
-    defect = Defect.query.get(defect_id)
-    if not defect or _is_deleted(defect):
-        return jsonify({'message': 'Defect not found'}), 404
-
-    role = _normalize_role(user.role)
-    if role not in ['technician', 'admin']:
-        return jsonify({'message': 'Forbidden'}), 403
-    if role == 'technician' and defect.assigned_technician_id != user.id:
-        return jsonify({'message': 'Forbidden'}), 403
-
-    data = request.get_json() or {}
-    defect.status = 'Done'
-    defect.done_at = datetime.datetime.utcnow()
-
-    comments = _get_or_create_comments(defect.id)
-    if data.get('technician_report'):
-        comments.technician_report = data.get('technician_report')
-    if data.get('verification_report'):
-        comments.verification_report = data.get('verification_report')
+    data = _request_data()
+    values = {'done_at': datetime.datetime.utcnow()}
     if data.get('technician_report_image'):
-        defect.technician_report_image = data.get('technician_report_image')
+        values['technician_report_image'] = data['technician_report_image']
 
+    defect = apply_transition(user, defect_id, 'done', values, _expected_version(data))
+    _update_comments(
+        defect_id,
+        technician_report=data.get('technician_report'),
+        verification_report=data.get('verification_report'),
+    )
     db.session.commit()
-    return jsonify(_serialize_defect(defect))
+    return _defect_body_response(defect)
 
 
 @defects_bp.route('/<int:defect_id>/complete', methods=['PATCH'])
 @require_auth
+@require_permission('defects.complete')
+@idempotent
 def mark_complete(user, defect_id):
-    defect = Defect.query.get(defect_id)
-    if not defect or _is_deleted(defect):
-        return jsonify({'message': 'Defect not found'}), 404
-
-    role = _normalize_role(user.role)
-    if role not in ['building_executive', 'admin']:
-        return jsonify({'message': 'Forbidden'}), 403
-
     data = request.get_json() or {}
-    defect.status = 'Completed'
-    defect.completed_at = datetime.datetime.utcnow()
-
-    comments = _get_or_create_comments(defect.id)
-    if data.get('verification_report'):
-        comments.verification_report = data.get('verification_report')
-    if data.get('final_completion'):
-        comments.final_completion = data.get('final_completion')
-
+    values = {'completed_at': datetime.datetime.utcnow()}
+    defect = apply_transition(user, defect_id, 'complete', values, _expected_version(data))
+    _update_comments(
+        defect_id,
+        verification_report=data.get('verification_report'),
+        final_completion=data.get('final_completion'),
+    )
     db.session.commit()
-    return jsonify(_serialize_defect(defect))
+    return _defect_body_response(defect)
 
 
 @defects_bp.route('/<int:defect_id>/reopen', methods=['PATCH'])
 @require_auth
+@require_permission('defects.reopen')
+@idempotent
 def reopen_defect(user, defect_id):
-    defect = Defect.query.get(defect_id)
-    if not defect or _is_deleted(defect):
-        return jsonify({'message': 'Defect not found'}), 404
-
-    role = _normalize_role(user.role)
-    if role not in ['building_executive', 'admin']:
-        return jsonify({'message': 'Forbidden'}), 403
-
-    defect.status = 'Open'
-    defect.done_at = None
-    defect.completed_at = None
+    data = request.get_json(silent=True) or {}
+    values = {'done_at': None, 'completed_at': None}
+    defect = apply_transition(user, defect_id, 'reopen', values, _expected_version(data))
     db.session.commit()
-    return jsonify(_serialize_defect(defect))
+    return _defect_body_response(defect)
 
 
 @defects_bp.route('/<int:defect_id>', methods=['DELETE'])
 @require_auth
-@require_roles('admin')
+@require_permission('defects.delete')
 def delete_defect(user, defect_id):
     defect = Defect.query.get(defect_id)
     if not defect:
         return jsonify({'message': 'Defect not found'}), 404
     if _is_deleted(defect):
         return jsonify({'message': 'Defect already deleted'}), 409
+    _check_version(defect, _expected_version(request.get_json(silent=True) or {}))
 
     defect.deleted_at = datetime.datetime.utcnow()
     defect.deleted_by_id = user.id
@@ -366,32 +454,25 @@ def delete_defect(user, defect_id):
 
 @defects_bp.route('/<int:defect_id>/comments', methods=['PATCH'])
 @require_auth
+@idempotent
 def upsert_comments(user, defect_id):
     defect = Defect.query.get(defect_id)
     if not defect or _is_deleted(defect):
         return jsonify({'message': 'Defect not found'}), 404
-    if not _can_access_defect(user, defect):
+    if not can_access_defect(user, defect):
         return jsonify({'message': 'Forbidden'}), 403
 
     data = request.get_json() or {}
     comments = _get_or_create_comments(defect.id)
+    # If-Match carries the defect's version (its ETag), not the comments',
+    # so only the body ``version`` is checked here.
+    _check_version(comments, _body_version(data))
 
     if 'csr_prognosis' in data and 'initial_report' not in data:
         data['initial_report'] = data['csr_prognosis']
 
-    role = _normalize_role(user.role)
-    allowed_fields = []
-    if role == 'csr':
-        allowed_fields = ['initial_report']
-    elif role == 'building_executive':
-        allowed_fields = ['executive_decision', 'verification_report', 'final_completion']
-    elif role == 'technician':
-        allowed_fields = ['technician_report', 'verification_report']
-    elif role == 'admin':
-        allowed_fields = ['initial_report', 'executive_decision', 'technician_report', 'verification_report', 'final_completion']
-
     updated = False
-    for field in allowed_fields:
+    for field in COMMENT_FIELDS.get(normalize_role(user.role), ()):
         if field in data:
             setattr(comments, field, data[field])
             updated = True
@@ -400,21 +481,24 @@ def upsert_comments(user, defect_id):
         defect.updated_at = datetime.datetime.utcnow()
 
     db.session.commit()
-    return jsonify(_serialize_comment(comments))
+    return jsonify(DEFECT_COMMENT.one(comments))
 
 
 @defects_bp.route('/<int:defect_id>/comments', methods=['GET'])
 @require_auth
 def get_comments(user, defect_id):
     defect = Defect.query.get(defect_id)
+    if not defect and _include_archived() and _get_archived_defect(user, defect_id):
+        return jsonify(ARCHIVED_DEFECT_COMMENT.all(
+            ARCHIVED_DEFECT_COMMENT.select().where(ArchivedDefectComment.defect_id == defect_id)
+        ))
     if not defect or _is_deleted(defect):
         return jsonify({'message': 'Defect not found'}), 404
-    if not _can_access_defect(user, defect):
+    if not can_access_defect(user, defect):
         return jsonify({'message': 'Forbidden'}), 403
 
-    comments = (
-        DefectComment.query.filter_by(defect_id=defect_id)
+    return jsonify(DEFECT_COMMENT.all(
+        DEFECT_COMMENT.select()
+        .where(DefectComment.defect_id == defect_id)
         .order_by(DefectComment.created_at.asc(), DefectComment.updated_at.asc())
-        .all()
-    )
-    return jsonify([_serialize_comment(comment) for comment in comments])
+    ))
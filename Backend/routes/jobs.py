@@ -0,0 +1,82 @@
+from flask import Blueprint, jsonify, request, url_for
+from jobs import JOB_HANDLERS, enqueue
+from models import Job
+from routes.permissions import Role, normalize_role
+from routes.utils import require_auth
+
+
+jobs_bp = Blueprint('jobs_bp', __name__)
+
+
+def _serialize_job(job):
+    return {
+        'id': job.id,
+        'job_type': job.job_type,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'error': job.error if job.status == 'failed' else None,
+        'created_by_id': job.created_by_id,
+        'run_after': job.run_after.isoformat() if job.run_after else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'updated_at': job.updated_at.isoformat() if job.updated_at else None,
+    }
+
+
+def enqueue_response(job):
+    response = jsonify(_serialize_job(job))
+    response.status_code = 202
+    response.headers['Location'] = url_for('jobs_bp.get_job', job_id=job.id)
+    return response
+
+
+def _can_view_job(user, job):
+    return normalize_role(user.role) == Role.ADMIN or job.created_by_id == user.id
+
+
+@jobs_bp.route('', methods=['POST'])
+@require_auth
+def create_job(user):
+    data = request.get_json() or {}
+    job_type = data.get('job_type')
+    handler = JOB_HANDLERS.get(job_type)
+    if not handler:
+        return jsonify({'message': 'Unknown job type'}), 400
+    if normalize_role(user.role) not in handler['roles']:
+        return jsonify({'message': 'Forbidden'}), 403
+
+    payload = data.get('payload') or {}
+    if not isinstance(payload, dict):
+        return jsonify({'message': 'payload must be an object'}), 400
+
+    job = enqueue(job_type, payload, user_id=user.id)
+    return enqueue_response(job)
+
+
+@jobs_bp.route('/<int:job_id>', methods=['GET'])
+@require_auth
+def get_job(user, job_id):
+    job = Job.query.get(job_id)
+    if not job:
+        return jsonify({'message': 'Job not found'}), 404
+    if not _can_view_job(user, job):
+        return jsonify({'message': 'Forbidden'}), 403
+    return jsonify(_serialize_job(job))
+
+
+@jobs_bp.route('/<int:job_id>/result', methods=['GET'])
+@require_auth
+def get_job_result(user, job_id):
+    job = Job.query.get(job_id)
+    if not job:
+        return jsonify({'message': 'Job not found'}), 404
+    if not _can_view_job(user, job):
+        return jsonify({'message': 'Forbidden'}), 403
+
+    if job.status == 'failed':
+        return jsonify({'message': 'Job failed', 'job': _serialize_job(job)}), 409
+    if job.status != 'succeeded':
+        return jsonify(_serialize_job(job)), 202
+    return jsonify(job.result)
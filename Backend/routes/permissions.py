@@ -0,0 +1,114 @@
+import functools
+from flask import jsonify
+from sqlalchemy import or_, true
+from models import Defect
+
+
+class Role:
+    ADMIN = 'admin'
+    CSR = 'csr'
+    BUILDING_EXECUTIVE = 'building_executive'
+    TECHNICIAN = 'technician'
+
+
+ROLES = (Role.ADMIN, Role.CSR, Role.BUILDING_EXECUTIVE, Role.TECHNICIAN)
+DEFECT_STATUSES = ('Open', 'Reviewed', 'Ongoing', 'Done', 'Completed')
+
+# Roles that see every defect. Everyone else sees the defects they
+# reported or are assigned to.
+DEFECT_VISIBLE_TO_ALL = frozenset([Role.ADMIN, Role.CSR, Role.BUILDING_EXECUTIVE])
+
+_ACTIONS = {
+    'defects.create': [Role.ADMIN, Role.CSR, Role.BUILDING_EXECUTIVE],
+    'defects.update': [Role.ADMIN, Role.CSR, Role.BUILDING_EXECUTIVE],
+    'defects.review': [Role.ADMIN, Role.BUILDING_EXECUTIVE],
+    'defects.assign': [Role.ADMIN, Role.BUILDING_EXECUTIVE],
+    'defects.ongoing': [Role.ADMIN, Role.TECHNICIAN],
+    'defects.done': [Role.ADMIN, Role.TECHNICIAN],
+    'defects.complete': [Role.ADMIN, Role.BUILDING_EXECUTIVE],
+    'defects.reopen': [Role.ADMIN, Role.BUILDING_EXECUTIVE],
+    'defects.delete': [Role.ADMIN],
+    'buildings.view': list(ROLES),
+    'buildings.manage': [Role.ADMIN],
+    'users.manage': [Role.ADMIN],
+    'users.technicians': [Role.ADMIN, Role.BUILDING_EXECUTIVE],
+    'analytics.view': [Role.ADMIN, Role.CSR, Role.BUILDING_EXECUTIVE],
+    'analytics.export': [Role.ADMIN],
+    'system.monitor': [Role.ADMIN],
+    'system.profile': [Role.ADMIN],
+    'sla.view': [Role.ADMIN, Role.BUILDING_EXECUTIVE],
+    'uploads.create': list(ROLES),
+}
+
+# Defect columns each role may set through PUT /api/defects/<id>.
+_DEFECT_UPDATE_FIELDS = {
+    Role.ADMIN: [
+        'status', 'title', 'description', 'priority', 'image_url', 'initial_report_image',
+        'technician_report_image', 'external_contractor', 'contractor_name',
+    ],
+    Role.CSR: ['priority', 'initial_report_image', 'image_url'],
+    Role.BUILDING_EXECUTIVE: [
+        'status', 'external_contractor', 'contractor_name', 'initial_report_image',
+        'image_url', 'technician_report_image',
+    ],
+}
+
+# DefectComment columns each role may set through PATCH /api/defects/<id>/comments.
+_COMMENT_FIELDS = {
+    Role.ADMIN: [
+        'initial_report', 'executive_decision', 'technician_report',
+        'verification_report', 'final_completion',
+    ],
+    Role.CSR: ['initial_report'],
+    Role.BUILDING_EXECUTIVE: ['executive_decision', 'verification_report', 'final_completion'],
+    Role.TECHNICIAN: ['technician_report', 'verification_report'],
+}
+
+# Compiled once at import: role -> frozenset of allowed actions / fields.
+PERMISSIONS = {
+    role: frozenset(action for action, roles in _ACTIONS.items() if role in roles)
+    for role in ROLES
+}
+DEFECT_UPDATE_FIELDS = {role: tuple(_DEFECT_UPDATE_FIELDS.get(role, ())) for role in ROLES}
+COMMENT_FIELDS = {role: tuple(_COMMENT_FIELDS.get(role, ())) for role in ROLES}
+
+
+@functools.lru_cache(maxsize=64)
+def normalize_role(role):
+    normalized = (role or '').strip().lower()
+    normalized = normalized.replace('-', '_').replace(' ', '_')
+    while '__' in normalized:
+        normalized = normalized.replace('__', '_')
+    return normalized
+
+
+def can(user, action):
+    return action in PERMISSIONS.get(normalize_role(user.role), ())
+
+
+def require_permission(action):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(user, *args, **kwargs):
+            if not can(user, action):
+                return jsonify({'message': 'Forbidden'}), 403
+            return fn(user, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def defect_visibility_filter(user, model=Defect):
+    """SQL predicate selecting the defects ``user`` may see.
+
+    ``model`` may be any mapped class with the defect columns, such as
+    ArchivedDefect.
+    """
+    if normalize_role(user.role) in DEFECT_VISIBLE_TO_ALL:
+        return true()
+    return or_(model.assigned_technician_id == user.id, model.reporter_id == user.id)
+
+
+def can_access_defect(user, defect):
+    if normalize_role(user.role) in DEFECT_VISIBLE_TO_ALL:
+        return True
+    return user.id in (defect.assigned_technician_id, defect.reporter_id)
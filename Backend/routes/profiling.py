@@ -0,0 +1,50 @@
+import os
+from flask import Blueprint, Response, current_app, jsonify, request, send_from_directory
+from extensions import profiler
+from profiling import format_folded
+from routes.permissions import require_permission
+from routes.utils import require_auth
+
+
+profiling_bp = Blueprint('profiling_bp', __name__)
+
+
+@profiling_bp.route('/stacks', methods=['GET'])
+@require_auth
+@require_permission('system.profile')
+def sampled_stacks(user):
+    """Per-endpoint totals, or the folded stacks of ``?endpoint=``."""
+    endpoint = request.args.get('endpoint')
+    if not endpoint:
+        return jsonify({
+            'sample_rate': current_app.config['PROFILE_SAMPLE_RATE'],
+            'endpoints': profiler.summary(),
+        })
+    stacks = profiler.stacks(endpoint)
+    if stacks is None:
+        return jsonify({'message': 'No samples for this endpoint'}), 404
+    return Response(format_folded(stacks), mimetype='text/plain')
+
+
+@profiling_bp.route('/stacks', methods=['DELETE'])
+@require_auth
+@require_permission('system.profile')
+def reset_stacks(user):
+    profiler.reset()
+    return '', 204
+
+
+@profiling_bp.route('/artifacts', methods=['GET'])
+@require_auth
+@require_permission('system.profile')
+def list_artifacts(user):
+    folder = current_app.config['PROFILE_FOLDER']
+    names = sorted(os.listdir(folder), reverse=True) if os.path.isdir(folder) else []
+    return jsonify(names)
+
+
+@profiling_bp.route('/artifacts/<name>', methods=['GET'])
+@require_auth
+@require_permission('system.profile')
+def get_artifact(user, name):
+    return send_from_directory(current_app.config['PROFILE_FOLDER'], name, as_attachment=True)
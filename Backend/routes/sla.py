@@ -0,0 +1,62 @@
+from flask import Blueprint, jsonify, request
+from sqlalchemy import and_, func, or_, select
+from extensions import db
+from models import Defect, SlaBreach
+from routes.permissions import require_permission
+from routes.utils import require_auth
+from serializers import SLA_BREACH
+from sla import SLA_RULES
+
+
+sla_bp = Blueprint('sla_bp', __name__)
+
+MAX_PER_PAGE = 100
+
+
+@sla_bp.route('/breaches', methods=['GET'])
+@require_auth
+@require_permission('sla.view')
+def list_breaches(user):
+    """Newest breaches first, with the defect's current title and status."""
+    conditions = []
+    rule = request.args.get('rule')
+    if rule:
+        if rule not in SLA_RULES:
+            return jsonify({'message': f"rule must be one of {', '.join(SLA_RULES)}"}), 400
+        conditions.append(SlaBreach.rule == rule)
+    for field in ('priority', 'building_id'):
+        if request.args.get(field):
+            conditions.append(getattr(SlaBreach, field) == request.args.get(field))
+    if request.args.get('unresolved') in ('1', 'true'):
+        # The defect is still in a status the rule waits on.
+        conditions.append(or_(*(
+            and_(SlaBreach.rule == name, Defect.status.in_(config['statuses']))
+            for name, config in SLA_RULES.items()
+        )))
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), MAX_PER_PAGE)
+
+    total = db.session.execute(
+        select(func.count(SlaBreach.id)).outerjoin(Defect, Defect.id == SlaBreach.defect_id).where(*conditions)
+    ).scalar()
+    rows = db.session.execute(
+        SLA_BREACH.select()
+        .add_columns(Defect.title, Defect.status)
+        .outerjoin(Defect, Defect.id == SlaBreach.defect_id)
+        .where(*conditions)
+        .order_by(SlaBreach.detected_at.desc(), SlaBreach.id.desc())
+        .limit(per_page)
+        .offset((page - 1) * per_page)
+    )
+    items = []
+    for row in rows:
+        item = SLA_BREACH.row(row)
+        item['title'], item['current_status'] = row[-2], row[-1]
+        items.append(item)
+    return jsonify({
+        'items': items,
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'rules': {name: config['hours'] for name, config in SLA_RULES.items()},
+    })
@@ -0,0 +1,201 @@
+import os
+import secrets
+import tempfile
+from flask import Blueprint, current_app, jsonify, request, send_from_directory, url_for
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import parse_form_data
+from extensions import db
+from models import Upload
+from routes.permissions import require_permission
+from routes.utils import require_auth
+
+
+uploads_bp = Blueprint('uploads_bp', __name__)
+
+UPLOAD_REF_PREFIX = 'upload:'
+IMAGE_FIELDS = ('image_url', 'initial_report_image', 'technician_report_image')
+
+# content type -> (file extension, leading-bytes check)
+_IMAGE_TYPES = {
+    'image/jpeg': ('.jpg', lambda head: head.startswith(b'\xff\xd8\xff')),
+    'image/png': ('.png', lambda head: head.startswith(b'\x89PNG\r\n\x1a\n')),
+    'image/gif': ('.gif', lambda head: head[:6] in (b'GIF87a', b'GIF89a')),
+    'image/webp': ('.webp', lambda head: head[:4] == b'RIFF' and head[8:12] == b'WEBP'),
+}
+_SNIFF_BYTES = 12
+
+
+class UploadRejected(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class InvalidUploadRef(ValueError):
+    pass
+
+
+@uploads_bp.errorhandler(UploadRejected)
+def _handle_upload_rejected(error):
+    return jsonify({'message': error.message}), error.status_code
+
+
+@uploads_bp.errorhandler(RequestEntityTooLarge)
+def _handle_too_large(error):
+    return jsonify({'message': 'Request body too large'}), 413
+
+
+def _sniff(head):
+    for content_type, (_, matches) in _IMAGE_TYPES.items():
+        if matches(head):
+            return content_type
+    return None
+
+
+class _ImageSink:
+    """File-like target for werkzeug's multipart parser.
+
+    Chunks go straight to a temporary file in the upload folder. The type
+    is checked from the first bytes and the size on every write, so a bad
+    upload is rejected without reading the rest of it.
+    """
+
+    def __init__(self, folder, max_size):
+        fd, self.path = tempfile.mkstemp(dir=folder, suffix='.part')
+        self._file = os.fdopen(fd, 'w+b')
+        self.max_size = max_size
+        self.size = 0
+        self.head = b''
+        self.content_type = None
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise UploadRejected('File too large', 413)
+        if self.content_type is None and len(self.head) < _SNIFF_BYTES:
+            self.head += chunk[:_SNIFF_BYTES - len(self.head)]
+            if len(self.head) >= _SNIFF_BYTES:
+                self.check_type()
+        return self._file.write(chunk)
+
+    def check_type(self):
+        self.content_type = _sniff(self.head)
+        if self.content_type is None:
+            raise UploadRejected('Unsupported file type', 415)
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+    def discard(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def upload_folder():
+    folder = current_app.config['UPLOAD_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def upload_url(upload):
+    return url_for('uploads_bp.get_upload', token=upload.token, _external=True)
+
+
+def resolve_image_ref(value):
+    """Turn an ``upload:<token>`` reference into the upload's URL.
+
+    Any other value is returned unchanged so existing clients that still
+    send URLs or data URLs keep working.
+    """
+    if not isinstance(value, str) or not value.startswith(UPLOAD_REF_PREFIX):
+        return value
+    upload = Upload.query.filter_by(token=value[len(UPLOAD_REF_PREFIX):]).first()
+    if not upload:
+        raise InvalidUploadRef(value)
+    return upload_url(upload)
+
+
+@uploads_bp.route('', methods=['POST'])
+@require_auth
+@require_permission('uploads.create')
+def create_upload(user):
+    if request.mimetype != 'multipart/form-data':
+        return jsonify({'message': 'Expected multipart/form-data'}), 415
+
+    folder = upload_folder()
+    max_size = current_app.config['UPLOAD_MAX_FILE_SIZE']
+    sinks = []
+
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        if sinks:
+            raise UploadRejected('Only one file may be uploaded per request')
+        sink = _ImageSink(folder, max_size)
+        sinks.append(sink)
+        return sink
+
+    try:
+        _, form, files = parse_form_data(
+            request.environ,
+            stream_factory=stream_factory,
+            max_content_length=request.max_content_length,
+            max_form_parts=16,
+            silent=False,
+        )
+        file = files.get('file')
+        if not file or not sinks:
+            raise UploadRejected('No file provided')
+        sink = sinks[0]
+        if sink.content_type is None:
+            sink.check_type()
+        sink.close()
+
+        token = secrets.token_urlsafe(24)
+        filename = token + _IMAGE_TYPES[sink.content_type][0]
+        os.replace(sink.path, os.path.join(folder, filename))
+    except ValueError:
+        raise UploadRejected('Malformed multipart body')
+    finally:
+        for sink in sinks:
+            sink.discard()
+
+    upload = Upload(
+        token=token,
+        filename=file.filename,
+        content_type=sink.content_type,
+        size=sink.size,
+        path=filename,
+        uploaded_by_id=user.id,
+    )
+    db.session.add(upload)
+    db.session.commit()
+
+    return jsonify({
+        'id': upload.id,
+        'ref': UPLOAD_REF_PREFIX + upload.token,
+        'url': upload_url(upload),
+        'content_type': upload.content_type,
+        'size': upload.size,
+    }), 201
+
+
+@uploads_bp.route('/<token>', methods=['GET'])
+def get_upload(token):
+    # The unguessable token is the capability, so <img src> works without
+    # an Authorization header.
+    upload = Upload.query.filter_by(token=token).first()
+    if not upload:
+        return jsonify({'message': 'Upload not found'}), 404
+    return send_from_directory(
+        upload_folder(), upload.path, mimetype=upload.content_type, max_age=31536000,
+    )
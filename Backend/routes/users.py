@@ -1,44 +1,39 @@
+import datetime
 from flask import Blueprint, jsonify, request
-from extensions import db
-from models import User
-from routes.utils import require_auth, require_roles
+from extensions import db, cache
+from models import User, TechnicianWorkload
+from routes.permissions import ROLES, require_permission
+from routes.utils import cached_json, require_auth, revoke_user_tokens
+from serializers import USER
 
 
 users_bp = Blueprint('users_bp', __name__)
 
 
-def _serialize_user(user):
-    return {
-        'id': user.id,
-        'name': user.name,
-        'email': user.email,
-        'role': user.role,
-        'created_at': user.created_at.isoformat() if user.created_at else None,
-        'updated_at': user.updated_at.isoformat() if user.updated_at else None,
-    }
-
-
 @users_bp.route('', methods=['GET'])
 @require_auth
-@require_roles('admin')
+@require_permission('users.manage')
 def list_users(user):
-    users = User.query.all()
-    return jsonify([_serialize_user(u) for u in users])
+    return cached_json(
+        'users',
+        f'list:{user.role}',
+        lambda: USER.all(USER.select()),
+    )
 
 
 @users_bp.route('/<int:user_id>', methods=['GET'])
 @require_auth
-@require_roles('admin')
+@require_permission('users.manage')
 def get_user(user, user_id):
     target_user = User.query.get(user_id)
     if not target_user:
         return jsonify({'message': 'User not found'}), 404
-    return jsonify(_serialize_user(target_user))
+    return jsonify(USER.one(target_user))
 
 
 @users_bp.route('', methods=['POST'])
 @require_auth
-@require_roles('admin')
+@require_permission('users.manage')
 def create_user(user):
     data = request.get_json()
     if not data or not data.get('email') or not data.get('password'):
@@ -48,7 +43,7 @@ def create_user(user):
         return jsonify({'message': 'User already exists'}), 409
 
     role = data.get('role', 'csr')
-    if role not in ['admin', 'csr', 'building_executive', 'technician']:
+    if role not in ROLES:
         return jsonify({'message': 'Invalid role'}), 400
 
     new_user = User(
@@ -59,13 +54,14 @@ def create_user(user):
     new_user.set_password(data['password'])
     db.session.add(new_user)
     db.session.commit()
+    cache.invalidate('users')
 
-    return jsonify(_serialize_user(new_user)), 201
+    return jsonify(USER.one(new_user)), 201
 
 
 @users_bp.route('/<int:user_id>', methods=['PUT'])
 @require_auth
-@require_roles('admin')
+@require_permission('users.manage')
 def update_user(user, user_id):
     target_user = User.query.get(user_id)
     if not target_user:
@@ -80,34 +76,92 @@ def update_user(user, user_id):
             return jsonify({'message': 'Email already exists'}), 409
         target_user.email = data['email']
     if 'role' in data:
-        if data['role'] not in ['admin', 'csr', 'building_executive', 'technician']:
+        if data['role'] not in ROLES:
             return jsonify({'message': 'Invalid role'}), 400
-        target_user.role = data['role']
+        if data['role'] != target_user.role:
+            target_user.role = data['role']
+            revoke_user_tokens(target_user)
     if 'password' in data:
         target_user.set_password(data['password'])
+        revoke_user_tokens(target_user)
 
     db.session.commit()
-    return jsonify(_serialize_user(target_user))
+    cache.invalidate('users')
+    return jsonify(USER.one(target_user))
 
 
 @users_bp.route('/<int:user_id>', methods=['DELETE'])
 @require_auth
-@require_roles('admin')
+@require_permission('users.manage')
 def delete_user(user, user_id):
     target_user = User.query.get(user_id)
     if not target_user:
         return jsonify({'message': 'User not found'}), 404
 
+    revoke_user_tokens(target_user)
     db.session.delete(target_user)
     db.session.commit()
+    cache.invalidate('users')
     return jsonify({'message': 'User deleted'})
 
 
 @users_bp.route('/technicians', methods=['GET'])
 @require_auth
+@require_permission('users.technicians')
 def list_technicians(user):
-    if user.role not in ['admin', 'building_executive']:
-        return jsonify({'message': 'Forbidden'}), 403
-    
-    technicians = User.query.filter_by(role='technician').all()
-    return jsonify([_serialize_user(t) for t in technicians])
+    return cached_json(
+        'users',
+        f'technicians:{user.role}',
+        lambda: USER.all(USER.select().where(User.role == 'technician')),
+    )
+
+
+@users_bp.route('/technicians/workload', methods=['GET'])
+@require_auth
+@require_permission('users.technicians')
+def technician_workload(user):
+    rows = (
+        db.session.query(User.id, User.name, User.email, TechnicianWorkload)
+        .outerjoin(TechnicianWorkload, TechnicianWorkload.technician_id == User.id)
+        .filter(User.role == 'technician')
+        .order_by(User.id)
+        .all()
+    )
+
+    now = datetime.datetime.utcnow()
+    technicians = {}
+    for tech_id, name, email, workload in rows:
+        entry = technicians.setdefault(tech_id, {
+            'id': tech_id,
+            'name': name,
+            'email': email,
+            'open': 0,
+            'ongoing': 0,
+            'done': 0,
+            'by_priority': {
+                priority: {'open': 0, 'ongoing': 0, 'done': 0}
+                for priority in ['low', 'medium', 'high']
+            },
+            'oldest_open_at': None,
+        })
+        if not workload:
+            continue
+        counts = entry['by_priority'][workload.priority]
+        counts['open'] = workload.open_count
+        counts['ongoing'] = workload.ongoing_count
+        counts['done'] = workload.done_count
+        entry['open'] += workload.open_count
+        entry['ongoing'] += workload.ongoing_count
+        entry['done'] += workload.done_count
+        if workload.oldest_open_at and (
+            entry['oldest_open_at'] is None or workload.oldest_open_at < entry['oldest_open_at']
+        ):
+            entry['oldest_open_at'] = workload.oldest_open_at
+
+    results = []
+    for entry in technicians.values():
+        oldest = entry['oldest_open_at']
+        entry['oldest_open_age_hours'] = round((now - oldest).total_seconds() / 3600, 1) if oldest else None
+        entry['oldest_open_at'] = oldest.isoformat() if oldest else None
+        results.append(entry)
+    return jsonify(results)
@@ -1,9 +1,90 @@
+import collections
 import functools
 from flask import request, jsonify, current_app
 import jwt
+from sqlalchemy import event
+from extensions import db, cache
 from models import User
 
 
+TOKEN_VERSION_CACHE_SECONDS = 30
+
+# Minimal identity carried by access tokens; handlers only need id and role.
+AuthenticatedUser = collections.namedtuple('AuthenticatedUser', ['id', 'role'])
+
+
+def parse_signing_keys(value):
+    """Parse ``kid:secret,kid:secret`` into an ordered dict."""
+    keys = collections.OrderedDict()
+    for item in (value or '').split(','):
+        if ':' not in item:
+            continue
+        kid, secret = item.split(':', 1)
+        if kid.strip() and secret.strip():
+            keys[kid.strip()] = secret.strip()
+    return keys
+
+
+def _signing_keys():
+    return current_app.config.get('JWT_SIGNING_KEYS') or {'default': current_app.config['SECRET_KEY']}
+
+
+def encode_token(payload):
+    keys = _signing_keys()
+    kid = current_app.config.get('JWT_ACTIVE_KID') or next(iter(keys))
+    token = jwt.encode(payload, keys[kid], algorithm='HS256', headers={'kid': kid})
+    if isinstance(token, bytes):
+        token = token.decode('utf-8')
+    return token
+
+
+def decode_token(token):
+    kid = jwt.get_unverified_header(token).get('kid')
+    if kid is None:
+        # Tokens issued before key rotation was introduced.
+        secret = current_app.config['SECRET_KEY']
+    else:
+        secret = _signing_keys()[kid]
+    return jwt.decode(token, secret, algorithms=['HS256'])
+
+
+def _cached_token_version(user_id):
+    version = cache.get_or_set(
+        'token_versions',
+        user_id,
+        lambda: db.session.query(User.token_version).filter(User.id == user_id).scalar(),
+        ttl=TOKEN_VERSION_CACHE_SECONDS,
+    )
+    return None if version is None else int(version)
+
+
+def revoke_user_tokens(user):
+    """Invalidate every access token issued to ``user``; the caller commits.
+
+    The cached version is only replaced once that commit succeeds, so a
+    failed commit cannot leave the cache ahead of the database.
+    """
+    user.token_version = (user.token_version or 0) + 1
+    db.session.info.setdefault('revoked_token_versions', {})[user.id] = user.token_version
+
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_token_versions(session):
+    for user_id, version in session.info.pop('revoked_token_versions', {}).items():
+        cache.set('token_versions', user_id, version, ttl=TOKEN_VERSION_CACHE_SECONDS)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_token_versions(session):
+    session.info.pop('revoked_token_versions', None)
+
+
+def cached_json(namespace, key, build, ttl=None):
+    """Return a JSON response for ``build()``, serialized once and cached."""
+    body = cache.get_or_set(namespace, key, lambda: current_app.json.dumps(build()), ttl=ttl)
+    return current_app.response_class(body, mimetype=current_app.json.mimetype)
+
+
 def _get_token():
     auth_header = request.headers.get('Authorization', '')
     if auth_header.startswith('Bearer '):
@@ -11,14 +92,29 @@ def _get_token():
     return None
 
 
+def current_token_user_id():
+    """User id claimed by the request's access token, without any DB access."""
+    token = _get_token()
+    if not token:
+        return None
+    try:
+        return decode_token(token).get('user_id')
+    except Exception:
+        return None
+
+
 def get_current_user():
     token = _get_token()
     if not token:
         return None
     try:
-        payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-        user = User.query.get(payload.get('user_id'))
-        return user
+        payload = decode_token(token)
+        user_id = payload.get('user_id')
+        if 'role' not in payload or 'ver' not in payload:
+            return User.query.get(user_id)
+        if _cached_token_version(user_id) != payload['ver']:
+            return None
+        return AuthenticatedUser(user_id, payload['role'])
     except Exception:
         return None
 
@@ -31,22 +127,3 @@ def require_auth(fn):
             return jsonify({'message': 'Unauthorized'}), 401
         return fn(user, *args, **kwargs)
     return wrapper
-
-
-def require_roles(*roles):
-    def decorator(fn):
-        @functools.wraps(fn)
-        def wrapper(user, *args, **kwargs):
-            if user.role not in roles:
-                return jsonify({'message': 'Forbidden'}), 403
-            return fn(user, *args, **kwargs)
-        return wrapper
-    return decorator
-
-
-def user_has_building_access(user, building_id):
-    if user.role == 'admin':
-        return True
-    if user.role == 'technician':
-        return True
-    return False
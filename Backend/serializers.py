@@ -0,0 +1,86 @@
+"""Shared JSON serializers for the API models.
+
+Each ``Serializer`` is compiled once at import into two plain functions:
+one turning a row tuple from ``select(*serializer.columns)`` into a dict,
+and one doing the same from an ORM instance. List endpoints use the row
+path, which skips the identity map and attribute instrumentation
+entirely; single-object endpoints that already hold an instance use
+``one()``.
+
+    rows = DEFECT.all(DEFECT.select().where(Defect.building_id == 1))
+"""
+from sqlalchemy import DateTime, select
+from extensions import db
+from models import ArchivedDefect, ArchivedDefectComment, Building, Defect, DefectComment, SlaBreach, User
+
+
+class Serializer:
+    def __init__(self, model, fields, constants=None):
+        """``fields`` is a sequence of ``(key, column_name)`` pairs, or plain
+        column names when the key is the same. ``constants`` are added to
+        every serialized dict.
+        """
+        self.model = model
+        pairs = [(field, field) if isinstance(field, str) else field for field in fields]
+        self.keys = tuple(key for key, _ in pairs)
+        self.columns = tuple(model.__table__.c[name] for _, name in pairs)
+        self.constants = dict(constants or {})
+        self._from_row = self._compile('row', [f'row[{index}]' for index in range(len(pairs))])
+        self._from_object = self._compile('obj', [f'obj.{name}' for _, name in pairs])
+
+    def _compile(self, argument, accessors):
+        items = []
+        for key, column, accessor in zip(self.keys, self.columns, accessors):
+            if isinstance(column.type, DateTime):
+                # Bind to a local first so object attributes are read once.
+                value = f'(_v.isoformat() if (_v := {accessor}) is not None else None)'
+            else:
+                value = accessor
+            items.append(f'{key!r}: {value}')
+        items.extend(f'{key!r}: _constants[{key!r}]' for key in self.constants)
+        source = f'def serialize({argument}):\n    return {{{", ".join(items)}}}\n'
+        namespace = {'_constants': self.constants}
+        exec(compile(source, f'<serializer {self.model.__name__}>', 'exec'), namespace)
+        return namespace['serialize']
+
+    def select(self):
+        return select(*self.columns)
+
+    def all(self, statement):
+        """Execute ``statement`` (built from ``select()``) and serialize every row."""
+        serialize = self._from_row
+        return [serialize(row) for row in db.session.execute(statement)]
+
+    def row(self, row):
+        """Serialize one row whose leading columns are ``self.columns``."""
+        return self._from_row(row)
+
+    def one(self, obj):
+        return self._from_object(obj)
+
+
+_DEFECT_FIELDS = (
+    'id', 'title', 'description', 'status', 'priority', 'image_url', 'initial_report_image',
+    'technician_report_image', 'building_id', 'reporter_id', ('reviewed_by', 'reviewed_by_id'),
+    'assigned_technician_id', 'external_contractor', 'contractor_name', 'done_at', 'completed_at',
+    'version', 'created_at', 'updated_at',
+)
+
+_COMMENT_FIELDS = (
+    'id', 'defect_id', 'initial_report', 'executive_decision', 'technician_report',
+    'verification_report', 'final_completion', 'version', 'created_at', 'updated_at',
+)
+
+USER = Serializer(User, ('id', 'name', 'email', 'role', 'created_at', 'updated_at'))
+BUILDING = Serializer(Building, ('id', 'name', 'address', 'latitude', 'longitude', 'created_at', 'updated_at'))
+DEFECT = Serializer(Defect, _DEFECT_FIELDS)
+ARCHIVED_DEFECT = Serializer(ArchivedDefect, _DEFECT_FIELDS + ('archived_at',), constants={'archived': True})
+DEFECT_COMMENT = Serializer(DefectComment, _COMMENT_FIELDS)
+ARCHIVED_DEFECT_COMMENT = Serializer(ArchivedDefectComment, _COMMENT_FIELDS)
+# The full export also carries the soft-delete columns.
+DEFECT_EXPORT = Serializer(Defect, _DEFECT_FIELDS + ('deleted_at', 'deleted_by_id'))
+ARCHIVED_DEFECT_EXPORT = Serializer(ArchivedDefect, _DEFECT_FIELDS + ('deleted_at', 'deleted_by_id', 'archived_at'))
+ARCHIVED_DEFECT_COMMENT_EXPORT = Serializer(ArchivedDefectComment, _COMMENT_FIELDS + ('archived_at',))
+SLA_BREACH = Serializer(SlaBreach, (
+    'id', 'defect_id', 'rule', 'building_id', 'priority', 'status', 'sla_hours', 'defect_created_at', 'detected_at',
+))
@@ -0,0 +1,123 @@
+"""SLA breach detection.
+
+A defect breaches a rule when it is still in one of the rule's statuses
+``SLA_RULES[rule]['hours'][priority]`` hours after it was reported: not
+reviewed in time (``review``) or not assigned in time (``assign``).
+
+The scan is incremental. For each (rule, priority) ``sla_watermarks``
+remembers the ``created_at`` up to which defects have been checked, so a
+run only looks at defects that crossed their deadline since the last
+one: an ``(status, priority, created_at)`` index range scan, followed by
+one INSERT ... SELECT into ``sla_breaches``. Running it every minute
+costs a handful of index probes however many defects exist.
+
+A defect is judged once, when its deadline passes. One that was handled
+in time is never revisited, and a reopened defect is not flagged again
+(the SLA runs from when it was reported). Changing the hours does not
+recheck defects already judged: shorter hours move the cutoff past the
+watermark, so the next scan covers the gap, and longer hours pause the
+scan until the cutoff catches up. Only ``flask scan-sla-breaches
+--rescan``, which clears the watermarks, checks every defect again;
+breaches already recorded are kept.
+"""
+import datetime
+from sqlalchemy import delete, exists, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from jobs import enqueue, job_handler
+from models import Defect, SlaBreach, SlaWatermark
+
+
+SLA_RULES = {
+    'review': {'statuses': ('Open',), 'hours': {'high': 4, 'medium': 24, 'low': 72}},
+    'assign': {'statuses': ('Open', 'Reviewed'), 'hours': {'high': 8, 'medium': 48, 'low': 120}},
+}
+
+
+def _scan_rule(rule, priority, hours, now):
+    statuses = SLA_RULES[rule]['statuses']
+    cutoff = now - datetime.timedelta(hours=hours)
+    watermark = db.session.get(SlaWatermark, (rule, priority))
+    since = watermark.scanned_until if watermark else None
+    if since is not None and since >= cutoff:
+        return 0
+
+    defects = Defect.__table__
+    breaches = SlaBreach.__table__
+    conditions = [
+        defects.c.status.in_(statuses),
+        defects.c.priority == priority,
+        defects.c.created_at <= cutoff,
+        defects.c.deleted_at.is_(None),
+        ~exists().where(breaches.c.defect_id == defects.c.id, breaches.c.rule == rule),
+    ]
+    if since is not None:
+        conditions.append(defects.c.created_at > since)
+    found = db.session.execute(
+        insert(breaches).from_select(
+            ['defect_id', 'rule', 'building_id', 'priority', 'status', 'sla_hours', 'defect_created_at', 'detected_at'],
+            select(
+                defects.c.id,
+                literal(rule, breaches.c.rule.type),
+                defects.c.building_id,
+                defects.c.priority,
+                defects.c.status,
+                literal(hours, breaches.c.sla_hours.type),
+                defects.c.created_at,
+                literal(now, breaches.c.detected_at.type),
+            ).where(*conditions),
+        )
+    ).rowcount
+
+    # Only advance from the watermark we read, so two overlapping scans
+    # cannot both record the same window.
+    if watermark is None:
+        db.session.add(SlaWatermark(rule=rule, priority=priority, scanned_until=cutoff))
+    else:
+        moved = db.session.execute(
+            update(SlaWatermark)
+            .where(SlaWatermark.rule == rule, SlaWatermark.priority == priority, SlaWatermark.scanned_until == since)
+            .values(scanned_until=cutoff)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if moved != 1:
+            db.session.rollback()
+            return 0
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return 0
+    return found
+
+
+def scan_breaches(now=None):
+    """Record defects that crossed an SLA deadline since the last scan.
+
+    Returns the number of new breaches per rule.
+    """
+    now = now or datetime.datetime.utcnow()
+    found = {}
+    for rule, config in SLA_RULES.items():
+        found[rule] = sum(
+            _scan_rule(rule, priority, hours, now)
+            for priority, hours in config['hours'].items()
+            if hours is not None
+        )
+    return found
+
+
+def reset_watermarks():
+    db.session.execute(delete(SlaWatermark))
+    db.session.commit()
+
+
+@job_handler('scan_sla_breaches', max_concurrency=1)
+def scan_sla_breaches_job(payload, job):
+    """With ``interval_seconds`` in the payload the job queues its next run."""
+    found = scan_breaches()
+    interval = payload.get('interval_seconds')
+    if interval:
+        run_after = datetime.datetime.utcnow() + datetime.timedelta(seconds=int(interval))
+        enqueue('scan_sla_breaches', {'interval_seconds': int(interval)}, user_id=job.created_by_id, run_after=run_after)
+    return found
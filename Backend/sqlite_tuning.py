@@ -0,0 +1,86 @@
+import threading
+from sqlalchemy import event
+
+
+_WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE', 'REPLAC')
+
+
+class SQLiteTuning:
+    """Connection tuning for deployments that run on a SQLite file.
+
+    Every new connection to a SQLite engine gets:
+
+    - ``SQLITE_JOURNAL_MODE`` (default ``WAL``): readers no longer block the
+      writer or each other.
+    - ``SQLITE_SYNCHRONOUS`` (default ``NORMAL``): safe with WAL; a power
+      cut can lose the last commits but never corrupts the file.
+    - ``SQLITE_BUSY_TIMEOUT_MS`` (default 5000): how long a writer waits for
+      the lock before failing with "database is locked".
+    - ``SQLITE_MMAP_SIZE`` (default 256 MB) and ``SQLITE_CACHE_SIZE_KB``
+      (default 64 MB) for reads.
+
+    With ``SQLITE_SERIALIZE_WRITES`` (default on) writers in this process
+    also queue on a lock per engine, taken at the first INSERT, UPDATE or
+    DELETE of a transaction and released at commit or rollback, so threads
+    wait their turn instead of polling SQLite's busy handler. Processes
+    sharing the file still rely on the busy timeout.
+
+    ``SQLITE_TUNING=False`` leaves connections untouched.
+    """
+
+    def init_app(self, app, db):
+        app.config.setdefault('SQLITE_TUNING', True)
+        app.config.setdefault('SQLITE_JOURNAL_MODE', 'WAL')
+        app.config.setdefault('SQLITE_SYNCHRONOUS', 'NORMAL')
+        app.config.setdefault('SQLITE_BUSY_TIMEOUT_MS', 5000)
+        app.config.setdefault('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+        app.config.setdefault('SQLITE_CACHE_SIZE_KB', 64 * 1024)
+        app.config.setdefault('SQLITE_SERIALIZE_WRITES', True)
+        if not app.config['SQLITE_TUNING']:
+            return
+
+        pragmas = [
+            f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}",
+            f"PRAGMA synchronous={app.config['SQLITE_SYNCHRONOUS']}",
+            f"PRAGMA busy_timeout={int(app.config['SQLITE_BUSY_TIMEOUT_MS'])}",
+            f"PRAGMA mmap_size={int(app.config['SQLITE_MMAP_SIZE'])}",
+            # Negative values are in KiB rather than pages.
+            f"PRAGMA cache_size={-int(app.config['SQLITE_CACHE_SIZE_KB'])}",
+        ]
+        lock_timeout = app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000
+        with app.app_context():
+            for engine in db.engines.values():
+                if engine.dialect.name != 'sqlite':
+                    continue
+                self._apply_pragmas(engine, pragmas)
+                if app.config['SQLITE_SERIALIZE_WRITES']:
+                    self._serialize_writes(engine, lock_timeout)
+
+    def _apply_pragmas(self, engine, pragmas):
+        @event.listens_for(engine, 'connect')
+        def _on_connect(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
+    def _serialize_writes(self, engine, timeout):
+        lock = threading.Lock()
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def _before_write(conn, cursor, statement, parameters, context, executemany):
+            if conn.info.get('sqlite_writer') or not statement.lstrip()[:6].upper().startswith(_WRITE_PREFIXES):
+                return
+            # On timeout carry on without the lock; SQLite's busy handler
+            # still guards the file, so a stuck holder cannot hang us.
+            conn.info['sqlite_writer'] = lock.acquire(timeout=timeout)
+
+        def _release(info):
+            if info.pop('sqlite_writer', False):
+                lock.release()
+
+        event.listen(engine, 'commit', lambda conn: _release(conn.info))
+        event.listen(engine, 'rollback', lambda conn: _release(conn.info))
+        # A connection returned to the pool mid-transaction is rolled back
+        # without a Connection-level event.
+        event.listen(engine.pool, 'checkin', lambda dbapi_connection, record: _release(record.info))
@@ -0,0 +1,115 @@
+"""Fixtures shared by the test suite.
+
+Each test gets its own app and SQLite file, created from the models with
+rate limits off, the local cache and no replicas. Tests that touch the
+database directly do so inside ``with app.app_context():`` so requests
+made through ``client`` keep their own sessions.
+"""
+import base64
+import os
+import bcrypt
+import pytest
+
+# asgi.py builds an app from the environment when it is imported.
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('SECRET_KEY', 'test-secret-key-long-enough-for-hs256')
+
+from app import create_app
+from extensions import db
+from models import Building, User
+
+
+PASSWORD = 'password'
+# Hashed once at the lowest cost so logins in tests stay fast.
+PASSWORD_HASH = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds=4)).decode('utf-8')
+USERS = (
+    ('admin', 'admin'),
+    ('csr', 'csr'),
+    ('executive', 'building_executive'),
+    ('technician', 'technician'),
+    ('technician2', 'technician'),
+)
+
+
+@pytest.fixture
+def app_config(tmp_path):
+    """Overrides passed to ``create_app``; tests may add to it before using ``app``."""
+    return {
+        'SECRET_KEY': 'test-secret-key-long-enough-for-hs256',
+        'JWT_SIGNING_KEYS': {},
+        'JWT_ACTIVE_KID': None,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'SQLALCHEMY_REPLICA_URIS': [],
+        'CACHE_BACKEND': 'local',
+        'PROFILE_SAMPLE_RATE': 0,
+        'RATE_LIMIT_ENABLED': False,
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'TESTING': True,
+    }
+
+
+@pytest.fixture
+def app(app_config):
+    app = create_app(app_config)
+    with app.app_context():
+        db.create_all()
+        for name, role in USERS:
+            db.session.add(User(name=name, email=f'{name}@example.com', role=role, password_hash=PASSWORD_HASH))
+        db.session.add_all([
+            Building(name='Block A', address='1 Main St', latitude=1.3, longitude=103.8),
+            Building(name='Block B', address='2 Main St'),
+        ])
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def ids(app):
+    """``{user name: id}`` for the seeded users, plus ``building`` and ``building2``."""
+    with app.app_context():
+        found = {user.name: user.id for user in User.query}
+        buildings = [building.id for building in Building.query.order_by(Building.id)]
+    found['building'], found['building2'] = buildings
+    return found
+
+
+def login(client, name):
+    credentials = base64.b64encode(f'{name}@example.com:{PASSWORD}'.encode()).decode()
+    response = client.post('/api/auth/login', headers={'Authorization': f'Basic {credentials}'})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return {'Authorization': f"Bearer {response.json['token']}"}
+
+
+@pytest.fixture
+def auth(client):
+    """``auth('executive')`` returns Authorization headers for that seeded user."""
+    tokens = {}
+
+    def headers(name):
+        if name not in tokens:
+            tokens[name] = login(client, name)
+        return dict(tokens[name])
+    return headers
+
+
+def create_defect(client, headers, building_id, **fields):
+    body = {
+        'title': 'Water leak in lobby',
+        'description': 'Ceiling drips near the lift',
+        'priority': 'medium',
+        'building_id': building_id,
+        'initial_report': 'Reported by tenant',
+    }
+    body.update(fields)
+    response = client.post('/api/defects', headers=headers, json=body)
+    assert response.status_code == 201, response.get_data(as_text=True)
+    return response.json
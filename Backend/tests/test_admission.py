@@ -0,0 +1,96 @@
+import contextvars
+import pytest
+import admission
+from admission import LocalLimiter, RedisLimiter
+from app import create_app
+from conftest import login
+
+
+@pytest.fixture
+def limits(app_config):
+    app_config.update(
+        RATE_LIMIT_ENABLED=True,
+        RATE_LIMITS={'read': (100, 60), 'write': (2, 60), 'auth': (3, 60), 'export': (100, 60)},
+        CONCURRENCY_LIMITS={'export': 1},
+        CONCURRENCY_RETRY_AFTER=7,
+    )
+    return app_config
+
+
+def _create_building(client, headers, name):
+    return client.post('/api/buildings', headers=headers, json={'name': name, 'address': '3 Main St'})
+
+
+def test_writes_past_the_limit_get_429(limits, client, auth):
+    admin = auth('admin')
+    assert _create_building(client, admin, 'C').status_code == 201
+    assert _create_building(client, admin, 'D').status_code == 201
+    response = _create_building(client, admin, 'E')
+    assert response.status_code == 429
+    # One token refills every 30 seconds.
+    assert 29 <= int(response.headers['Retry-After']) <= 30
+    # Reads have their own bucket, and other users their own.
+    assert client.get('/api/buildings', headers=admin).status_code == 200
+    assert client.post('/api/defects', headers=auth('csr'), json={}).status_code == 400
+
+
+def test_logins_are_limited_per_address(limits, client):
+    for name in ('admin', 'csr', 'executive'):
+        login(client, name)
+    response = client.post('/api/auth/login', headers={'Authorization': 'Basic eDp5'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+
+
+def test_streamed_export_holds_its_concurrency_slot(limits, client, auth):
+    admin = auth('admin')
+    # The held stream gets its own context, like a request on another worker thread.
+    held = contextvars.copy_context()
+    first = held.run(client.get, '/api/analytics/export/defects', headers=admin, buffered=False)
+    assert first.status_code == 200
+
+    shed = client.get('/api/analytics/export/buildings', headers=admin)
+    assert shed.status_code == 503
+    assert shed.headers['Retry-After'] == '7'
+
+    held.run(first.get_data)
+    held.run(first.close)
+    assert client.get('/api/analytics/export/buildings', headers=admin).status_code == 200
+
+
+def test_local_limiter_refills_evenly(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(admission.time, 'monotonic', lambda: clock[0])
+    limiter = LocalLimiter()
+    assert limiter.hit('key', 2, 60) == 0
+    assert limiter.hit('key', 2, 60) == 0
+    assert limiter.hit('key', 2, 60) == pytest.approx(30)
+    clock[0] += 30
+    assert limiter.hit('key', 2, 60) == 0
+    assert limiter.hit('other', 2, 60) == 0
+
+
+def test_local_limiter_concurrency():
+    limiter = LocalLimiter()
+    slot = limiter.acquire('exports', 1)
+    assert slot is not None
+    assert limiter.acquire('exports', 1) is None
+    limiter.release('exports', slot)
+    assert limiter.acquire('exports', 1) is not None
+
+
+
+def test_limits_default_to_the_cache_redis(limits):
+    pytest.importorskip('redis')
+    # Building the app does not connect to Redis.
+    app = create_app(dict(limits, CACHE_BACKEND='redis', CACHE_REDIS_URL='redis://localhost:6379/0'))
+    assert app.config['RATE_LIMIT_BACKEND'] == 'redis'
+    assert isinstance(app.extensions['admission'].limiter, RedisLimiter)
+
+
+def test_limits_stay_local_without_a_redis_server(limits):
+    assert create_app(limits).config['RATE_LIMIT_BACKEND'] == 'local'
+    memory = dict(limits, CACHE_BACKEND='redis', CACHE_REDIS_URL='memory://')
+    assert create_app(memory).config['RATE_LIMIT_BACKEND'] == 'local'
+    with pytest.raises(RuntimeError):
+        create_app(dict(memory, RATE_LIMIT_BACKEND='redis'))
@@ -0,0 +1,81 @@
+import asyncio
+import csv
+import io
+import threading
+from concurrent.futures import Executor, Future
+import pytest
+from asgi import WSGIBridge
+from conftest import create_defect
+
+
+class NewThreadPerCall(Executor):
+    """Runs every call on a fresh thread, the worst case for a shared pool."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+
+        def target():
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as error:
+                future.set_exception(error)
+        threading.Thread(target=target).start()
+        return future
+
+
+def asgi_get(app, path, headers, query_string=b''):
+    """GET ``path`` through the ASGI bridge. Returns ``(status, headers, body)``."""
+    bridge = WSGIBridge(app, threads=1)
+    bridge.executor = NewThreadPerCall()
+    scope = {
+        'type': 'http',
+        'method': 'GET',
+        'path': path,
+        'query_string': query_string,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers.items()],
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 50000),
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(bridge(scope, receive, send))
+    start = messages[0]
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    assert messages[-1] == {'type': 'http.response.body', 'body': b'', 'more_body': False}
+    return start['status'], dict(start['headers']), body
+
+
+def test_streamed_csv_export_through_bridge(app, client, auth, ids):
+    for index in range(3):
+        create_defect(client, auth('csr'), ids['building'], title=f'Defect {index}')
+
+    status, headers, body = asgi_get(app, '/api/analytics/export/defects', auth('admin'), b'format=csv')
+    assert status == 200
+    assert headers[b'content-type'].startswith(b'text/csv')
+    rows = list(csv.DictReader(io.StringIO(body.decode('utf-8'))))
+    assert [row['title'] for row in rows] == ['Defect 0', 'Defect 1', 'Defect 2']
+
+
+def test_streamed_ndjson_snapshot_through_bridge(app, client, auth, ids):
+    create_defect(client, auth('csr'), ids['building'])
+
+    status, _, body = asgi_get(app, '/api/analytics/export', auth('admin'), b'format=ndjson')
+    assert status == 200
+    lines = body.decode('utf-8').splitlines()
+    assert any('Water leak in lobby' in line for line in lines)
+
+
+def test_parquet_export_through_bridge(app, auth, tmp_path):
+    pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+    status, headers, body = asgi_get(app, '/api/analytics/export/buildings', auth('admin'), b'format=parquet')
+    assert status == 200
+    assert headers[b'content-type'] == b'application/vnd.apache.parquet'
+    path = tmp_path / 'buildings.parquet'
+    path.write_bytes(body)
+    assert pyarrow_parquet.read_table(path).column('latitude').to_pylist() == [1.3, None]
@@ -0,0 +1,34 @@
+from extensions import db
+from models import User
+from routes.utils import revoke_user_tokens
+
+
+def test_access_token_carries_role(client, auth):
+    response = client.get('/api/users', headers=auth('admin'))
+    assert response.status_code == 200
+    assert client.get('/api/users', headers=auth('csr')).status_code == 403
+
+
+def test_role_change_revokes_tokens(client, auth, ids):
+    technician = auth('technician')
+    assert client.get('/api/defects', headers=technician).status_code == 200
+    response = client.put(f"/api/users/{ids['technician']}", headers=auth('admin'), json={'role': 'csr'})
+    assert response.status_code == 200
+    assert client.get('/api/defects', headers=technician).status_code == 401
+
+
+def test_revocation_is_not_cached_when_commit_fails(app, client, auth, ids):
+    technician = auth('technician')
+    assert client.get('/api/defects', headers=technician).status_code == 200
+    with app.test_request_context():
+        user = db.session.get(User, ids['technician'])
+        revoke_user_tokens(user)
+        db.session.rollback()
+    # The database never stored the new version, so the token still works.
+    assert client.get('/api/defects', headers=technician).status_code == 200
+
+    with app.test_request_context():
+        user = db.session.get(User, ids['technician'])
+        revoke_user_tokens(user)
+        db.session.commit()
+    assert client.get('/api/defects', headers=technician).status_code == 401
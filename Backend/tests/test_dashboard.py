@@ -0,0 +1,24 @@
+from conftest import create_defect
+
+
+def test_dashboard_counts(client, auth, ids):
+    create_defect(client, auth('csr'), ids['building'], priority='high')
+    create_defect(client, auth('csr'), ids['building'])
+    create_defect(client, auth('csr'), ids['building2'], priority='low')
+
+    response = client.get('/api/dashboard?recent=0', headers=auth('admin'))
+    assert response.status_code == 200
+    counts = response.json['counts']
+    assert counts['total'] == 3
+    assert counts['by_status'] == {'Open': 3, 'Reviewed': 0, 'Ongoing': 0, 'Done': 0, 'Completed': 0}
+    assert counts['by_priority'] == {'low': 1, 'medium': 1, 'high': 1}
+    assert counts['created_this_month'] == 3
+    assert response.json['recent_defects'] == []
+    assert [row['defect_count'] for row in response.json['defects_per_building']] == [2, 1]
+
+
+def test_dashboard_counts_only_visible_defects(client, auth, ids):
+    create_defect(client, auth('csr'), ids['building'])
+    response = client.get('/api/dashboard', headers=auth('technician'))
+    assert response.json['counts']['total'] == 0
+    assert response.json['counts']['by_priority'] == {'low': 0, 'medium': 0, 'high': 0}
@@ -0,0 +1,50 @@
+import datetime
+from conftest import create_defect
+from duplicates import MAX_CANDIDATES, find_duplicates, jaccard, shingles
+from extensions import db
+from models import Defect
+
+TITLE = 'Water leaking from ceiling in lobby'
+DESCRIPTION = 'Water drips from the ceiling next to the lift on the ground floor'
+
+
+def test_create_flags_similar_defect(client, auth, ids):
+    first = create_defect(client, auth('csr'), ids['building'], title=TITLE, description=DESCRIPTION)
+    second = create_defect(client, auth('csr'), ids['building'], title=TITLE + '!', description=DESCRIPTION)
+    assert [match['id'] for match in second['possible_duplicates']] == [first['id']]
+
+    other_building = create_defect(client, auth('csr'), ids['building2'], title=TITLE, description=DESCRIPTION)
+    assert other_building['possible_duplicates'] == []
+    unrelated = create_defect(client, auth('csr'), ids['building'], title='Broken window', description='Cracked pane in unit 4')
+    assert unrelated['possible_duplicates'] == []
+
+
+def test_stale_candidates_do_not_hide_live_duplicates(app, ids):
+    with app.app_context():
+        now = datetime.datetime.utcnow()
+        # Exact copies share every band, so they outrank the live defect.
+        for index in range(MAX_CANDIDATES + 10):
+            db.session.add(Defect(
+                title=TITLE, description=DESCRIPTION, priority='low', building_id=ids['building'],
+                reporter_id=ids['csr'], status='Completed' if index % 2 else 'Open',
+                deleted_at=None if index % 2 else now,
+            ))
+        live_description = DESCRIPTION.replace('ground floor', 'first floor')
+        live = Defect(
+            title=TITLE, description=live_description, priority='low',
+            building_id=ids['building'], reporter_id=ids['csr'],
+        )
+        db.session.add(live)
+        db.session.commit()
+        assert jaccard(shingles(TITLE, DESCRIPTION), shingles(TITLE, live_description)) >= 0.5
+
+        matches = find_duplicates(ids['building'], TITLE, DESCRIPTION)
+        assert [match['id'] for match in matches] == [live.id]
+
+
+def test_duplicates_endpoint_excludes_the_defect_itself(client, auth, ids):
+    first = create_defect(client, auth('csr'), ids['building'], title=TITLE, description=DESCRIPTION)
+    second = create_defect(client, auth('csr'), ids['building'], title=TITLE, description=DESCRIPTION)
+    response = client.get(f"/api/defects/{first['id']}/duplicates", headers=auth('executive'))
+    assert response.status_code == 200
+    assert [match['id'] for match in response.json] == [second['id']]
@@ -0,0 +1,95 @@
+import csv
+import io
+import json
+import pytest
+from app import create_app
+from archive import archive_defects
+from conftest import create_defect
+from extensions import cache, db
+from models import ArchivedDefect, ArchivedDefectComment, Defect
+import restore
+
+
+def _archive_one(app, client, auth, ids):
+    kept = create_defect(client, auth('csr'), ids['building'], title='Kept')
+    gone = create_defect(client, auth('csr'), ids['building'], title='Archived')
+    assert client.delete(f"/api/defects/{gone['id']}", headers=auth('admin')).status_code == 200
+    with app.app_context():
+        assert archive_defects() == 1
+    return kept, gone
+
+
+def test_csv_export_streams_rows(client, auth, ids):
+    create_defect(client, auth('csr'), ids['building'], title='First')
+    create_defect(client, auth('csr'), ids['building'], title='Second')
+    response = client.get('/api/analytics/export/defects', headers=auth('admin'))
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [row['title'] for row in rows] == ['First', 'Second']
+    assert rows[0]['has_initial_report_image'] in ('0', 'False')
+
+
+def test_export_requires_admin(client, auth):
+    assert client.get('/api/analytics/export/defects', headers=auth('executive')).status_code == 403
+    assert client.get('/api/analytics/export/nope', headers=auth('admin')).status_code == 404
+    assert client.get('/api/analytics/export/defects?format=xml', headers=auth('admin')).status_code == 400
+
+
+def test_snapshot_includes_archive_tables(app, client, auth, ids):
+    kept, gone = _archive_one(app, client, auth, ids)
+    snapshot = client.get('/api/analytics/export', headers=auth('admin')).json
+    assert [row['id'] for row in snapshot['defects']] == [kept['id']]
+    assert [row['id'] for row in snapshot['defects_archive']] == [gone['id']]
+    assert [row['defect_id'] for row in snapshot['defect_comments_archive']] == [gone['id']]
+
+    lines = client.get('/api/analytics/export?format=ndjson', headers=auth('admin')).get_data(as_text=True).splitlines()
+    tables = [json.loads(line)['table'] for line in lines]
+    assert 'defects_archive' in tables and 'defect_comments_archive' in tables
+
+
+@pytest.mark.parametrize('snapshot_format', ['json', 'ndjson'])
+def test_restore_keeps_archived_history(app, client, auth, ids, tmp_path, app_config, snapshot_format):
+    _, gone = _archive_one(app, client, auth, ids)
+    query = '?format=ndjson' if snapshot_format == 'ndjson' else ''
+    path = tmp_path / f'export.{snapshot_format}'
+    path.write_bytes(client.get(f'/api/analytics/export{query}', headers=auth('admin')).get_data())
+
+    target = create_app(dict(app_config, SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'restored.db'}"))
+    with target.app_context():
+        db.create_all()
+        for namespace in restore.CACHED_NAMESPACES:
+            cache.set(namespace, 'stale', '[]')
+        counts = restore.restore_snapshot(str(path))
+        assert [cache.get(namespace, 'stale') for namespace in restore.CACHED_NAMESPACES] == [None] * 4
+        assert counts['defects'] == 1
+        assert counts['defects_archive'] == 1
+        assert counts['defect_comments_archive'] == 1
+        archived = db.session.get(ArchivedDefect, gone['id'])
+        assert archived.title == 'Archived' and archived.deleted_at is not None
+        assert ArchivedDefectComment.query.filter_by(defect_id=gone['id']).count() == 1
+        assert Defect.query.count() == 1
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_parquet_export_of_buildings_with_coordinates(app, client, auth, tmp_path):
+    pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+    response = client.get('/api/analytics/export/buildings?format=parquet', headers=auth('admin'))
+    assert response.status_code == 200
+    path = tmp_path / 'buildings.parquet'
+    path.write_bytes(response.data)
+    table = pyarrow_parquet.read_table(path)
+    assert str(table.schema.field('latitude').type) == 'double'
+    rows = table.to_pylist()
+    assert [(row['name'], row['latitude'], row['longitude']) for row in rows] == [
+        ('Block A', 1.3, 103.8), ('Block B', None, None),
+    ]
+
+
+def test_export_tables_command_writes_parquet(app, tmp_path):
+    pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+    result = app.test_cli_runner().invoke(args=['export-tables', '--format', 'parquet', '--output-dir', str(tmp_path)])
+    assert result.exit_code == 0, result.output
+    assert pyarrow_parquet.read_table(tmp_path / 'buildings.parquet').num_rows == 2
+    assert pyarrow_parquet.read_table(tmp_path / 'defects.parquet').num_rows == 0
@@ -0,0 +1,135 @@
+import datetime
+import pytest
+from conftest import create_defect
+from extensions import db
+from idempotency import IDEMPOTENCY_PENDING_TIMEOUT_SECONDS, _request_hash, purge_expired_keys
+from models import Defect, IdempotencyKey
+
+
+BODY = {'title': 'Leak', 'description': 'Lobby', 'priority': 'low'}
+
+
+def _with_key(headers, key):
+    return dict(headers, **{'Idempotency-Key': key})
+
+
+def _defect_count(app):
+    with app.app_context():
+        return Defect.query.count()
+
+
+def test_retry_replays_first_response(app, client, auth, ids):
+    headers = _with_key(auth('csr'), 'submit-1')
+    first = client.post('/api/defects', headers=headers, json=dict(BODY, building_id=ids['building']))
+    retry = client.post('/api/defects', headers=headers, json=dict(BODY, building_id=ids['building']))
+    assert first.status_code == retry.status_code == 201
+    assert 'Idempotent-Replayed' not in first.headers
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.json['id'] == first.json['id']
+    assert retry.headers['ETag'] == first.headers['ETag']
+    assert _defect_count(app) == 1
+
+
+def test_key_reused_for_different_request(app, client, auth, ids):
+    headers = _with_key(auth('csr'), 'submit-1')
+    create_defect(client, headers, ids['building'])
+    response = client.post('/api/defects', headers=headers, json={'title': 'Other', 'description': 'x', 'priority': 'low', 'building_id': ids['building']})
+    assert response.status_code == 422
+    assert _defect_count(app) == 1
+
+
+def test_keys_are_per_user(app, client, auth, ids):
+    create_defect(client, _with_key(auth('csr'), 'submit-1'), ids['building'])
+    response = create_defect(client, _with_key(auth('executive'), 'submit-1'), ids['building'])
+    assert response['reporter_id'] == ids['executive']
+    assert _defect_count(app) == 2
+
+
+def test_invalid_key(client, auth, ids):
+    for key in ('   ', 'k' * 256):
+        response = client.post('/api/defects', headers=_with_key(auth('csr'), key), json={})
+        assert response.status_code == 400
+
+
+def _pending_key(app, user_id, key, body, age):
+    """Claim ``key`` as if a request with ``body`` started ``age`` ago and is still running."""
+    with app.test_request_context('/api/defects', method='POST', json=body):
+        request_hash = _request_hash()
+    with app.app_context():
+        db.session.add(IdempotencyKey(
+            user_id=user_id, key=key, request_hash=request_hash,
+            created_at=datetime.datetime.utcnow() - age,
+        ))
+        db.session.commit()
+
+
+def test_retry_while_first_request_runs(app, client, auth, ids):
+    body = dict(BODY, building_id=ids['building'])
+    _pending_key(app, ids['csr'], 'submit-1', body, datetime.timedelta(seconds=1))
+    response = client.post('/api/defects', headers=_with_key(auth('csr'), 'submit-1'), json=body)
+    assert response.status_code == 409
+    assert response.headers['Retry-After'] == '1'
+    assert _defect_count(app) == 0
+
+
+def test_abandoned_claim_is_released(app, client, auth, ids):
+    body = dict(BODY, building_id=ids['building'])
+    _pending_key(app, ids['csr'], 'submit-1', body, datetime.timedelta(seconds=IDEMPOTENCY_PENDING_TIMEOUT_SECONDS + 1))
+    response = client.post('/api/defects', headers=_with_key(auth('csr'), 'submit-1'), json=body)
+    assert response.status_code == 201
+    assert _defect_count(app) == 1
+
+
+def test_failed_request_releases_key(client, auth, ids):
+    defect = create_defect(client, auth('csr'), ids['building'])
+    headers = _with_key(auth('executive'), 'complete-1')
+    url = f"/api/defects/{defect['id']}/complete"
+    assert client.patch(url, headers=headers, json={}).status_code == 409
+
+    technician = auth('technician')
+    assert client.patch(f"/api/defects/{defect['id']}/assign", headers=auth('executive'), json={'assigned_technician_id': ids['technician']}).status_code == 200
+    assert client.patch(f"/api/defects/{defect['id']}/done", headers=technician, json={}).status_code == 200
+    retry = client.patch(url, headers=headers, json={})
+    assert retry.status_code == 200
+    assert 'Idempotent-Replayed' not in retry.headers
+
+
+def test_purge_expired_keys(app, client, auth, ids):
+    create_defect(client, _with_key(auth('csr'), 'submit-1'), ids['building'])
+    with app.app_context():
+        assert purge_expired_keys() == 0
+        assert purge_expired_keys(older_than=datetime.timedelta(seconds=-1)) == 1
+
+
+def test_write_is_not_repeated_when_the_response_was_lost(app, client, auth, ids, monkeypatch):
+    import idempotency
+
+    def crash(*args):
+        raise RuntimeError('worker died')
+
+    headers = _with_key(auth('csr'), 'submit-1')
+    body = dict(BODY, building_id=ids['building'])
+    # Fail after the view has committed, before the response is stored.
+    monkeypatch.setattr(idempotency, 'make_response', crash)
+    with pytest.raises(RuntimeError):
+        client.post('/api/defects', headers=headers, json=body)
+    monkeypatch.undo()
+
+    with app.app_context():
+        record = IdempotencyKey.query.one()
+        assert record.status_code is None and record.committed_at is not None
+        # Long past the point where an uncommitted claim would be released.
+        record.created_at -= datetime.timedelta(seconds=IDEMPOTENCY_PENDING_TIMEOUT_SECONDS + 1)
+        db.session.commit()
+
+    retry = client.post('/api/defects', headers=headers, json=body)
+    assert retry.status_code == 409
+    assert 'Retry-After' not in retry.headers
+    assert _defect_count(app) == 1
+
+
+def test_completed_key_records_commit(app, client, auth, ids):
+    create_defect(client, _with_key(auth('csr'), 'submit-1'), ids['building'])
+    with app.app_context():
+        record = IdempotencyKey.query.one()
+        assert record.status_code == 201 and record.committed_at is not None
@@ -0,0 +1,46 @@
+import datetime
+from extensions import db
+from jobs import claim_next_job, enqueue, run_job
+from models import Job
+
+
+def test_claim_runs_oldest_job_first(app):
+    with app.app_context():
+        later = enqueue('purge_idempotency_keys', run_after=datetime.datetime.utcnow() - datetime.timedelta(seconds=1))
+        first = enqueue('purge_idempotency_keys', run_after=datetime.datetime.utcnow() - datetime.timedelta(seconds=5))
+        job = claim_next_job('worker-1')
+        assert job.id == first.id
+        assert job.status == 'running' and job.locked_by == 'worker-1' and job.attempts == 1
+        assert db.session.get(Job, later.id).status == 'queued'
+
+
+def test_claim_skips_future_jobs(app):
+    with app.app_context():
+        enqueue('purge_idempotency_keys', run_after=datetime.datetime.utcnow() + datetime.timedelta(hours=1))
+        assert claim_next_job('worker-1') is None
+
+
+def test_claim_respects_max_concurrency(app):
+    with app.app_context():
+        enqueue('scan_sla_breaches')
+        enqueue('scan_sla_breaches')
+        running = claim_next_job('worker-1')
+        assert running is not None
+        # scan_sla_breaches is capped at one running job.
+        assert claim_next_job('worker-2') is None
+
+        run_job(running)
+        assert db.session.get(Job, running.id).status == 'succeeded'
+        assert claim_next_job('worker-2') is not None
+
+
+def test_failed_job_is_retried_with_backoff(app):
+    with app.app_context():
+        job = enqueue('purge_idempotency_keys', max_attempts=2)
+        job.job_type = 'missing'
+        db.session.commit()
+        claimed = claim_next_job('worker-1')
+        result = run_job(claimed)
+        assert result.status == 'queued'
+        assert result.run_after > datetime.datetime.utcnow()
+        assert 'Unknown job type' in result.error
@@ -0,0 +1,35 @@
+import pytest
+import profiling
+
+
+def test_folded_profile_returns_stacks(client, auth):
+    headers = dict(auth('admin'), **{'X-Profile': 'folded'})
+    response = client.get('/api/buildings', headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert response.headers['X-Profiled-Status'] == '200'
+
+
+def test_profile_header_ignored_for_non_admins(client, auth):
+    headers = dict(auth('csr'), **{'X-Profile': 'folded'})
+    response = client.get('/api/buildings', headers=headers)
+    assert response.mimetype == 'application/json'
+
+
+@pytest.fixture
+def gevent_app(monkeypatch, app_config):
+    monkeypatch.setattr(profiling, 'threads_are_greenlets', lambda: True)
+    app_config['PROFILE_SAMPLE_RATE'] = 1
+    return app_config
+
+
+def test_sampler_disabled_under_gevent(gevent_app, app, client, auth):
+    response = client.get('/api/buildings', headers=dict(auth('admin'), **{'X-Profile': 'folded'}))
+    assert response.status_code == 501
+
+    response = client.get('/api/buildings', headers=dict(auth('admin'), **{'X-Profile': 'pstats'}))
+    assert response.status_code == 200
+    assert response.mimetype == 'application/octet-stream'
+
+    assert client.get('/api/buildings', headers=auth('admin')).status_code == 200
+    assert client.get('/api/profiling/stacks', headers=auth('admin')).json['endpoints'] == {}
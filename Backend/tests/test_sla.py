@@ -0,0 +1,98 @@
+import datetime
+from extensions import db
+from models import Defect, SlaBreach, SlaWatermark
+import sla
+
+
+NOW = datetime.datetime(2026, 3, 2, 12, 0)
+
+
+def _add_defect(app, ids, hours_ago, priority='high', status='Open'):
+    with app.app_context():
+        defect = Defect(
+            title='Leak', description='Lobby', priority=priority, status=status,
+            building_id=ids['building'], reporter_id=ids['csr'],
+            created_at=NOW - datetime.timedelta(hours=hours_ago),
+        )
+        db.session.add(defect)
+        db.session.commit()
+        return defect.id
+
+
+def _scan(app, now=NOW):
+    with app.app_context():
+        return sla.scan_breaches(now)
+
+
+def _breaches(app):
+    with app.app_context():
+        return sorted((breach.defect_id, breach.rule) for breach in SlaBreach.query)
+
+
+def test_scan_records_each_breach_once(app, ids):
+    overdue = _add_defect(app, ids, hours_ago=10)
+    review_only = _add_defect(app, ids, hours_ago=5)
+    _add_defect(app, ids, hours_ago=1)
+    _add_defect(app, ids, hours_ago=10, status='Ongoing')
+
+    assert _scan(app) == {'review': 2, 'assign': 1}
+    assert _breaches(app) == sorted([(overdue, 'review'), (overdue, 'assign'), (review_only, 'review')])
+    assert _scan(app) == {'review': 0, 'assign': 0}
+    with app.app_context():
+        assert db.session.get(SlaWatermark, ('review', 'high')).scanned_until == NOW - datetime.timedelta(hours=4)
+
+
+def test_defects_behind_the_watermark_wait_for_rescan(app, ids):
+    _scan(app)
+    # Loaded with an old created_at after the window was scanned.
+    late = _add_defect(app, ids, hours_ago=10)
+    assert _scan(app, NOW + datetime.timedelta(minutes=1)) == {'review': 0, 'assign': 0}
+
+    with app.app_context():
+        sla.reset_watermarks()
+    assert _scan(app, NOW + datetime.timedelta(minutes=1)) == {'review': 1, 'assign': 1}
+    assert [defect_id for defect_id, _ in _breaches(app)] == [late, late]
+
+
+def test_shorter_hours_scan_the_gap(app, ids, monkeypatch):
+    defect_id = _add_defect(app, ids, hours_ago=3, priority='medium')
+    assert _scan(app) == {'review': 0, 'assign': 0}
+
+    monkeypatch.setitem(sla.SLA_RULES['review']['hours'], 'medium', 2)
+    assert _scan(app) == {'review': 1, 'assign': 0}
+    assert _breaches(app) == [(defect_id, 'review')]
+
+
+def test_list_breaches(app, client, auth, ids):
+    reviewed = _add_defect(app, ids, hours_ago=10)
+    waiting = _add_defect(app, ids, hours_ago=50, priority='medium', status='Reviewed')
+    _add_defect(app, ids, hours_ago=100, priority='low')
+    _scan(app)
+    with app.app_context():
+        db.session.get(Defect, reviewed).status = 'Reviewed'
+        db.session.commit()
+
+    response = client.get('/api/sla/breaches', headers=auth('executive'))
+    assert response.status_code == 200
+    assert response.json['total'] == 4
+    assert response.json['rules']['review']['high'] == 4
+
+    # Reviewing resolves the review breach but not the assign breach.
+    response = client.get('/api/sla/breaches?unresolved=1&rule=review', headers=auth('executive'))
+    assert [item['priority'] for item in response.json['items']] == ['low']
+    response = client.get('/api/sla/breaches?unresolved=1&rule=assign', headers=auth('executive'))
+    assert sorted((item['defect_id'], item['current_status']) for item in response.json['items']) == [
+        (reviewed, 'Reviewed'), (waiting, 'Reviewed'),
+    ]
+    response = client.get('/api/sla/breaches?priority=medium', headers=auth('executive'))
+    assert [item['defect_id'] for item in response.json['items']] == [waiting]
+
+    assert client.get('/api/sla/breaches?rule=fix', headers=auth('executive')).status_code == 400
+    assert client.get('/api/sla/breaches', headers=auth('csr')).status_code == 403
+
+
+def test_cli_rescan(app, ids):
+    _add_defect(app, ids, hours_ago=1000)
+    runner = app.test_cli_runner()
+    assert '1 new review breaches' in runner.invoke(args=['scan-sla-breaches']).output
+    assert '0 new review breaches' in runner.invoke(args=['scan-sla-breaches', '--rescan']).output
@@ -0,0 +1,86 @@
+import datetime
+import pytest
+from conftest import create_defect
+from extensions import db
+from models import Defect
+
+
+STATUSES = ('Open', 'Reviewed', 'Ongoing', 'Done', 'Completed')
+# action -> role -> statuses the action may start from. Roles missing
+# from an action lack its permission.
+ALLOWED = {
+    'review': {'admin': {'Open', 'Reviewed'}, 'executive': {'Open', 'Reviewed'}},
+    'assign': {'admin': {'Open', 'Reviewed', 'Ongoing'}, 'executive': {'Open', 'Reviewed', 'Ongoing'}},
+    'ongoing': {'admin': {'Reviewed', 'Ongoing', 'Done'}, 'technician': {'Reviewed', 'Ongoing', 'Done'}},
+    'done': {'admin': {'Ongoing', 'Done'}, 'technician': {'Ongoing', 'Done'}},
+    'complete': {'admin': {'Ongoing', 'Done'}, 'executive': {'Done'}},
+    'reopen': {'admin': {'Reviewed', 'Ongoing', 'Done', 'Completed'}, 'executive': {'Done', 'Completed'}},
+}
+TARGETS = {'review': 'Reviewed', 'assign': 'Ongoing', 'ongoing': 'Ongoing', 'done': 'Done', 'complete': 'Completed', 'reopen': 'Open'}
+
+
+def _set_state(app, defect_id, status, technician_id):
+    with app.app_context():
+        defect = db.session.get(Defect, defect_id)
+        defect.status = status
+        defect.assigned_technician_id = technician_id
+        db.session.commit()
+
+
+def _body(action, ids):
+    return {'assigned_technician_id': ids['technician']} if action == 'assign' else {}
+
+
+@pytest.mark.parametrize('role', ['admin', 'csr', 'executive', 'technician'])
+def test_transition_matrix(app, client, auth, ids, role):
+    defect_id = create_defect(client, auth('csr'), ids['building'])['id']
+    mismatches = []
+    for action, roles in ALLOWED.items():
+        for status in STATUSES:
+            _set_state(app, defect_id, status, ids['technician'])
+            response = client.patch(f'/api/defects/{defect_id}/{action}', headers=auth(role), json=_body(action, ids))
+            if role not in roles:
+                expected = 403
+            elif status in roles[role]:
+                expected = 200
+            else:
+                expected = 409
+            if response.status_code != expected:
+                mismatches.append((action, status, response.status_code, expected))
+            elif expected == 200 and response.json['status'] != TARGETS[action]:
+                mismatches.append((action, status, response.json['status'], TARGETS[action]))
+            elif expected == 409:
+                assert response.json['message'] == f'Cannot {action} a defect that is {status}'
+                assert 'version' in response.json
+    assert mismatches == []
+
+
+def test_rejected_transition_leaves_defect_unchanged(app, client, auth, ids):
+    defect = create_defect(client, auth('csr'), ids['building'])
+    response = client.patch(f"/api/defects/{defect['id']}/complete", headers=auth('executive'), json={})
+    assert response.status_code == 409
+    fetched = client.get(f"/api/defects/{defect['id']}", headers=auth('executive')).json
+    assert fetched['status'] == 'Open'
+    assert fetched['version'] == defect['version']
+
+
+def test_technician_may_only_move_assigned_defects(app, client, auth, ids):
+    defect = create_defect(client, auth('csr'), ids['building'])
+    _set_state(app, defect['id'], 'Ongoing', ids['technician2'])
+    assert client.patch(f"/api/defects/{defect['id']}/done", headers=auth('technician'), json={}).status_code == 403
+    assert client.patch(f"/api/defects/{defect['id']}/done", headers=auth('technician2'), json={}).status_code == 200
+
+
+def test_missing_and_deleted_defects_are_not_found(app, client, auth, ids):
+    assert client.patch('/api/defects/999/review', headers=auth('executive'), json={}).status_code == 404
+    defect = create_defect(client, auth('csr'), ids['building'])
+    with app.app_context():
+        db.session.get(Defect, defect['id']).deleted_at = datetime.datetime.utcnow()
+        db.session.commit()
+    assert client.patch(f"/api/defects/{defect['id']}/review", headers=auth('executive'), json={}).status_code == 404
+
+
+def test_assign_requires_a_technician(client, auth, ids):
+    defect = create_defect(client, auth('csr'), ids['building'])
+    response = client.patch(f"/api/defects/{defect['id']}/assign", headers=auth('executive'), json={'assigned_technician_id': ids['csr']})
+    assert response.status_code == 400
@@ -0,0 +1,95 @@
+import datetime
+from conftest import create_defect
+from extensions import db
+from models import DefectEvent
+from trends import bucket_start, defect_trends, next_bucket
+
+
+def _event(ids, occurred_at, event='created', priority='high', building='building'):
+    db.session.add(DefectEvent(
+        defect_id=1, building_id=ids[building], priority=priority, event=event, occurred_at=occurred_at,
+    ))
+
+
+def test_bucket_boundaries():
+    # 2026-03-04 is a Wednesday.
+    day = datetime.date(2026, 3, 4)
+    assert bucket_start(day, 'week') == datetime.date(2026, 3, 2)
+    assert bucket_start(day, 'month') == datetime.date(2026, 3, 1)
+    assert bucket_start(datetime.datetime(2026, 3, 4, 23, 59), 'day') == day
+    assert next_bucket(datetime.date(2026, 1, 1), 'month') == datetime.date(2026, 2, 1)
+    assert next_bucket(datetime.date(2026, 12, 1), 'month') == datetime.date(2027, 1, 1)
+
+
+def test_weekly_buckets_group_by_building_and_priority(app, ids):
+    with app.app_context():
+        _event(ids, datetime.datetime(2026, 3, 2, 0, 0))          # Monday, first week
+        _event(ids, datetime.datetime(2026, 3, 8, 23, 59))        # Sunday, first week
+        _event(ids, datetime.datetime(2026, 3, 8, 12, 0), event='done')
+        _event(ids, datetime.datetime(2026, 3, 9, 0, 0), priority='low')  # next Monday
+        _event(ids, datetime.datetime(2026, 3, 9, 1, 0), building='building2')
+        _event(ids, datetime.datetime(2026, 3, 16, 0, 0))         # outside the range
+        db.session.commit()
+
+        buckets = defect_trends(
+            'week', datetime.date(2026, 3, 2), datetime.date(2026, 3, 16), now=datetime.datetime(2026, 6, 1),
+        )
+    assert [bucket['start'] for bucket in buckets] == ['2026-03-02', '2026-03-09']
+    assert all(bucket['closed'] for bucket in buckets)
+    first, second = buckets
+    assert first['rows'] == [
+        {'building_id': ids['building'], 'priority': 'high', 'created': 2, 'done': 1, 'completed': 0, 'reopened': 0},
+    ]
+    assert sorted((row['building_id'], row['priority'], row['created']) for row in second['rows']) == [
+        (ids['building'], 'low', 1), (ids['building2'], 'high', 1),
+    ]
+
+
+def test_closed_buckets_are_cached_and_open_bucket_recomputed(app, ids):
+    now = datetime.datetime(2026, 3, 10, 12, 0)
+    start, end = datetime.date(2026, 3, 2), datetime.date(2026, 3, 16)
+    with app.app_context():
+        _event(ids, datetime.datetime(2026, 3, 3))
+        _event(ids, datetime.datetime(2026, 3, 10))
+        db.session.commit()
+        before = defect_trends('week', start, end, now=now)
+        assert [bucket['closed'] for bucket in before] == [True, False]
+
+        # A late write into the closed week is not seen; the open week is.
+        _event(ids, datetime.datetime(2026, 3, 4))
+        _event(ids, datetime.datetime(2026, 3, 11))
+        db.session.commit()
+        after = defect_trends('week', start, end, now=now)
+    assert after[0]['rows'] == before[0]['rows']
+    assert after[0]['rows'][0]['created'] == 1
+    assert after[1]['rows'][0]['created'] == 2
+
+
+def test_workflow_records_lifecycle_events(app, client, auth, ids):
+    defect = create_defect(client, auth('csr'), ids['building'], priority='low')
+    executive, technician = auth('executive'), auth('technician')
+    client.patch(f"/api/defects/{defect['id']}/assign", headers=executive, json={'assigned_technician_id': ids['technician']})
+    client.patch(f"/api/defects/{defect['id']}/done", headers=technician, json={})
+    client.patch(f"/api/defects/{defect['id']}/complete", headers=executive, json={})
+    client.patch(f"/api/defects/{defect['id']}/reopen", headers=executive, json={})
+
+    response = client.get('/api/analytics/trends?interval=day', headers=executive)
+    assert response.status_code == 200
+    today = response.json['buckets'][-1]
+    assert today['closed'] is False
+    assert today['rows'] == [
+        {'building_id': ids['building'], 'priority': 'low', 'created': 1, 'done': 1, 'completed': 1, 'reopened': 1},
+    ]
+    filtered = client.get(f"/api/analytics/trends?interval=day&building_id={ids['building2']}", headers=executive)
+    assert filtered.json['buckets'][-1]['rows'] == []
+
+
+def test_trends_validation(client, auth):
+    headers = auth('executive')
+    assert client.get('/api/analytics/trends?interval=year', headers=headers).status_code == 400
+    assert client.get('/api/analytics/trends?start=2026-02-01&end=2026-01-01', headers=headers).status_code == 400
+    assert client.get('/api/analytics/trends?start=nope', headers=headers).status_code == 400
+    assert client.get('/api/analytics/trends?interval=day&start=2020-01-01&end=2026-01-01', headers=headers).status_code == 400
+    response = client.get('/api/analytics/trends?interval=month&start=2026-01-15&end=2026-03-01', headers=headers)
+    assert [bucket['start'] for bucket in response.json['buckets']] == ['2026-01-01', '2026-02-01', '2026-03-01']
+    assert client.get('/api/analytics/trends', headers=auth('technician')).status_code == 403
@@ -0,0 +1,73 @@
+import io
+import os
+from conftest import create_defect
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+JPEG = b'\xff\xd8\xff\xe0' + b'\x00' * 64
+
+
+def _upload(client, headers, data, filename='photo.png'):
+    return client.post(
+        '/api/uploads', headers=headers,
+        data={'file': (io.BytesIO(data), filename)}, content_type='multipart/form-data',
+    )
+
+
+def test_upload_sniffs_type_from_content(app, client, auth):
+    # The name says PNG, the bytes say JPEG; the bytes win.
+    response = _upload(client, auth('technician'), JPEG, 'photo.png')
+    assert response.status_code == 201
+    assert response.json['content_type'] == 'image/jpeg'
+    assert response.json['size'] == len(JPEG)
+    assert response.json['ref'].startswith('upload:')
+
+    served = client.get(response.json['url'])
+    assert served.status_code == 200
+    assert served.mimetype == 'image/jpeg'
+    assert served.data == JPEG
+    assert not [name for name in os.listdir(app.config['UPLOAD_FOLDER']) if name.endswith('.part')]
+
+
+def test_unsupported_type_is_rejected(app, client, auth):
+    response = _upload(client, auth('technician'), b'<svg xmlns="http://www.w3.org/2000/svg"/>', 'photo.png')
+    assert response.status_code == 415
+    assert os.listdir(app.config['UPLOAD_FOLDER']) == []
+
+
+def test_short_unsupported_file_is_rejected(client, auth):
+    assert _upload(client, auth('technician'), b'GIF8').status_code == 415
+
+
+def test_non_multipart_body_is_rejected(client, auth):
+    response = client.post('/api/uploads', headers=auth('technician'), json={'file': 'x'})
+    assert response.status_code == 415
+
+
+def test_oversized_file_is_rejected(app, client, auth):
+    app.config['UPLOAD_MAX_FILE_SIZE'] = 1024
+    response = _upload(client, auth('technician'), PNG + b'\x00' * 2048)
+    assert response.status_code == 413
+    assert os.listdir(app.config['UPLOAD_FOLDER']) == []
+
+
+def test_oversized_request_is_rejected(app, client, auth):
+    app.config['MAX_CONTENT_LENGTH'] = 512
+    response = _upload(client, auth('technician'), PNG + b'\x00' * 2048)
+    assert response.status_code == 413
+
+
+def test_missing_file_is_rejected(client, auth):
+    response = client.post('/api/uploads', headers=auth('technician'), data={'other': 'x'}, content_type='multipart/form-data')
+    assert response.status_code == 400
+
+
+def test_upload_ref_resolves_on_defect_write(client, auth, ids):
+    ref = _upload(client, auth('csr'), PNG).json
+    defect = create_defect(client, auth('csr'), ids['building'], initial_report_image=ref['ref'])
+    assert defect['initial_report_image'] == ref['url']
+
+    response = client.post('/api/defects', headers=auth('csr'), json={
+        'title': 't', 'description': 'd', 'priority': 'low', 'building_id': ids['building'],
+        'initial_report_image': 'upload:unknown',
+    })
+    assert response.status_code == 400
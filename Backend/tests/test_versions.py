@@ -0,0 +1,93 @@
+from conftest import create_defect
+
+
+def test_update_returns_etag_and_bumps_version(client, auth, ids):
+    defect = create_defect(client, auth('csr'), ids['building'])
+    headers = auth('executive')
+    headers['If-Match'] = f'"{defect["version"]}"'
+    response = client.put(f"/api/defects/{defect['id']}", headers=headers, json={'contractor_name': 'Acme'})
+    assert response.status_code == 200
+    assert response.json['version'] == defect['version'] + 1
+    assert response.headers['ETag'] == f'"{defect["version"] + 1}"'
+
+
+def test_stale_if_match_is_rejected(client, auth, ids):
+    defect = create_defect(client, auth('csr'), ids['building'])
+    headers = auth('executive')
+    assert client.put(f"/api/defects/{defect['id']}", headers=headers, json={'contractor_name': 'Acme'}).status_code == 200
+
+    headers['If-Match'] = f'W/"{defect["version"]}"'
+    response = client.put(f"/api/defects/{defect['id']}", headers=headers, json={'contractor_name': 'Other'})
+    assert response.status_code == 409
+    assert response.json['version'] == defect['version'] + 1
+
+
+def test_version_in_body_and_wildcard(client, auth, ids):
+    defect = create_defect(client, auth('csr'), ids['building'])
+    headers = auth('executive')
+    stale = client.put(f"/api/defects/{defect['id']}", headers=headers, json={'contractor_name': 'A', 'version': 99})
+    assert stale.status_code == 409
+    headers['If-Match'] = '*'
+    assert client.put(f"/api/defects/{defect['id']}", headers=headers, json={'contractor_name': 'B', 'version': 99}).status_code == 200
+
+
+def test_transition_with_stale_version_conflicts(client, auth, ids):
+    defect = create_defect(client, auth('csr'), ids['building'])
+    headers = auth('executive')
+    headers['If-Match'] = '"99"'
+    response = client.patch(f"/api/defects/{defect['id']}/review", headers=headers, json={})
+    assert response.status_code == 409
+    assert response.json['version'] == defect['version']
+
+
+def test_comment_version_conflict(client, auth, ids):
+    defect = create_defect(client, auth('csr'), ids['building'])
+    headers = auth('executive')
+    first = client.patch(f"/api/defects/{defect['id']}/comments", headers=headers, json={'executive_decision': 'Fix'})
+    assert first.status_code == 200
+    version = first.json['version']
+    stale = client.patch(
+        f"/api/defects/{defect['id']}/comments", headers=headers,
+        json={'executive_decision': 'Ignore', 'version': version - 1},
+    )
+    assert stale.status_code == 409
+    assert stale.json['version'] == version
+
+
+def test_delete_with_stale_version_conflicts(client, auth, ids):
+    defect = create_defect(client, auth('csr'), ids['building'])
+    response = client.delete(f"/api/defects/{defect['id']}", headers=auth('admin'), json={'version': defect['version'] + 5})
+    assert response.status_code == 409
+
+
+def test_body_version_may_be_a_numeric_string(client, auth, ids):
+    defect = create_defect(client, auth('csr'), ids['building'])
+    url = f"/api/defects/{defect['id']}"
+    response = client.put(url, headers=auth('executive'), json={'contractor_name': 'A', 'version': str(defect['version'])})
+    assert response.status_code == 200
+    stale = client.put(url, headers=auth('executive'), json={'contractor_name': 'B', 'version': str(defect['version'])})
+    assert stale.status_code == 409
+
+
+def test_non_integer_body_version_is_rejected(client, auth, ids):
+    defect = create_defect(client, auth('csr'), ids['building'])
+    url = f"/api/defects/{defect['id']}"
+    for version in ('one', 1.5, True, [1]):
+        response = client.put(url, headers=auth('executive'), json={'contractor_name': 'A', 'version': version})
+        assert response.status_code == 400
+    response = client.patch(f'{url}/review', headers=auth('executive'), json={'version': 'one'})
+    assert response.status_code == 400
+
+
+def test_comments_ignore_the_defect_etag(client, auth, ids):
+    defect = create_defect(client, auth('csr'), ids['building'])
+    headers = auth('executive')
+    first = client.patch(f"/api/defects/{defect['id']}/comments", headers=headers, json={'executive_decision': 'Fix'})
+    # A client following the README sends the defect's ETag on every write.
+    headers['If-Match'] = f'"{defect["version"] + 5}"'
+    response = client.patch(
+        f"/api/defects/{defect['id']}/comments", headers=headers,
+        json={'executive_decision': 'Fix soon', 'version': first.json['version']},
+    )
+    assert response.status_code == 200
+    assert response.json['executive_decision'] == 'Fix soon'
@@ -0,0 +1,72 @@
+import datetime
+from conftest import create_defect
+from extensions import db
+from models import TechnicianWorkload
+import workload
+
+
+def _workload_rows():
+    return sorted(
+        (row.technician_id, row.priority, row.open_count, row.ongoing_count, row.done_count, row.oldest_open_at)
+        for row in TechnicianWorkload.query
+    )
+
+
+def test_incremental_counts_match_rebuild(app, client, auth, ids):
+    executive = auth('executive')
+    defects = [
+        create_defect(client, auth('csr'), ids['building'], priority=priority, title=f'Defect {index}')
+        for index, priority in enumerate(['high', 'medium', 'low', 'high', 'medium'])
+    ]
+    for defect in defects:
+        response = client.patch(
+            f"/api/defects/{defect['id']}/assign", headers=executive,
+            json={'assigned_technician_id': ids['technician']},
+        )
+        assert response.status_code == 200
+    technician = auth('technician')
+    assert client.patch(f"/api/defects/{defects[0]['id']}/done", headers=technician, json={}).status_code == 200
+    assert client.patch(f"/api/defects/{defects[1]['id']}/done", headers=technician, json={}).status_code == 200
+    assert client.patch(f"/api/defects/{defects[1]['id']}/complete", headers=executive, json={}).status_code == 200
+    # Reassign one defect, change another's priority and delete a third.
+    assert client.patch(
+        f"/api/defects/{defects[2]['id']}/assign", headers=executive,
+        json={'assigned_technician_id': ids['technician2']},
+    ).status_code == 200
+    assert client.put(f"/api/defects/{defects[3]['id']}", headers=auth('csr'), json={'priority': 'low'}).status_code == 200
+    assert client.delete(f"/api/defects/{defects[4]['id']}", headers=auth('admin')).status_code == 200
+
+    with app.app_context():
+        incremental = _workload_rows()
+        with db.engine.begin() as connection:
+            workload.rebuild_workloads(connection)
+        assert incremental == _workload_rows()
+        assert incremental, 'expected workload rows'
+
+
+def test_workload_endpoint_reports_counts(client, auth, ids):
+    defect = create_defect(client, auth('csr'), ids['building'], priority='high')
+    client.patch(
+        f"/api/defects/{defect['id']}/assign", headers=auth('executive'),
+        json={'assigned_technician_id': ids['technician']},
+    )
+    response = client.get('/api/users/technicians/workload', headers=auth('executive'))
+    assert response.status_code == 200
+    entry = next(item for item in response.json if item['id'] == ids['technician'])
+    assert entry['ongoing'] == 1
+    assert entry['by_priority']['high']['ongoing'] == 1
+
+
+def test_first_assignment_upsert_is_additive(app, ids):
+    created_at = datetime.datetime(2026, 1, 1)
+    with app.app_context():
+        # Two transactions that each saw no row for this technician and
+        # priority must add up rather than collide on the primary key.
+        for _ in range(2):
+            deltas = {}
+            workload._add_delta(deltas, (ids['technician'], 'high', 'open'), 1, created_at)
+            with db.engine.begin() as connection:
+                workload.apply_deltas(connection, deltas)
+        row = db.session.get(TechnicianWorkload, (ids['technician'], 'high'))
+        assert row.open_count == 2
+        assert row.oldest_open_at == created_at
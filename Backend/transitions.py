@@ -0,0 +1,160 @@
+"""Defect workflow transitions.
+
+Each transition is one conditional UPDATE: it only matches when the defect
+exists, is not deleted, is in one of the states the caller's role may move
+it from (and, for some roles, is assigned to the caller), and still has
+the version the client read. The new row comes back through RETURNING, so
+a successful transition is a single statement and a concurrent one can
+never slip in between the check and the write.
+
+Because the UPDATE bypasses the ORM, the technician workload and trend
+events that session hooks normally maintain are updated here explicitly.
+"""
+import collections
+from sqlalchemy import select, update
+from extensions import db
+from models import Defect
+from routes.permissions import PERMISSIONS, ROLES, Role, normalize_role
+from serializers import DEFECT
+import trends
+import workload
+
+
+Transition = collections.namedtuple('Transition', ['to_status', 'from_states', 'assigned_only'])
+
+_TRANSITIONS = {
+    'review': {'to': 'Reviewed', 'from': ('Open', 'Reviewed')},
+    'assign': {'to': 'Ongoing', 'from': ('Open', 'Reviewed', 'Ongoing')},
+    'ongoing': {'to': 'Ongoing', 'from': ('Reviewed', 'Ongoing', 'Done')},
+    'done': {'to': 'Done', 'from': ('Ongoing', 'Done')},
+    'complete': {'to': 'Completed', 'from': ('Done',)},
+    'reopen': {'to': 'Open', 'from': ('Done', 'Completed')},
+}
+# Per-role exceptions to the default from-states.
+_ROLE_FROM_STATES = {
+    ('complete', Role.ADMIN): ('Ongoing', 'Done'),
+    ('reopen', Role.ADMIN): ('Reviewed', 'Ongoing', 'Done', 'Completed'),
+}
+# Roles that may only move defects assigned to them.
+_ASSIGNED_ONLY = {('ongoing', Role.TECHNICIAN), ('done', Role.TECHNICIAN)}
+
+# Compiled once at import: action -> role -> Transition, for roles holding
+# the matching ``defects.<action>`` permission.
+TRANSITIONS = {
+    action: {
+        role: Transition(
+            to_status=spec['to'],
+            from_states=tuple(_ROLE_FROM_STATES.get((action, role), spec['from'])),
+            assigned_only=(action, role) in _ASSIGNED_ONLY,
+        )
+        for role in ROLES
+        if f'defects.{action}' in PERMISSIONS[role]
+    }
+    for action, spec in _TRANSITIONS.items()
+}
+
+# Dialects whose UPDATE ... FROM can return the pre-update row alongside
+# the new one. Elsewhere the previous values are read first and the
+# UPDATE is guarded by the version that was read.
+_RETURNS_PREVIOUS_ROW = frozenset(['postgresql'])
+_PREVIOUS_COLUMNS = ('status', 'assigned_technician_id')
+
+
+class TransitionError(Exception):
+    def __init__(self, message, status_code, current_version=None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.current_version = current_version
+
+
+def _explain_failure(user, defect_id, action, transition, expected_version):
+    """Work out why a transition matched no row. Only runs on failure."""
+    row = db.session.execute(
+        select(Defect.status, Defect.deleted_at, Defect.assigned_technician_id, Defect.version)
+        .where(Defect.id == defect_id)
+    ).first()
+    if row is None or row.deleted_at is not None:
+        return TransitionError('Defect not found', 404)
+    if transition.assigned_only and row.assigned_technician_id != user.id:
+        return TransitionError('Forbidden', 403)
+    if expected_version is not None and row.version != expected_version:
+        return TransitionError('Record was modified by another request', 409, row.version)
+    if row.status not in transition.from_states:
+        return TransitionError(f'Cannot {action} a defect that is {row.status}', 409, row.version)
+    # The row changed between the UPDATE and this read; let the client retry.
+    return TransitionError('Record was modified by another request', 409, row.version)
+
+
+def apply_transition(user, defect_id, action, values=None, expected_version=None):
+    """Move a defect through ``action`` and return its serialized new state.
+
+    ``values`` are extra columns to set in the same UPDATE. Raises
+    TransitionError when the defect is missing, the caller may not touch
+    it, the version does not match or the current state does not allow
+    the action.
+    """
+    transition = TRANSITIONS[action].get(normalize_role(user.role))
+    if transition is None:
+        raise TransitionError('Forbidden', 403)
+
+    table = Defect.__table__
+    conditions = [
+        table.c.id == defect_id,
+        table.c.deleted_at.is_(None),
+        table.c.status.in_(transition.from_states),
+    ]
+    if transition.assigned_only:
+        conditions.append(table.c.assigned_technician_id == user.id)
+
+    previous = None
+    if db.session.get_bind().dialect.name in _RETURNS_PREVIOUS_ROW:
+        if expected_version is not None:
+            conditions.append(table.c.version == expected_version)
+        old = (
+            select(table.c.id, *[table.c[name] for name in _PREVIOUS_COLUMNS])
+            .where(*conditions)
+            .with_for_update()
+            .subquery('previous')
+        )
+        where = [table.c.id == old.c.id]
+        extra_returning = [old.c[name].label(f'previous_{name}') for name in _PREVIOUS_COLUMNS]
+    else:
+        previous = db.session.execute(
+            select(*[table.c[name] for name in _PREVIOUS_COLUMNS], table.c.version).where(*conditions)
+        ).first()
+        if previous is None:
+            raise _explain_failure(user, defect_id, action, transition, expected_version)
+        if expected_version is not None and previous.version != expected_version:
+            raise TransitionError('Record was modified by another request', 409, previous.version)
+        where = conditions + [table.c.version == previous.version]
+        extra_returning = []
+
+    statement = (
+        update(table)
+        .where(*where)
+        .values(status=transition.to_status, version=table.c.version + 1, **(values or {}))
+        .returning(*DEFECT.columns, *extra_returning)
+    )
+    row = db.session.execute(statement).first()
+    if row is None:
+        raise _explain_failure(user, defect_id, action, transition, expected_version)
+
+    new = row._mapping
+    if previous is None:
+        previous = {name: new[f'previous_{name}'] for name in _PREVIOUS_COLUMNS}
+    else:
+        previous = previous._mapping
+
+    connection = db.session.connection()
+    workload.record_change(
+        connection,
+        (previous['assigned_technician_id'], new['priority'], previous['status'], None),
+        (new['assigned_technician_id'], new['priority'], new['status'], None),
+        new['created_at'],
+    )
+    trends.record_events(
+        connection, new['id'], new['building_id'], new['priority'],
+        trends.status_events(previous['status'], new['status']),
+    )
+    return DEFECT.row(row)
@@ -0,0 +1,203 @@
+import datetime
+import json
+from sqlalchemy import event, func, inspect, insert, literal, select
+from extensions import db, cache
+from models import ArchivedDefect, Defect, DefectEvent
+
+
+INTERVALS = ('day', 'week', 'month')
+EVENT_TYPES = ('created', 'done', 'completed', 'reopened')
+MAX_BUCKETS = 366
+DEFAULT_BUCKETS = 12
+# A bucket only counts as closed this long after it ends, so events
+# committed just after the boundary still land before it is cached.
+CLOSE_GRACE = datetime.timedelta(minutes=5)
+# Closed buckets never change, so they are kept as long as the backend allows.
+CLOSED_BUCKET_TTL = 365 * 24 * 3600
+
+_STATUS_EVENTS = {'Done': 'done', 'Completed': 'completed'}
+_FINISHED_STATUSES = ('Done', 'Completed')
+
+
+def status_events(old, new):
+    """Events implied by a defect moving from status ``old`` to ``new``."""
+    if old == new:
+        return []
+    if new in _STATUS_EVENTS:
+        return [_STATUS_EVENTS[new]]
+    if old in _FINISHED_STATUSES:
+        return ['reopened']
+    return []
+
+
+def _status_events(obj):
+    history = inspect(obj).attrs.status.history
+    if not history.added:
+        return []
+    return status_events(history.deleted[0] if history.deleted else None, history.added[0])
+
+
+def record_events(connection, defect_id, building_id, priority, events):
+    """Insert lifecycle events for a defect changed outside the ORM."""
+    if not events:
+        return
+    now = datetime.datetime.utcnow()
+    connection.execute(insert(DefectEvent.__table__), [
+        {
+            'defect_id': defect_id,
+            'building_id': building_id,
+            'priority': priority,
+            'event': name,
+            'occurred_at': now,
+        }
+        for name in events
+    ])
+
+
+def backfill_events(connection):
+    """Rebuild defect_events from the timestamps on the live and archived defects.
+
+    Used after bulk loads, which bypass the session hook below. Reopen
+    history is not stored on the defect, so it cannot be recovered.
+    """
+    table = DefectEvent.__table__
+    connection.execute(table.delete())
+    for defects in (Defect.__table__, ArchivedDefect.__table__):
+        for name, column in (('created', defects.c.created_at), ('done', defects.c.done_at), ('completed', defects.c.completed_at)):
+            connection.execute(insert(table).from_select(
+                ['defect_id', 'building_id', 'priority', 'event', 'occurred_at'],
+                select(defects.c.id, defects.c.building_id, defects.c.priority, literal(name, table.c.event.type), column)
+                .where(column.isnot(None)),
+            ))
+
+
+@event.listens_for(db.session, 'after_flush')
+def _record_events(session, flush_context):
+    now = datetime.datetime.utcnow()
+    rows = []
+    for obj in session.new:
+        if isinstance(obj, Defect):
+            events = ['created'] + ([_STATUS_EVENTS[obj.status]] if obj.status in _STATUS_EVENTS else [])
+            rows.extend((obj, name) for name in events)
+    for obj in session.dirty:
+        if isinstance(obj, Defect):
+            rows.extend((obj, name) for name in _status_events(obj))
+    if rows:
+        session.connection().execute(insert(DefectEvent.__table__), [
+            {
+                'defect_id': obj.id,
+                'building_id': obj.building_id,
+                'priority': obj.priority,
+                'event': name,
+                'occurred_at': now,
+            }
+            for obj, name in rows
+        ])
+
+
+def bucket_start(value, interval):
+    day = value.date() if isinstance(value, datetime.datetime) else value
+    if interval == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if interval == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start, interval):
+    if interval == 'week':
+        return start + datetime.timedelta(days=7)
+    if interval == 'month':
+        return (start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return start + datetime.timedelta(days=1)
+
+
+def bucket_starts(interval, start, end):
+    starts = []
+    while start < end:
+        starts.append(start)
+        start = next_bucket(start, interval)
+    return starts
+
+
+def _bucket_expression(column, interval, dialect):
+    if dialect == 'postgresql':
+        return func.date_trunc(interval, column)
+    # SQLite: weeks start on Monday, like date_trunc('week').
+    if interval == 'week':
+        return func.date(column, 'weekday 0', '-6 days')
+    if interval == 'month':
+        return func.date(column, 'start of month')
+    return func.date(column)
+
+
+def _as_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value[:10])
+    return value
+
+
+def _query_buckets(interval, start, end):
+    """Counts per bucket, building, priority and event between two bucket starts."""
+    dialect = db.session.get_bind().dialect.name
+    bucket = _bucket_expression(DefectEvent.occurred_at, interval, dialect).label('bucket')
+    rows = db.session.execute(
+        select(bucket, DefectEvent.building_id, DefectEvent.priority, DefectEvent.event, func.count())
+        .where(
+            DefectEvent.occurred_at >= datetime.datetime.combine(start, datetime.time()),
+            DefectEvent.occurred_at < datetime.datetime.combine(end, datetime.time()),
+        )
+        .group_by(bucket, DefectEvent.building_id, DefectEvent.priority, DefectEvent.event)
+    ).all()
+
+    buckets = {}
+    for bucket_value, building_id, priority, event_type, count in rows:
+        groups = buckets.setdefault(_as_date(bucket_value).isoformat(), {})
+        group = groups.setdefault((building_id, priority), dict.fromkeys(EVENT_TYPES, 0))
+        group[event_type] = count
+    return {
+        key: [
+            {'building_id': building_id, 'priority': priority, **counts}
+            for (building_id, priority), counts in sorted(groups.items())
+        ]
+        for key, groups in buckets.items()
+    }
+
+
+def defect_trends(interval, start, end, now=None):
+    """Bucketed created/done/completed/reopened counts from ``start`` to ``end``.
+
+    ``start`` and ``end`` are bucket starts; ``end`` is exclusive. Closed
+    buckets are read from the cache and only the missing ones are queried
+    (in one range query); the still-open current bucket is always
+    recomputed.
+    """
+    now = now or datetime.datetime.utcnow()
+    starts = bucket_starts(interval, start, end)
+
+    def is_closed(bucket):
+        return datetime.datetime.combine(next_bucket(bucket, interval), datetime.time()) + CLOSE_GRACE <= now
+
+    results = {}
+    missing = []
+    for bucket in starts:
+        cached = cache.get('trends', f'{interval}:{bucket.isoformat()}') if is_closed(bucket) else None
+        if cached is None:
+            missing.append(bucket)
+        else:
+            results[bucket] = json.loads(cached)
+
+    if missing:
+        computed = _query_buckets(interval, missing[0], next_bucket(missing[-1], interval))
+        for bucket in missing:
+            rows = computed.get(bucket.isoformat(), [])
+            results[bucket] = rows
+            if is_closed(bucket):
+                cache.set('trends', f'{interval}:{bucket.isoformat()}', json.dumps(rows), ttl=CLOSED_BUCKET_TTL)
+
+    return [
+        {'start': bucket.isoformat(), 'closed': is_closed(bucket), 'rows': results[bucket]}
+        for bucket in starts
+    ]
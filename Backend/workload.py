@@ -0,0 +1,231 @@
+import datetime
+from sqlalchemy import and_, case, event, func, inspect, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from extensions import db
+from models import Defect, TechnicianWorkload
+
+
+STATUS_BUCKETS = {
+    'Open': 'open',
+    'Reviewed': 'open',
+    'Ongoing': 'ongoing',
+    'Done': 'done',
+}
+PENDING_STATUSES = ('Open', 'Reviewed', 'Ongoing')
+BUCKET_COLUMNS = {
+    'open': 'open_count',
+    'ongoing': 'ongoing_count',
+    'done': 'done_count',
+}
+# Order matches the arguments of _contribution.
+TRACKED_ATTRIBUTES = ('assigned_technician_id', 'priority', 'status', 'deleted_at')
+
+_UPSERT_INSERTS = {
+    'postgresql': postgresql_insert,
+    'sqlite': sqlite_insert,
+}
+
+
+def _contribution(technician_id, priority, status, deleted_at):
+    if technician_id is None or deleted_at is not None:
+        return None
+    bucket = STATUS_BUCKETS.get(status)
+    if not bucket:
+        return None
+    return technician_id, priority, bucket
+
+
+def _old_value(state, key):
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return state.attrs[key].value
+
+
+def _old_contribution(obj):
+    state = inspect(obj)
+    return _contribution(*(_old_value(state, key) for key in TRACKED_ATTRIBUTES))
+
+
+def _new_contribution(obj):
+    return _contribution(*(getattr(obj, key) for key in TRACKED_ATTRIBUTES))
+
+
+def _add_delta(deltas, contribution, amount, created_at):
+    if not contribution:
+        return
+    technician_id, priority, bucket = contribution
+    entry = deltas.setdefault((technician_id, priority), {
+        'counts': dict.fromkeys(BUCKET_COLUMNS, 0),
+        'oldest_added': None,
+        'removed_pending': False,
+    })
+    entry['counts'][bucket] += amount
+    if bucket == 'done':
+        return
+    if amount > 0:
+        if entry['oldest_added'] is None or created_at < entry['oldest_added']:
+            entry['oldest_added'] = created_at
+    else:
+        entry['removed_pending'] = True
+
+
+def _collect_deltas(session):
+    deltas = {}
+    for obj in session.new:
+        if isinstance(obj, Defect):
+            _add_delta(deltas, _new_contribution(obj), 1, obj.created_at or datetime.datetime.utcnow())
+
+    for obj in session.dirty:
+        if not isinstance(obj, Defect):
+            continue
+        state = inspect(obj)
+        if not any(state.attrs[key].history.has_changes() for key in TRACKED_ATTRIBUTES):
+            continue
+        old = _old_contribution(obj)
+        new = _new_contribution(obj)
+        if old != new:
+            _add_delta(deltas, old, -1, obj.created_at)
+            _add_delta(deltas, new, 1, obj.created_at)
+
+    for obj in session.deleted:
+        if isinstance(obj, Defect):
+            _add_delta(deltas, _old_contribution(obj), -1, obj.created_at)
+
+    return deltas
+
+
+def _oldest_pending_query(technician_id, priority):
+    return (
+        select(func.min(Defect.created_at))
+        .where(
+            Defect.assigned_technician_id == technician_id,
+            Defect.priority == priority,
+            Defect.status.in_(PENDING_STATUSES),
+            Defect.deleted_at.is_(None),
+        )
+        .scalar_subquery()
+    )
+
+
+def apply_deltas(connection, deltas):
+    now = datetime.datetime.utcnow()
+    table = TechnicianWorkload.__table__
+    for (technician_id, priority), entry in deltas.items():
+        counts = entry['counts']
+        values = {
+            BUCKET_COLUMNS[bucket]: table.c[BUCKET_COLUMNS[bucket]] + amount
+            for bucket, amount in counts.items()
+            if amount
+        }
+        if entry['removed_pending']:
+            # The removed defect may have been the oldest one; re-read the
+            # minimum for this technician and priority from the index.
+            values['oldest_open_at'] = _oldest_pending_query(technician_id, priority)
+        elif entry['oldest_added'] is not None:
+            oldest = entry['oldest_added']
+            values['oldest_open_at'] = case(
+                (table.c.oldest_open_at.is_(None), oldest),
+                (table.c.oldest_open_at > oldest, oldest),
+                else_=table.c.oldest_open_at,
+            )
+        if not values:
+            continue
+        values['updated_at'] = now
+        first_row = {
+            'technician_id': technician_id,
+            'priority': priority,
+            'open_count': max(counts['open'], 0),
+            'ongoing_count': max(counts['ongoing'], 0),
+            'done_count': max(counts['done'], 0),
+            'oldest_open_at': entry['oldest_added'],
+            'updated_at': now,
+        }
+
+        upsert_insert = _UPSERT_INSERTS.get(connection.dialect.name)
+        if upsert_insert is not None:
+            # One statement against the primary key, so two transactions
+            # giving a technician their first defect of a priority cannot
+            # both try to insert the row.
+            connection.execute(
+                upsert_insert(table)
+                .values(**first_row)
+                .on_conflict_do_update(index_elements=['technician_id', 'priority'], set_=values)
+            )
+            continue
+
+        result = connection.execute(
+            update(table)
+            .where(and_(table.c.technician_id == technician_id, table.c.priority == priority))
+            .values(**values)
+        )
+        if not result.rowcount:
+            connection.execute(insert(table).values(**first_row))
+
+
+def record_change(connection, old, new, created_at):
+    """Apply the workload effect of a defect update issued outside the ORM.
+
+    ``old`` and ``new`` are ``(assigned_technician_id, priority, status,
+    deleted_at)`` tuples, in the order of TRACKED_ATTRIBUTES.
+    """
+    old_contribution = _contribution(*old)
+    new_contribution = _contribution(*new)
+    if old_contribution == new_contribution:
+        return
+    deltas = {}
+    _add_delta(deltas, old_contribution, -1, created_at)
+    _add_delta(deltas, new_contribution, 1, created_at)
+    apply_deltas(connection, deltas)
+
+
+def rebuild_workloads(connection):
+    table = TechnicianWorkload.__table__
+    connection.execute(table.delete())
+    rows = connection.execute(
+        select(
+            Defect.assigned_technician_id,
+            Defect.priority,
+            func.sum(case((Defect.status.in_(('Open', 'Reviewed')), 1), else_=0)),
+            func.sum(case((Defect.status == 'Ongoing', 1), else_=0)),
+            func.sum(case((Defect.status == 'Done', 1), else_=0)),
+            func.min(case((Defect.status.in_(PENDING_STATUSES), Defect.created_at))),
+        )
+        .where(Defect.assigned_technician_id.isnot(None), Defect.deleted_at.is_(None))
+        .group_by(Defect.assigned_technician_id, Defect.priority)
+    ).all()
+    now = datetime.datetime.utcnow()
+    if rows:
+        connection.execute(insert(table), [
+            {
+                'technician_id': technician_id,
+                'priority': priority,
+                'open_count': open_count or 0,
+                'ongoing_count': ongoing_count or 0,
+                'done_count': done_count or 0,
+                'oldest_open_at': oldest_open_at,
+                'updated_at': now,
+            }
+            for technician_id, priority, open_count, ongoing_count, done_count, oldest_open_at in rows
+        ])
+    return len(rows)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _maintain_workloads(session, flush_context):
+    deltas = _collect_deltas(session)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+
+def _track_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+# Make sure the previous value of each tracked attribute is loaded before it
+# is replaced, so _old_contribution can always see it.
+for _key in TRACKED_ATTRIBUTES:
+    event.listen(getattr(Defect, _key), 'set', _track_old_value, active_history=True)
@@ -0,0 +1,14 @@
+"""WSGI entrypoint for production.
+
+Run with the bundled settings::
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+``gunicorn.conf.py`` preloads this module in the master process, so the
+app, its blueprints, models and compiled serializers are imported once and
+shared copy-on-write with every worker instead of being rebuilt per worker.
+"""
+from app import create_app
+
+
+application = create_app()
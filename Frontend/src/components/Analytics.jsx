@@ -7,13 +7,13 @@ import {
   Download,
 } from "lucide-react";
 import ExcelJS from "exceljs";
-import { defectsAPI, analyticsAPI } from "../services/api";
+import { dashboardAPI, analyticsAPI } from "../services/api";
 import { LoadingSkeleton } from "./ui/LoadingSkeleton";
 import { Alert } from "./ui/Alert";
 import { Button } from "./ui/Button";
 
 export function Analytics({ currentUser }) {
-  const [defects, setDefects] = useState([]);
+  const [counts, setCounts] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
@@ -21,8 +21,8 @@ export function Analytics({ currentUser }) {
     const loadAnalyticsData = async () => {
       try {
         setLoading(true);
-        const response = await defectsAPI.getAll();
-        setDefects(response.data);
+        const response = await dashboardAPI.get({ recent: 0 });
+        setCounts(response.data.counts);
       } catch (err) {
         setError("Failed to load analytics data.");
       } finally {
@@ -70,20 +70,13 @@ export function Analytics({ currentUser }) {
     );
   }
 
-  const totalDefects = defects.length;
-
-  const statusCounts = {
-    Open: defects.filter((d) => d.status === "Open").length,
-    Reviewed: defects.filter((d) => d.status === "Reviewed").length,
-    Ongoing: defects.filter((d) => d.status === "Ongoing").length,
-    Done: defects.filter((d) => d.status === "Done").length,
-    Completed: defects.filter((d) => d.status === "Completed").length,
-  };
+  const totalDefects = counts.total;
+  const statusCounts = counts.by_status;
 
   const priorityCounts = {
-    High: defects.filter((d) => d.priority === "high").length,
-    Medium: defects.filter((d) => d.priority === "medium").length,
-    Low: defects.filter((d) => d.priority === "low").length,
+    High: counts.by_priority.high,
+    Medium: counts.by_priority.medium,
+    Low: counts.by_priority.low,
   };
 
   const completionRate =
@@ -91,14 +84,7 @@ export function Analytics({ currentUser }) {
       ? Math.round((statusCounts.Completed / totalDefects) * 100)
       : 0;
 
-  const defectsThisMonth = defects.filter((d) => {
-    const defectDate = new Date(d.created_at);
-    const now = new Date();
-    return (
-      defectDate.getMonth() === now.getMonth() &&
-      defectDate.getFullYear() === now.getFullYear()
-    );
-  }).length;
+  const defectsThisMonth = counts.created_this_month;
 
   const handleDownloadDatabaseXlsx = async () => {
     try {
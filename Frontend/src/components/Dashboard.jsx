@@ -1,6 +1,6 @@
 import { useState, useEffect } from "react";
 import { Link } from "react-router-dom";
-import { defectsAPI } from "../services/api";
+import { dashboardAPI } from "../services/api";
 import { StatusBadge } from "./ui/Badge";
 import { CardSkeleton } from "./ui/LoadingSkeleton";
 import { Alert } from "./ui/Alert";
@@ -21,22 +21,16 @@ export function Dashboard({ currentUser }) {
     const loadDashboardData = async () => {
       try {
         setLoading(true);
-        const response = await defectsAPI.getAll();
-        const defects = response.data;
+        const response = await dashboardAPI.get();
+        const { counts, recent_defects } = response.data;
 
-        const total = defects.length;
-        const ongoing = defects.filter((d) => d.status === "Ongoing").length;
-        const completed = defects.filter(
-          (d) => d.status === "Completed",
-        ).length;
-        const open = defects.filter((d) => d.status === "Open").length;
-
-        setStats({ total, ongoing, completed, open });
-
-        const sortedDefects = [...defects].sort(
-          (a, b) => new Date(b.updated_at) - new Date(a.updated_at),
-        );
-        setRecentDefects(sortedDefects.slice(0, 5));
+        setStats({
+          total: counts.total,
+          ongoing: counts.by_status.Ongoing,
+          completed: counts.by_status.Completed,
+          open: counts.by_status.Open,
+        });
+        setRecentDefects(recent_defects);
       } catch (err) {
         setError("Failed to load dashboard data.");
       } finally {
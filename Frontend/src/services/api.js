@@ -148,4 +148,8 @@ export const analyticsAPI = {
   exportDatabase: () => api.get("/analytics/export"),
 };
 
+export const dashboardAPI = {
+  get: (params) => api.get("/dashboard", { params }),
+};
+
 export default api;